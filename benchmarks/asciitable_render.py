@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Compare asciitable.draw with the previous per-cell renderer.
+
+Usage: python benchmarks/asciitable_render.py [ROWS] [COLUMNS]
+
+Renders ROWS (default 100,000) rows of COLUMNS (default 30) mixed int,
+float, text and datetime columns, a terminal page (50 rows) at a time,
+to an in-memory stream.
+"""
+from __future__ import print_function
+import datetime as dt
+import io
+import itertools
+import sys
+import time
+
+import mock
+
+from ipydb import asciitable
+from ipydb.asciitable import FakedResult
+
+PAGE_LINES = 54
+
+
+def legacy_draw(cursor, out, max_fieldsize=100):
+    """The previous asciitable.draw: formats and writes every cell."""
+    headings = cursor.keys()
+    heading_sizes = [len(x) for x in headings]
+    pages = itertools.zip_longest(*[iter(cursor)] * (PAGE_LINES - 4))
+
+    def heading_line(sizes):
+        for size in sizes:
+            out.write(u'+' + '-' * (size + 2))
+        out.write(u'+\n')
+
+    for screenrows in pages:
+        sizes = list(heading_sizes)
+        for row in screenrows:
+            if row is None:
+                break
+            for idx, value in enumerate(row):
+                if not isinstance(value, str):
+                    value = str(value)
+                size = max(sizes[idx], len(value))
+                sizes[idx] = min(size, max_fieldsize)
+        heading_line(sizes)
+        for idx, size in enumerate(sizes):
+            out.write(u'| %%-%is ' % size % headings[idx])
+        out.write(u'|\n')
+        heading_line(sizes)
+        for rw in screenrows:
+            if rw is None:
+                break
+            for idx, size in enumerate(sizes):
+                fmt = u'| %%-%is ' % size
+                value = rw[idx]
+                if not isinstance(value, str):
+                    value = str(value)
+                if len(value) > max_fieldsize:
+                    value = value[:max_fieldsize - 5] + '[...]'
+                value = value.replace('\n', '^')
+                value = value.replace('\r', '^').replace('\t', ' ')
+                out.write((fmt % value).encode('utf8').decode('utf8'))
+            out.write(u'|\n')
+
+
+def make_rows(nrows, ncols):
+    start = dt.datetime(2012, 1, 1)
+    makers = [
+        lambda i: i,
+        lambda i: i / 7.0,
+        lambda i: u'customer %d' % (i % 977),
+        lambda i: start + dt.timedelta(minutes=i),
+    ]
+    return [tuple(makers[c % 4](i) for c in range(ncols))
+            for i in range(nrows)]
+
+
+def timed(label, func):
+    out = io.StringIO()
+    start = time.time()
+    func(out)
+    elapsed = time.time() - start
+    print('%-8s %7.2fs  %6.1f MB' % (
+        label, elapsed, len(out.getvalue()) / 1024.0 / 1024))
+    return elapsed
+
+
+def main(nrows, ncols):
+    rows = make_rows(nrows, ncols)
+    headings = ['column_%d' % c for c in range(ncols)]
+    legacy = timed('legacy', lambda out: legacy_draw(
+        FakedResult(rows, headings), out))
+    with mock.patch('ipydb.asciitable.termsize',
+                    return_value=(200, PAGE_LINES)):
+        paged = timed('draw', lambda out: asciitable.draw(
+            FakedResult(rows, headings), out=out))
+    print('speedup: %.2fx' % (legacy / paged))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 30)
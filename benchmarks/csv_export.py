@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Compare the batched CSV export path with the old per-row writer.
+
+Usage: python benchmarks/csv_export.py [ROWS]
+
+Builds a sqlite table of ROWS rows (default one million) in a temporary
+directory and writes it out as CSV with:
+    legacy: the per-row encode / write / truncate loop of
+            ipydb.utils.UnicodeWriter (on python 3 the equivalent
+            loop over io.StringIO, since UnicodeWriter needs python 2).
+    batched: ipydb.export.write_csv.
+    batched+gzip: ipydb.export.write_csv with gzip compression.
+"""
+from __future__ import print_function
+import codecs
+import csv
+import datetime as dt
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from future.utils import PY2
+import sqlalchemy as sa
+
+from ipydb import export
+from ipydb.utils import ibatch, UnicodeWriter
+
+
+class LegacyWriter(object):
+    """UnicodeWriter's per-row round trip, ported to python 3."""
+
+    def __init__(self, f):
+        self.queue = io.StringIO()
+        self.writer = csv.writer(self.queue)
+        self.stream = f
+        self.encoder = codecs.getincrementalencoder('utf-8')()
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        data = self.encoder.encode(self.queue.getvalue())
+        self.stream.write(data)
+        self.queue.seek(0)
+        self.queue.truncate(0)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+def legacy_write_csv(cursor, filepath):
+    with open(filepath, 'wb') as out:
+        writer = UnicodeWriter(out) if PY2 else LegacyWriter(out)
+        writer.writerow(cursor.keys())
+        writer.writerows(cursor)
+
+
+def make_table(engine, nrows):
+    engine.execute('create table sale (id integer primary key, '
+                   'customer varchar(40), amount numeric(10, 2), '
+                   'qty integer, sold timestamp)')
+    start = dt.datetime(2012, 1, 1)
+    rows = ((i, u'customer n\xfamero %d' % (i % 5000), i % 10000 / 100.0,
+             i % 17, start + dt.timedelta(minutes=i)) for i in range(nrows))
+    for batch in ibatch(rows, 50000):
+        engine.execute('insert into sale values (?, ?, ?, ?, ?)', batch)
+
+
+def timed(label, nrows, func, engine, filepath):
+    result = engine.execute('select * from sale')
+    start = time.time()
+    func(result, filepath)
+    elapsed = time.time() - start
+    megabytes = os.path.getsize(filepath) / 1024.0 / 1024
+    print('%-14s %8.2fs %10i rows/s %8.1f MB %8.1f MB/s' % (
+        label, elapsed, nrows / elapsed, megabytes, megabytes / elapsed))
+    return elapsed
+
+
+def main(nrows):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        engine = sa.create_engine(
+            'sqlite:///' + os.path.join(tmpdir, 'bench.sqlite'))
+        make_table(engine, nrows)
+        path = os.path.join(tmpdir, 'out.csv')
+        legacy = timed('legacy', nrows, legacy_write_csv, engine, path)
+        batched = timed('batched', nrows, export.write_csv, engine, path)
+        timed('batched+gzip', nrows,
+              lambda cursor, filepath: export.write_csv(
+                  cursor, filepath, compression='gzip'),
+              engine, path + '.gz')
+        print('batched speedup: %.2fx' % (legacy / batched))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Measure how long loading the ipydb extension takes.
+
+Usage: python benchmarks/import_time.py [MODULE] [RUNS]
+
+Imports MODULE (default ipydb.plugin, which %load_ext ipydb needs) in
+a fresh interpreter with `python -X importtime`, RUNS times (default
+5), after IPython has been imported: that cost is paid by the shell
+whatever extensions are loaded. Prints the best total and the slowest
+modules imported on the way, then lists any optional or heavy modules
+which were imported but should only be loaded on first use.
+"""
+from __future__ import print_function
+import os
+import subprocess
+import sys
+
+PRELOAD = ('import IPython.terminal.interactiveshell, '
+           'IPython.core.magic_arguments')
+MARKER = '-- ipydb import --'
+HEAVY = ['numpy', 'pandas', 'pyarrow', 'zstandard', 'sqlparse',
+         'dateutil', 'sqlalchemy.orm', 'ipydb.metadata']
+
+
+def import_times(module):
+    """Return ({module: (self us, cumulative us)}, imported modules)."""
+    code = ('%s\nimport sys\nsys.stderr.write("%s\\n")\n'
+            'sys.stderr.flush()\nimport %s\n'
+            'print(",".join(sorted(sys.modules)))' % (
+                PRELOAD, MARKER, module))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [p for p in env.get('PYTHONPATH', '').split(os.pathsep) if p])
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', code], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    out, err = proc.communicate()
+    if proc.returncode:
+        raise RuntimeError(err)
+    # only the imports after the preload
+    lines = err.splitlines()
+    times = {}
+    for line in lines[lines.index(MARKER) + 1:]:
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            times[name.strip()] = (int(own), int(cumulative))
+        except ValueError:  # the heading
+            continue
+    return times, out.strip().split(',')
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'ipydb.plugin'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    best = None
+    for i in range(runs):
+        times, modules = import_times(module)
+        if best is None or times[module][1] < best[0][module][1]:
+            best = times, modules
+    times, modules = best
+    print("import %s: %.1fms (best of %i, IPython preloaded)" % (
+        module, times[module][1] / 1000.0, runs))
+    print("slowest modules (self time):")
+    slowest = sorted(times.items(), key=lambda item: -item[1][0])[:15]
+    for name, (own, cumulative) in slowest:
+        print("  %-40s %8.1fms %8.1fms cumulative" % (
+            name, own / 1000.0, cumulative / 1000.0))
+    loaded = [name for name in HEAVY if name in modules]
+    if loaded:
+        print("loaded but not needed at import: %s" % ', '.join(loaded))
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,8 @@ def configure_prompt(ipydb):
     ip = ipydb.shell
     ip.prompt_manager.lazy_evaluate_fields['_ipydb'] = LazyEvaluate(
         ipydb.get_db_ps1)
+    ip.prompt_manager.lazy_evaluate_fields['_connecting'] = LazyEvaluate(
+        ipydb.get_connecting_ps1)
     ip.prompt_manager.lazy_evaluate_fields['_reflecting'] = LazyEvaluate(
         ipydb.get_reflecting_ps1)
     ip.prompt_manager.lazy_evaluate_fields['_tx'] = LazyEvaluate(
@@ -54,7 +56,8 @@ def configure_prompt(ipydb):
     tmpl = ip.prompt_manager.in_template
     _backup_prompt1 = tmpl
     tmpl = tmpl.rstrip(': ')
-    tmpl += '{color.LightPurple}{_reflecting}' \
+    tmpl += '{color.Yellow}{_connecting}' \
+            '{color.LightPurple}{_reflecting}' \
             '{color.Cyan}{_ipydb}' \
             '{color.LightRed}{_tx}' \
             '{color.Green}: '
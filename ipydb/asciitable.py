@@ -3,12 +3,17 @@ from future.standard_library import install_aliases
 install_aliases()
 
 """Draw ascii tables."""
+from builtins import str
+import datetime as dt
+import io
 import itertools
+import numbers
 import sys
 
+from future.utils import PY2
 from past.builtins import basestring
 
-from .utils import termsize
+from .utils import ibatch, termsize
 
 
 class FakedResult(object):
@@ -46,68 +51,147 @@ def isublists(l, n):
     return itertools.zip_longest(*[iter(l)] * n)
 
 
+# replaces characters which would break a table row
+CONTROL_CHARS = {ord(u'\n'): u'^', ord(u'\r'): u'^', ord(u'\t'): u' '}
+TRUNCATED = u'[...]'
+PLAIN_TYPES = (numbers.Number, dt.date, dt.time, dt.timedelta)
+
+
+def as_text(values):
+    """Convert a column of values to text, replacing control characters.
+
+    The column is joined, translated and split again so that control
+    characters are replaced with one call for the whole column.
+    """
+    values = [v if isinstance(v, str) else str(v) for v in values]
+    joined = u'\x00'.join(values)
+    if joined.translate(CONTROL_CHARS) == joined:
+        return values
+    if joined.count(u'\x00') != len(values) - 1:
+        # values contain the separator: translate them one by one
+        return [v.translate(CONTROL_CHARS) for v in values]
+    return joined.translate(CONTROL_CHARS).split(u'\x00')
+
+
+def is_plain(value):
+    return value is None or (isinstance(value, PLAIN_TYPES) and
+                             not isinstance(value, basestring))
+
+
+def as_plain_text(values):
+    """Convert a column of numbers or dates (or None) to text.
+
+    The formatter is chosen from a column's first page: should a later
+    page hold other values (sqlite columns can hold any type), they are
+    converted by as_text() instead.
+    """
+    if not all(map(is_plain, values)):
+        return as_text(values)
+    return list(map(str, values))
+
+
+def column_formatter(values):
+    """Return the formatter for a column, based upon a sample of values.
+
+    Columns whose sample values are all numbers, dates or None can't
+    contain control characters, and are converted with a single map().
+    A sample of only None says nothing about the column: it gets
+    as_text().
+    """
+    values = [v for v in values if v is not None]
+    if values and all(map(is_plain, values)):
+        return as_plain_text
+    return as_text
+
+
+def render_page(headings, rows, formatters, max_fieldsize=100,
+                closed=False):
+    """Return a page of rows rendered as an ascii table.
+
+    Args:
+        headings: list of column headings.
+        rows: list of row tuples.
+        formatters: one formatter per column, see column_formatter().
+        max_fieldsize: longer values are truncated to this width.
+        closed: draw a line below the last row.
+    Returns:
+        The table as a single string.
+    """
+    columns = [fmt(values) for fmt, values in
+               zip(formatters, zip(*rows))] if rows else \
+        [[] for _ in headings]
+    widths = []
+    for idx, (heading, column) in enumerate(zip(headings, columns)):
+        longest = max(map(len, column)) if column else 0
+        if longest > max_fieldsize:
+            keep = max_fieldsize - len(TRUNCATED)
+            columns[idx] = column = [
+                v if len(v) <= max_fieldsize else v[:keep] + TRUNCATED
+                for v in column]
+            longest = max_fieldsize
+        widths.append(min(max(len(heading), longest), max_fieldsize))
+    line = u'+' + u'+'.join(u'-' * (w + 2) for w in widths) + u'+\n'
+    padded = [[v.ljust(w) for v in column]
+              for w, column in zip(widths, columns)]
+    lines = [line,
+             u'| ' + u' | '.join(str(h).ljust(w)
+                                 for h, w in zip(headings, widths)) +
+             u' |\n',
+             line]
+    lines.extend(u'| ' + u' | '.join(cells) + u' |\n'
+                 for cells in zip(*padded))
+    if closed:
+        lines.append(line)
+        lines.append(u'\n')
+    return u''.join(lines)
+
+
+class TableRenderer(object):
+    """Renders successive pages of a result set, see render_page().
+
+    Column formatters are chosen from the first page rendered.
+    """
+
+    def __init__(self, headings, max_fieldsize=100):
+        self.headings = headings
+        self.max_fieldsize = max_fieldsize
+        self.formatters = None
+
+    def render(self, rows, closed=False):
+        """Return a list of rows rendered as an ascii table."""
+        if self.formatters is None:
+            self.formatters = [column_formatter(values)
+                               for values in zip(*rows)] or \
+                [as_text] * len(self.headings)
+        return render_page(self.headings, rows, self.formatters,
+                           max_fieldsize=self.max_fieldsize, closed=closed)
+
+
 def draw(cursor, out=sys.stdout, paginate=True, max_fieldsize=100):
     """Render an result set as an ascii-table.
 
     Renders an SQL result set to `out`, some file-like object.
     Assumes that we can determine the current terminal height and
-    width via the termsize module.
+    width via the termsize module. Each page is rendered to a single
+    string (see TableRenderer) which is written with one call.
 
     Args:
         cursor: An iterable of rows. Each row is a list or tuple
                 with index access to each cell. The cursor
                 has a list/tuple of headings via cursor.keys().
+                If paginate is False, cursor is an iterable of pages,
+                each of which is an iterable of rows.
         out: File-like object.
     """
-
-    def heading_line(sizes):
-        for size in sizes:
-            out.write(u'+' + '-' * (size + 2))
-        out.write(u'+\n')
-
-    def draw_headings(headings, sizes):
-        heading_line(sizes)
-        for idx, size in enumerate(sizes):
-            fmt = u'| %%-%is ' % size
-            out.write((fmt % headings[idx]))
-        out.write(u'|\n')
-        heading_line(sizes)
-
     cols, lines = termsize()
-    headings = cursor.keys()
-    heading_sizes = map(lambda x: len(x), headings)
+    headings = list(cursor.keys())
     if paginate:
-        cursor = isublists(cursor, lines - 4)
-        # else we assume cursor arrive here pre-paginated
-    for screenrows in cursor:
-        sizes = list(heading_sizes)
-        for row in screenrows:
-            if row is None:
-                break
-            for idx, value in enumerate(row):
-                if not isinstance(value, basestring):
-                    value = str(value)
-                size = max(sizes[idx], len(value))
-                sizes[idx] = min(size, max_fieldsize)
-        draw_headings(headings, sizes)
-        for rw in screenrows:
-            if rw is None:
-                break  # from isublists impl
-            for idx, size in enumerate(sizes):
-                fmt = u'| %%-%is ' % size
-                value = rw[idx]
-                if not isinstance(value, basestring):
-                    value = str(value)
-                if len(value) > max_fieldsize:
-                    value = value[:max_fieldsize - 5] + '[...]'
-                value = value.replace('\n', '^')
-                value = value.replace('\r', '^').replace('\t', ' ')
-                try:
-                    value = fmt % value
-                except UnicodeDecodeError:
-                    value = fmt % value.decode('utf8')
-                out.write(value.encode('utf8'))
-            out.write(u'|\n')
-        if not paginate:
-            heading_line(sizes)
-            out.write(u'\n')
+        pages = ibatch(cursor, max(lines - 4, 1))
+    else:
+        pages = cursor  # we assume cursor arrives here pre-paginated
+    encode = PY2 and not isinstance(out, io.TextIOBase)
+    renderer = TableRenderer(headings, max_fieldsize=max_fieldsize)
+    for page in pages:
+        rows = [row for row in page if row is not None]
+        text = renderer.render(rows, closed=not paginate)
+        out.write(text.encode('utf8') if encode else text)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Browse a table a page at a time using keyset pagination.
+
+Each page is fetched with its own query on the table's primary key:
+`where key > (last key shown) order by key limit N` going forward and
+`where key < (first key shown) order by key desc limit N` going back.
+With an index on the primary key every page costs about the same,
+however deep into the table the user has paged, unlike OFFSET.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+import logging
+import sys
+
+import sqlalchemy as sa
+
+from ipydb.asciitable import TableRenderer
+from ipydb.pager import BACK_KEYS, CLEAR_SCREEN, QUIT_KEYS, read_key
+from ipydb.utils import getch, termsize
+
+log = logging.getLogger(__name__)
+
+PROMPT = u'-- %s page %i: [space] next  [b] back  [q] quit --'
+
+
+def key_expression(sa_table, keys):
+    """Return the (possibly composite) key to compare and order by."""
+    columns = [sa_table.c[k] for k in keys]
+    return columns[0] if len(columns) == 1 else sa.tuple_(*columns)
+
+
+def page_query(sa_table, keys, where=None, after=None, before=None,
+               limit=100):
+    """Return a select of one page of rows from sa_table.
+
+    Args:
+        sa_table: sqlalchemy table clause to select from.
+        keys: names of the primary key columns.
+        where: optional SQL condition text to filter rows by.
+        after: key values: select the page after this key, in key order.
+        before: key values: select the page before this key, in
+                descending key order.
+        limit: rows per page.
+    """
+    key = key_expression(sa_table, keys)
+    query = sa.select([sa_table])
+    if where:
+        query = query.where(sa.text(where))
+    if before is not None:
+        bound = before[0] if len(keys) == 1 else sa.tuple_(*before)
+        return query.where(key < bound).order_by(
+            *[sa_table.c[k].desc() for k in keys]).limit(limit)
+    if after is not None:
+        bound = after[0] if len(keys) == 1 else sa.tuple_(*after)
+        query = query.where(key > bound)
+    return query.order_by(*[sa_table.c[k] for k in keys]).limit(limit)
+
+
+class TableBrowser(object):
+    """Page forwards and backwards through a table by primary key."""
+
+    def __init__(self, conn, table, where=None, out=None, max_fieldsize=100,
+                 getkey=getch):
+        """
+        Args:
+            conn: SqlAlchemy engine or connection to query.
+            table: ipydb.metadata.model.Table with a primary key.
+            where: optional SQL condition text to filter rows by.
+            out: stream to write pages to, default sys.stdout.
+            max_fieldsize: see asciitable.render_page().
+            getkey: callable taking a prompt and returning a key press.
+        """
+        self.conn = conn
+        self.name = table.name
+        self.columns = [c.name for c in table.columns]
+        self.keys = [c.name for c in table.columns if c.primary_key]
+        if not self.keys:
+            raise ValueError("%s has no primary key to browse by" %
+                             table.name)
+        self.key_indexes = [self.columns.index(k) for k in self.keys]
+        self.sa_table = sa.table(table.name,
+                                 *[sa.column(c) for c in self.columns])
+        self.where = where
+        self.out = out or sys.stdout
+        self.renderer = TableRenderer(self.columns,
+                                      max_fieldsize=max_fieldsize)
+        self.getkey = getkey
+        self.queries = 0
+
+    def key_of(self, row):
+        return tuple(row[i] for i in self.key_indexes)
+
+    def fetch(self, limit, after=None, before=None):
+        """Return a page of rows in key order: one query."""
+        self.queries += 1
+        rows = self.conn.execute(page_query(
+            self.sa_table, self.keys, self.where, after=after,
+            before=before, limit=limit)).fetchall()
+        if before is not None:
+            rows.reverse()
+        return rows
+
+    def run(self):
+        """Show pages until the user quits."""
+        cols, lines = termsize()
+        page_rows = max(lines - 5, 1)  # headings, borders and prompt
+        rows = self.fetch(page_rows)
+        number = 1
+        if not rows:
+            print("No rows found in %s" % self.name)
+            return
+        redraw = False
+        while True:
+            if redraw:  # each page replaces the last one on screen
+                self.out.write(CLEAR_SCREEN)
+            self.out.write(self.renderer.render(rows))
+            self.out.flush()
+            redraw = True
+            key = read_key(self.getkey, PROMPT % (self.name, number))
+            if key in QUIT_KEYS or not key:
+                return
+            back = key in BACK_KEYS  # any other key pages forward
+            if back and number > 1:
+                page = self.fetch(page_rows, before=self.key_of(rows[0]))
+            elif not back and len(rows) == page_rows:
+                page = self.fetch(page_rows, after=self.key_of(rows[-1]))
+            else:
+                page = None  # already on the first or last page
+            if page:
+                rows = page
+                number += -1 if back else 1
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bulk loading of data into database tables.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+import csv
+import decimal
+import logging
+
+from dateutil import parser as dateparser
+import sqlalchemy as sa
+
+from ipydb import columnar
+from ipydb.metadata.model import restr, renumeric, redate, \
+    reinteger, refloat
+from ipydb.utils import ibatch
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def unconverted(value):
+    return value
+
+
+def column_converter(column):
+    """Return a function which converts a CSV string value for column.
+
+    The conversion is chosen from the column's type using the same
+    classification as model.sql_default(). Empty strings are converted
+    to None for all but string columns.
+
+    Args:
+        column: an ipydb.metadata.model.Column.
+    Returns:
+        callable taking a string and returning a value suitable for
+        binding to an insert statement.
+    """
+    typ = str(column.type).lower().strip()
+    if redate.search(typ):
+        head = typ.split()[0]
+        if head == 'date':
+            def convert(value):
+                return dateparser.parse(value).date()
+        elif head == 'time':
+            def convert(value):
+                return dateparser.parse(value).time()
+        else:
+            convert = dateparser.parse
+    elif restr.search(typ):
+        return unconverted
+    elif renumeric.search(typ):
+        if reinteger.search(typ):
+            convert = int
+        elif refloat.search(typ):
+            convert = float
+        else:
+            convert = decimal.Decimal
+    else:
+        log.debug('no converter for type: %s', typ)
+        return unconverted
+
+    def converter(value):
+        if value == '':
+            return None
+        return convert(value)
+    return converter
+
+
+def read_header(fin, delimiter=','):
+    """Read and return the list of column names from the first line of fin.
+
+    Only the first line is consumed so that the remainder of fin can
+    be handed to a dialect bulk loader as-is.
+    """
+    return next(csv.reader([fin.readline()], delimiter=delimiter))
+
+
+def copy_csv(conn, table, header, fin, delimiter=','):
+    """Load CSV data using PostgreSQL's COPY FROM STDIN (psycopg2 only)."""
+    quote = conn.dialect.identifier_preparer.quote
+    sql = "COPY %s (%s) FROM STDIN WITH CSV DELIMITER '%s'" % (
+        quote(table.name), ', '.join(quote(c) for c in header), delimiter)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(sql, fin)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+# dialect name -> (dbapi driver name, loader function)
+BULK_LOADERS = {
+    'postgresql': ('psycopg2', copy_csv),
+}
+
+
+def read_rows(fin, header, delimiter=','):
+    """Yield the rows of CSV file fin, after its header.
+
+    Blank lines are skipped.
+
+    Raises:
+        ValueError if a row doesn't have a value for each column in
+        header. The message gives the row's line number in the file.
+    """
+    reader = csv.reader(fin, delimiter=delimiter)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            raise ValueError('Line %i: expected %i values, found %i' % (
+                reader.line_num + 1, len(header), len(row)))
+        yield row
+
+
+def load_csv(conn, table, fin, batch_size=DEFAULT_BATCH_SIZE,
+             delimiter=','):
+    """Stream rows from a CSV file into a table.
+
+    The first line of the file must contain column names. Values are
+    converted using the cached column types of table and inserted using
+    executemany in batches of batch_size rows, so that at most one batch
+    is held in memory at a time. Where the dialect has a native bulk
+    loading path (see BULK_LOADERS) it is used instead: the file is
+    streamed to the database as-is, so batch_size doesn't apply, and
+    rows are checked (and values converted) by the database.
+
+    Args:
+        conn: SqlAlchemy connection - the caller owns the transaction.
+        table: ipydb.metadata.model.Table to load into.
+        fin: text file-like object containing CSV data.
+        batch_size: number of rows to send to the driver per executemany.
+        delimiter: CSV field delimiter.
+    Returns:
+        Number of rows loaded.
+    Raises:
+        ValueError if the header names a column which table doesn't
+        have, or a row has the wrong number of values.
+    """
+    header = read_header(fin, delimiter=delimiter)
+    try:
+        columns = [table.column(name) for name in header]
+    except KeyError as e:
+        raise ValueError(e.args[0])
+    driver, loader = BULK_LOADERS.get(conn.dialect.name, (None, None))
+    if loader and conn.dialect.driver == driver:
+        log.debug('Using bulk loader for %s', conn.dialect.name)
+        return loader(conn, table, header, fin, delimiter=delimiter)
+    converters = [column_converter(c) for c in columns]
+    insert = sa.table(table.name, *[sa.column(name) for name in header]) \
+        .insert()
+    rows = 0
+    for batch in ibatch(read_rows(fin, header, delimiter), batch_size):
+        params = [dict(zip(header, [convert(value) for convert, value in
+                                    zip(converters, row)]))
+                  for row in batch]
+        conn.execute(insert, params)
+        rows += len(params)
+    return rows
+
+
+def positional_insert(dialect, tablename, columns):
+    """Return an insert statement string with positional parameters,
+    in the paramstyle of dialect's DB-API driver."""
+    quote = dialect.identifier_preparer.quote
+    style = dialect.paramstyle
+    if style == 'qmark':
+        marks = ['?'] * len(columns)
+    elif style in ('format', 'pyformat'):
+        marks = ['%s'] * len(columns)
+    else:  # numeric and named drivers accept :1, :2...
+        marks = [':%i' % i for i in range(1, len(columns) + 1)]
+    return 'insert into %s (%s) values (%s)' % (
+        quote(tablename), ', '.join(quote(c) for c in columns),
+        ', '.join(marks))
+
+
+def load_frame(conn, table, frame, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert the rows of a DataFrame or numpy record array into a table.
+
+    Values are converted a column (slice) at a time, see
+    columnar.column_values(), then zipped into tuples and sent with
+    executemany batch_size rows at a time.
+
+    Args:
+        conn: SqlAlchemy connection - the caller owns the transaction.
+        table: ipydb.metadata.model.Table to insert into.
+        frame: pandas.DataFrame or numpy structured/record array whose
+               column names are columns of table.
+        batch_size: number of rows to send to the driver per executemany.
+    Returns:
+        Number of rows inserted.
+    """
+    names, arrays = columnar.frame_columns(frame)
+    try:
+        for name in names:
+            table.column(name)
+    except KeyError as e:
+        raise ValueError(e.args[0])
+    sql = positional_insert(conn.dialect, table.name, names)
+    nrows = len(arrays[0]) if arrays else 0
+    for start in range(0, nrows, batch_size):
+        columns = [columnar.column_values(array[start:start + batch_size])
+                   for array in arrays]
+        conn.execute(sql, list(zip(*columns)))
+    return nrows
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Profile the columns of a table with a single aggregate query.
+
+For each column the null count, distinct count, minimum, maximum and
+(for strings) average length are computed by the database, in one
+SELECT generated from the table's cached metadata, so only one row
+comes back however big the table is. Column types are classified in
+the same way as ipydb.metadata.model.sql_default().
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import expression
+
+from ipydb.metadata.model import redate, renumeric, restr
+
+log = logging.getLogger(__name__)
+
+HEADINGS = ['Column', 'Type', 'Nulls', 'Distinct', 'Min', 'Max',
+            'Avg length']
+STATISTICS = ['nulls', 'distinct', 'min', 'max', 'avglen']
+
+
+class approx_count_distinct(expression.FunctionElement):
+    """count(distinct x), approximated where the database can."""
+    name = 'approx_count_distinct'
+    type = sa.Integer()
+
+
+@compiles(approx_count_distinct)
+def compile_count_distinct(element, compiler, **kw):
+    return 'count(distinct %s)' % compiler.process(element.clauses, **kw)
+
+
+@compiles(approx_count_distinct, 'oracle')
+def compile_oracle_count_distinct(element, compiler, **kw):
+    return 'approx_count_distinct(%s)' % compiler.process(
+        element.clauses, **kw)
+
+
+@compiles(approx_count_distinct, 'redshift')
+def compile_redshift_count_distinct(element, compiler, **kw):
+    return 'approximate count(distinct %s)' % compiler.process(
+        element.clauses, **kw)
+
+
+def classify(column):
+    """Return 'date', 'string', 'number' or None for a model.Column."""
+    typ = str(column.type).lower().strip()
+    if redate.search(typ):
+        return 'date'
+    elif restr.search(typ):
+        return 'string'
+    elif renumeric.search(typ):
+        return 'number'
+    return None
+
+
+def column_aggregates(sa_column, kind):
+    """Return {statistic: aggregate expression} for one column.
+
+    Statistics which don't apply to the column's kind are left out.
+    """
+    aggregates = {'nulls': sa.func.count() - sa.func.count(sa_column)}
+    if kind is not None:  # e.g. LOBs can't be compared on some databases
+        aggregates['distinct'] = approx_count_distinct(sa_column)
+        aggregates['min'] = sa.func.min(sa_column)
+        aggregates['max'] = sa.func.max(sa_column)
+    if kind == 'string':
+        aggregates['avglen'] = sa.func.avg(sa.func.length(sa_column))
+    return aggregates
+
+
+def profile_query(table, sample=None):
+    """Return the aggregate select which profiles table.
+
+    Args:
+        table: an ipydb.metadata.model.Table.
+        sample: only profile the first `sample` rows returned by the
+                database (not a random sample, but cheap).
+    Returns:
+        tuple (query, labels). query returns a single row: the row count
+        followed by one value for each (column name, statistic) in labels.
+    """
+    source = sa.table(table.name, *[sa.column(c.name)
+                                    for c in table.columns])
+    if sample:
+        source = sa.select([source]).limit(sample).alias('profiled')
+    selected = [sa.func.count().label('total')]
+    labels = []
+    for index, column in enumerate(table.columns):
+        aggregates = column_aggregates(source.c[column.name],
+                                       classify(column))
+        for statistic in STATISTICS:
+            if statistic in aggregates:
+                selected.append(aggregates[statistic].label(
+                    'c%i_%s' % (index, statistic)))
+                labels.append((column.name, statistic))
+    return sa.select(selected).select_from(source), labels
+
+
+def profile_table(engine, table, sample=None):
+    """Profile the columns of table.
+
+    Returns:
+        tuple (total rows, list of rows for HEADINGS). Statistics which
+        don't apply to a column are ''.
+    """
+    query, labels = profile_query(table, sample)
+    row = engine.execute(query).first()
+    found = {}
+    for (name, statistic), value in zip(labels, row[1:]):
+        found.setdefault(name, {})[statistic] = value
+    rows = []
+    for column in table.columns:
+        values = found.get(column.name, {})
+        avglen = values.get('avglen', '')
+        if avglen not in ('', None):
+            avglen = round(float(avglen), 1)
+        rows.append((column.name, column.type, values.get('nulls', ''),
+                     values.get('distinct', ''), values.get('min', ''),
+                     values.get('max', ''), avglen))
+    return row[0], rows
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fetch query results into typed column arrays.
+
+NumPy is required to fetch columns and pandas is required to build
+DataFrames, both are optional dependencies of ipydb.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from collections import OrderedDict
+import datetime as dt
+import decimal
+import logging
+import numbers
+import re
+
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+try:
+    import pandas as pd
+except ImportError:  # pragma: nocover
+    pd = None
+
+from ipydb.metadata.model import restr, renumeric, redate, reinteger
+from ipydb.utils import iter_batches
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 10000
+
+INT = 'int64'
+FLOAT = 'float64'
+DATETIME = 'datetime64[us]'
+OBJECT = 'object'
+
+
+def model_dtype(column):
+    """Return a numpy dtype name for an ipydb.metadata.model.Column.
+
+    Uses the same type classification as model.sql_default().
+    """
+    typ = str(column.type).lower().strip()
+    if redate.search(typ):
+        if typ.split()[0] == 'time':
+            return OBJECT
+        return DATETIME
+    elif restr.search(typ):
+        return OBJECT
+    elif renumeric.search(typ):
+        return INT if reinteger.search(typ) else FLOAT
+    return None
+
+
+def model_dtypes(database, query):
+    """Return {column name: dtype} for the tables referenced in query.
+
+    Column names which appear in more than one referenced table with
+    different types are left out.
+
+    Args:
+        database: an ipydb.metadata.model.Database.
+        query: SQL query string.
+    """
+    words = set(w.lower() for w in re.findall(r'\w+', query))
+    dtypes = {}
+    ambiguous = set()
+    for name, table in database.tables.items():
+        if name.lower() not in words:
+            continue
+        for column in table.columns:
+            dtype = model_dtype(column)
+            if dtypes.get(column.name, dtype) != dtype:
+                ambiguous.add(column.name)
+            dtypes[column.name] = dtype
+    for name in ambiguous:
+        del dtypes[name]
+    return dtypes
+
+
+def description_dtypes(result):
+    """Return a list of dtypes from the DB-API cursor description.
+
+    PEP-249 type objects are used where the driver defines them.
+    The dtype is None where nothing could be determined.
+    """
+    dbapi = getattr(getattr(result, 'dialect', None), 'dbapi', None)
+    description = getattr(getattr(result, 'cursor', None), 'description',
+                          None) or []
+    dtypes = []
+    for column in description:
+        type_code, dtype = column[1], None
+        if dbapi is not None and type_code is not None:
+            for typeobj, candidate in (('NUMBER', FLOAT),
+                                       ('DATETIME', DATETIME),
+                                       ('STRING', OBJECT)):
+                typeobj = getattr(dbapi, typeobj, None)
+                if typeobj is not None and type_code == typeobj:
+                    dtype = candidate
+                    break
+        dtypes.append(dtype)
+    return dtypes
+
+
+def infer_dtype(values):
+    """Return a dtype for a column from the first non-None value."""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return OBJECT
+        if isinstance(value, numbers.Integral):
+            return INT
+        if isinstance(value, (numbers.Real, decimal.Decimal)):
+            return FLOAT
+        if isinstance(value, (dt.date, dt.datetime)):
+            return DATETIME
+        return OBJECT
+    return None
+
+
+class ColumnBuilder(object):
+    """Appends chunks of values to a preallocated, growable typed array.
+
+    If a chunk cannot be represented in the column's dtype, the column
+    is promoted: int64 to float64 (eg. for NULLs), anything else to
+    object.
+    """
+
+    growth = 1.5
+
+    def __init__(self, dtype=None, capacity=DEFAULT_CHUNKSIZE):
+        self.dtype = dtype
+        self.capacity = capacity
+        self.size = 0
+        self.array = None
+
+    def extend(self, values):
+        if self.array is not None and self.array.dtype == OBJECT:
+            self.dtype = OBJECT
+        elif self.dtype is None:
+            self.dtype = infer_dtype(values)
+        chunk = self.convert(values)
+        if self.array is None:
+            self.array = np.empty(max(self.capacity, len(chunk)),
+                                  dtype=chunk.dtype)
+        elif chunk.dtype != self.array.dtype:
+            self.array = self.array.astype(chunk.dtype)
+        needed = self.size + len(chunk)
+        if needed > len(self.array):
+            self.array.resize(max(needed, int(len(self.array) * self.growth)),
+                              refcheck=False)
+        self.array[self.size:needed] = chunk
+        self.size = needed
+
+    def convert(self, values):
+        """Convert values to an array, promoting self.dtype if needed."""
+        if self.dtype in (INT, FLOAT, DATETIME):
+            try:
+                chunk = np.array(values, dtype=FLOAT if self.dtype == INT
+                                 else self.dtype)
+                if self.dtype != INT:
+                    return chunk
+                if not np.isnan(chunk).any() and \
+                        (chunk == np.trunc(chunk)).all():
+                    # re-convert so that big ints keep their precision
+                    return np.array(values, dtype=INT)
+                log.debug('Promoting int column to float')
+                self.dtype = FLOAT
+                return chunk
+            except (TypeError, ValueError, OverflowError):
+                log.debug('Promoting %s column to object', self.dtype)
+                self.dtype = OBJECT
+        chunk = np.empty(len(values), dtype=OBJECT)
+        chunk[:] = values
+        return chunk
+
+    def finish(self):
+        """Return the array trimmed to the number of values added."""
+        if self.array is None:
+            return np.empty(0, dtype=self.dtype or OBJECT)
+        self.array.resize(self.size, refcheck=False)
+        return self.array
+
+
+def unique_names(names):
+    """Suffix duplicate column names with _1, _2..."""
+    seen = {}
+    unique = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            name = '%s_%i' % (name, seen[name])
+        else:
+            seen[name] = 0
+        unique.append(name)
+    return unique
+
+
+def fetch_columns(result, dtypes=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Fetch all rows from result into a typed numpy array per column.
+
+    Rows are fetched in chunks of chunksize and copied straight into
+    column arrays, so only one chunk of row objects is in memory at a
+    time. Column dtypes are chosen from dtypes, then the cursor
+    description, then from the fetched values.
+
+    Args:
+        result: SqlAlchemy ResultProxy, or any result set with keys(),
+                see ipydb.asciitable.FakedResult.
+        dtypes: optional {column name: dtype}, see model_dtypes().
+        chunksize: number of rows to fetch at a time.
+    Returns:
+        OrderedDict of {column name: numpy.ndarray}.
+    """
+    if np is None:
+        raise ImportError('numpy is required to fetch columns')
+    dtypes = dtypes or {}
+    keys = list(result.keys())
+    described = description_dtypes(result)
+    builders = []
+    for idx, key in enumerate(keys):
+        dtype = dtypes.get(key)
+        if dtype is None and idx < len(described):
+            dtype = described[idx]
+        builders.append(ColumnBuilder(dtype, capacity=chunksize))
+    for rows in iter_batches(result, chunksize):
+        for builder, values in zip(builders, zip(*rows)):
+            builder.extend(list(values))
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+    return OrderedDict(zip(unique_names(keys),
+                           (b.finish() for b in builders)))
+
+
+def fetch_dataframe(result, dtypes=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Fetch all rows from result into a pandas.DataFrame.
+
+    See fetch_columns().
+    """
+    if pd is None:
+        raise ImportError('pandas is required to fetch a DataFrame')
+    columns = fetch_columns(result, dtypes=dtypes, chunksize=chunksize)
+    return pd.DataFrame(columns, columns=list(columns))
+
+
+def frame_columns(frame):
+    """Return the column names and column arrays of a frame.
+
+    Args:
+        frame: a pandas.DataFrame or a numpy structured / record array.
+    Returns:
+        tuple of (list of column names, list of 1-d numpy arrays).
+    """
+    if hasattr(frame, 'columns') and hasattr(frame, 'iloc'):  # DataFrame
+        names = [str(name) for name in frame.columns]
+        arrays = []
+        for idx in range(len(names)):
+            series = frame.iloc[:, idx]
+            to_numpy = getattr(series, 'to_numpy', None)
+            arrays.append(to_numpy() if to_numpy else series.values)
+        return names, arrays
+    names = getattr(getattr(frame, 'dtype', None), 'names', None)
+    if names:
+        return list(names), [frame[name] for name in names]
+    raise TypeError('Expected a pandas DataFrame or numpy record array, '
+                    'not %s' % type(frame).__name__)
+
+
+def column_values(array):
+    """Convert a 1-d numpy array to a list of python values.
+
+    The conversion is done for the whole array at once by tolist().
+    NaN and NaT become None, datetime64 values become datetimes.
+    """
+    kind = array.dtype.kind
+    if kind == 'M':
+        return array.astype(DATETIME).tolist()  # NaT -> None
+    if kind == 'm':
+        return array.astype('timedelta64[us]').tolist()
+    values = array.tolist()
+    if kind == 'f':
+        missing = np.isnan(array)
+        if missing.any():
+            for idx in np.flatnonzero(missing).tolist():
+                values[idx] = None
+    elif kind == 'O':
+        values = [None if value != value else value for value in values]
+    return values
@@ -13,6 +13,7 @@ from sqlalchemy.sql.compiler import RESERVED_WORDS
 
 from ipydb.engine import getconfigs
 from ipydb.magic import SQL_ALIASES
+from ipydb.metrics import registry
 
 log = logging.getLogger(__name__)
 reassignment = re.compile(r'^\w+\s*=\s*%((\w+).*)')
@@ -41,7 +42,8 @@ def ipydb_complete(self, event):
             if sqlplugin.debug:
                 print('complete: sym=[%s] line=[%s] tuc=[%s]' % (
                     event.symbol, event.line, event.text_until_cursor))
-            completions = sqlplugin.completer.complete(event)
+            with registry.timed('completion'):
+                completions = sqlplugin.completer.complete(event)
             if sqlplugin.debug:
                 print('completions:', completions)
             return completions
@@ -102,6 +104,7 @@ class IpydbCompleter(object):
         self.get_db = get_db
         self.commands_completers = {
             'connect': self.connection_nickname,
+            'use': self.connection_nickname,
             'sqlformat': self.sql_format,
             'references': self.table_dot_field,
             'fields': self.table_dot_field,
@@ -109,6 +112,9 @@ class IpydbCompleter(object):
             'joins': self.table_name,
             'fks': self.table_name,
             'describe': self.table_name,
+            'export': self.table_name,
+            'profile_table': self.table_name,
+            'browse': self.table_name,
             'sql': self.sql_statement,
             'runsql': lambda _: None  # delegate to ipython for file match
         }
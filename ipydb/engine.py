@@ -5,12 +5,42 @@ a 'connection configuration file'"""
 from future.standard_library import install_aliases
 install_aliases()
 
+from collections import deque, OrderedDict
+import logging
+import os
+import threading
+import time
 from urllib import parse
+import weakref
 from configparser import ConfigParser, DuplicateSectionError
 
 import sqlalchemy as sa
 
 from ipydb import CONFIG_FILE
+from ipydb.utils import percentile
+
+log = logging.getLogger(__name__)
+
+
+def _boolean(value):
+    return str(value).strip().lower() in ('1', 'yes', 'true', 'on')
+
+
+# ~/.db-connections keys which are passed through to create_engine
+POOL_OPTIONS = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_timeout': int,
+    'pool_recycle': int,
+    'pool_pre_ping': _boolean,
+}
+# options which are meaningless for pools without a fixed size
+SIZE_OPTIONS = 'pool_size max_overflow pool_timeout'.split()
+
+# engine -> PoolStats
+_pool_stats = weakref.WeakKeyDictionary()
+# (CONFIG_FILE, its mtime) -> getconfigs() result
+_configs_cache = {}
 
 
 def getconfigparser():
@@ -20,17 +50,30 @@ def getconfigparser():
 
 
 def getconfigs():
-    """Return a dictionary of saved database connection configurations."""
-    cp = getconfigparser()
-    configs = {}
-    default = None
-    for section in cp.sections():
-        conf = dict(cp.defaults())
-        conf.update(dict(cp.items(section)))
-        if conf.get('default'):
-            default = section
-        configs[section] = conf
-    return default, configs
+    """Return a dictionary of saved database connection configurations.
+
+    The configuration file is only parsed again once it has changed.
+    """
+    try:
+        key = (CONFIG_FILE, os.path.getmtime(CONFIG_FILE))
+    except OSError:
+        key = (CONFIG_FILE, None)
+    if key not in _configs_cache:
+        _configs_cache.clear()
+        cp = getconfigparser()
+        configs = {}
+        default = None
+        for section in cp.sections():
+            conf = dict(cp.defaults())
+            conf.update(dict(cp.items(section)))
+            if conf.get('default'):
+                default = section
+            configs[section] = conf
+        _configs_cache[key] = default, configs
+    default, configs = _configs_cache[key]
+    # copies, so that callers can't change the cached configurations
+    return default, dict((name, dict(conf))
+                         for name, conf in configs.items())
 
 
 def get_nicknames():
@@ -53,19 +96,41 @@ def from_config(configname=None):
         config = configs[configname]
         connect_args = {}
         engine = from_url(make_connection_url(config),
-                          connect_args=connect_args)
+                          connect_args=connect_args,
+                          **pool_options(config))
     return engine
 
 
-def from_url(url, connect_args={}):
+def pool_options(config):
+    """Return connection pool keyword arguments for create_engine.
+
+    Reads pool_size, max_overflow, pool_timeout, pool_recycle and
+    pool_pre_ping from a connection configuration.
+
+    Args:
+        config: dict-like object, a section from ~/.db-connections.
+    Returns:
+        dict of keyword arguments for sqlalchemy.create_engine.
+    """
+    options = {}
+    for key, convert in POOL_OPTIONS.items():
+        value = config.get(key)
+        if value not in (None, ''):
+            options[key] = convert(value)
+    return options
+
+
+def from_url(url, connect_args={}, **pool_options):
     """Connect to a database using an SqlAlchemy URL.
 
     Args:
         url: An SqlAlchemy-style DB connection URL.
         connect_args: extra argument to be passed to the underlying
                       DB-API driver.
+        pool_options: connection pool keyword arguments for
+                      create_engine, see pool_options().
     Returns:
-        True if connection was successful.
+        An SqlAlchemy engine.
     """
     url_string = url
     url = sa.engine.url.make_url(str(url_string))
@@ -85,10 +150,237 @@ def from_url(url, connect_args={}):
         import MySQLdb.cursors
         # use server-side cursors by default (does this work with myISAM?)
         connect_args = {'cursorclass': MySQLdb.cursors.SSCursor}
-    engine = sa.engine.create_engine(url, connect_args=connect_args)
+    if url.drivername.startswith('sqlite'):
+        for option in SIZE_OPTIONS:
+            if pool_options.pop(option, None) is not None:
+                log.debug('Ignoring %s for sqlite', option)
+    engine = sa.engine.create_engine(url, connect_args=connect_args,
+                                     **pool_options)
+    _pool_stats[engine] = PoolStats(engine)
     return engine
 
 
+def get_pool_stats(engine):
+    """Return the PoolStats for an engine created by from_url, or None."""
+    return _pool_stats.get(engine)
+
+
+class PoolStats(object):
+    """Connection pool statistics for an engine.
+
+    Counts connections and checkouts and keeps a bounded sample of
+    how long callers waited for a connection from the pool and how
+    long the driver took to establish new connections. The time taken
+    to establish a connection is not counted as waiting for the pool.
+    """
+
+    max_samples = 1000
+
+    def __init__(self, engine):
+        self.connects = 0
+        self.checkouts = 0
+        self.wait_times = deque(maxlen=self.max_samples)
+        self.connect_times = deque(maxlen=self.max_samples)
+        self._local = threading.local()
+        sa.event.listen(engine, 'do_connect', self.on_do_connect)
+        sa.event.listen(engine, 'connect', self.on_connect)
+        sa.event.listen(engine, 'checkout', self.on_checkout)
+        sa.event.listen(engine, 'engine_disposed', self.on_engine_disposed)
+        self.instrument(engine.pool)
+
+    def instrument(self, pool):
+        """Time the wait for a connection to be handed out by pool.
+
+        All of SqlAlchemy's checkout paths go through Pool._do_get(),
+        which blocks while the pool is exhausted. SqlAlchemy has no event
+        for the start of a checkout, so _do_get is wrapped. Engine.dispose()
+        replaces the pool, which is instrumented again by
+        on_engine_disposed().
+        """
+        do_get = pool._do_get
+        wait_times = self.wait_times
+        local = self._local
+
+        def timed_do_get(*args, **kw):
+            start = time.time()
+            local.connecting = 0.0
+            try:
+                return do_get(*args, **kw)
+            finally:
+                wait_times.append(max(time.time() - start - local.connecting,
+                                      0.0))
+        pool._do_get = timed_do_get
+
+    def on_engine_disposed(self, engine):
+        self.instrument(engine.pool)
+
+    def on_do_connect(self, dialect, conn_rec, cargs, cparams):
+        self._local.connect_start = time.time()
+
+    def on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+        start = getattr(self._local, 'connect_start', None)
+        if start is not None:
+            elapsed = time.time() - start
+            self.connect_times.append(elapsed)
+            self._local.connect_start = None
+            # connecting within _do_get() isn't waiting for the pool
+            self._local.connecting = getattr(self._local, 'connecting',
+                                             0.0) + elapsed
+
+    def on_checkout(self, dbapi_connection, connection_record,
+                    connection_proxy):
+        self.checkouts += 1
+
+    def status(self, pool):
+        """Return a list of (statistic, value) tuples describing pool."""
+        def ms(value):
+            return '-' if value is None else '%0.2f ms' % (value * 1000)
+
+        def count(method):
+            func = getattr(pool, method, None)
+            return func() if callable(func) else '-'
+        rows = [
+            ('Pool', type(pool).__name__),
+            ('Size', count('size')),
+            ('Checked out', count('checkedout')),
+            ('Idle', count('checkedin')),
+            ('Overflow', count('overflow')),
+            ('Connections made', self.connects),
+            ('Checkouts', self.checkouts),
+        ]
+        for label, samples in (('Wait', self.wait_times),
+                               ('Connect', self.connect_times)):
+            samples = sorted(samples)
+            rows.append(('%s min' % label, ms(samples[0] if samples
+                                              else None)))
+            for pct in (50, 95, 99):
+                rows.append(('%s p%i' % (label, pct),
+                             ms(percentile(samples, pct))))
+        return rows
+
+
+class ConnectionRegistry(object):
+    """Live engines keyed by connection nickname.
+
+    Engines are kept connected so that switching between databases does
+    not need to reconnect. At most maxsize engines are kept: adding
+    another disposes the least recently used engine's pool.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.engines = OrderedDict()
+
+    def __contains__(self, name):
+        return name in self.engines
+
+    def __len__(self):
+        return len(self.engines)
+
+    def names(self):
+        """Return registered names, most recently used last."""
+        return list(self.engines)
+
+    def add(self, name, engine):
+        """Register engine as name, replacing any engine of that name."""
+        old = self.engines.pop(name, None)
+        if old is not None and old is not engine:
+            old.dispose()
+        self.engines[name] = engine
+        while len(self.engines) > self.maxsize:
+            evicted_name, evicted = self.engines.popitem(last=False)
+            log.debug('Disposing least recently used engine: %s',
+                      evicted_name)
+            evicted.dispose()
+
+    def get(self, name):
+        """Return the engine registered as name and mark it as used.
+
+        Raises:
+            KeyError if there is no engine registered as name.
+        """
+        engine = self.engines.pop(name)
+        self.engines[name] = engine
+        return engine
+
+
+class BackgroundConnection(object):
+    """Create an engine and make its first connection in a thread.
+
+    Connecting to a slow or unreachable database can take as long as a
+    TCP timeout, so that this is not done while the user waits for a
+    prompt. The engine (or the error which prevented connecting) is
+    collected with result().
+    """
+
+    def __init__(self, url, connect_args={}, pool_options=None,
+                 nickname=None):
+        """
+        Args:
+            url: An SqlAlchemy-style DB connection URL.
+            connect_args: see from_url().
+            pool_options: see from_url().
+            nickname: name of the connection configuration, if any.
+        """
+        self.url = url
+        self.nickname = nickname
+        self.engine = None
+        self.error = None
+        self.discarded = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.connect, args=(url, connect_args,
+                                       dict(pool_options or {})),
+            name='ipydb-connect')
+        self.thread.daemon = True  # never hold up exiting the shell
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def connect(self, url, connect_args, pool_options):
+        """runs in a new thread"""
+        new_engine = None
+        try:
+            new_engine = from_url(url, connect_args=connect_args,
+                                  **pool_options)
+            with new_engine.connect():
+                pass
+        except Exception as e:
+            log.debug('Background connection failed', exc_info=True)
+            self.error = e
+            if new_engine is not None:
+                new_engine.dispose()
+            return
+        with self.lock:
+            self.engine = new_engine
+            if self.discarded:
+                new_engine.dispose()
+
+    def done(self):
+        """Return True once connecting has succeeded or failed."""
+        return not self.thread.is_alive()
+
+    def result(self, timeout=None):
+        """Wait for the connection and return its engine.
+
+        Raises:
+            The exception which prevented connecting.
+        """
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.engine
+
+    def discard(self):
+        """Dispose of the engine, now or once it has connected."""
+        with self.lock:
+            self.discarded = True
+            if self.engine is not None:
+                self.engine.dispose()
+
+
 def make_connection_url(config):
     """
     Returns an SqlAlchemy connection URL based upon values in config dict.
@@ -127,3 +419,4 @@ def save_connection(name, engine, overwrite=False):
     cp.set(name, 'query', url.query or '')
     with open(CONFIG_FILE, 'w') as fout:
         cp.write(fout)
+    _configs_cache.clear()
@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+
+"""
+Write result sets to files.
+
+Supported formats:
+    csv: comma separated values.
+    parquet, arrow: Apache Parquet and Arrow IPC files. These require
+        pyarrow and are written one record batch at a time.
+    npz: a numpy .npz archive with one array per column. Requires numpy.
+    rows: ipydb's native length-prefixed binary format, which needs
+        no extra dependencies. See write_rows() and read_rows().
+
+csv and rows files can be compressed as they are written, with gzip or,
+if the zstandard package is installed, zstd. Parquet files use the
+requested codec internally.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+import csv
+import datetime as dt
+import decimal
+import gzip
+import io
+import logging
+import numbers
+import os
+import struct
+
+from dateutil import parser as dateparser
+from future.utils import PY2, text_type
+from past.builtins import basestring
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: nocover
+    pa = pq = None
+try:
+    import zstandard
+except ImportError:  # pragma: nocover
+    zstandard = None
+
+from ipydb import columnar
+from ipydb.utils import iter_batches, UnicodeWriter
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+# rows held back while waiting to learn column types, see _arrow_batches
+MAX_PENDING_ROWS = 100000
+EXPORT_FORMATS = ['csv', 'parquet', 'arrow', 'npz', 'rows']
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.npz': 'npz',
+    '.rows': 'rows',
+}
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+ROWS_MAGIC = b'IPYDBROWS\x01'
+
+
+def guess_compression(filepath):
+    """Return 'gzip', 'zstd' or None based upon filepath's extension."""
+    return COMPRESSIONS.get(os.path.splitext(filepath)[1].lower())
+
+
+def guess_format(filepath, default='csv'):
+    """Return the export format for filepath based upon its extension.
+
+    A trailing compression extension is ignored: out.csv.gz is csv.
+    """
+    root, ext = os.path.splitext(filepath)
+    if ext.lower() in COMPRESSIONS:
+        ext = os.path.splitext(root)[1]
+    return EXTENSIONS.get(ext.lower(), default)
+
+
+def open_output(filepath, compression=None):
+    """Open filepath for writing bytes, optionally compressing them.
+
+    Args:
+        filepath: path of the file to write.
+        compression: None, 'gzip' or 'zstd'.
+    Returns:
+        a writable binary file object.
+    """
+    if compression is None:
+        return io.open(filepath, 'wb')
+    if compression == 'gzip':
+        return gzip.open(filepath, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd compression requires the zstandard '
+                             'package: pip install zstandard')
+        return zstandard.open(filepath, 'wb')
+    raise ValueError('Unknown compression: %s. Try gzip or zstd' %
+                     compression)
+
+
+def export(cursor, filepath, fmt=None, batch_size=DEFAULT_BATCH_SIZE,
+           dtypes=None, compression=None):
+    """Write all rows from cursor to filepath.
+
+    If a format needs a library which is not installed, the rows are
+    written in the next best format that is available instead, to
+    filepath with its extension replaced.
+
+    Args:
+        cursor: result set, see SqlPlugin.render_result().
+        filepath: path of the file to write.
+        fmt: one of EXPORT_FORMATS, default is guess_format(filepath).
+        batch_size: number of rows to fetch and write at a time.
+        dtypes: optional {column name: numpy dtype}, used by npz.
+        compression: None, 'gzip' or 'zstd'. Default is
+                     guess_compression(filepath). Not supported by
+                     arrow or npz.
+    Returns:
+        tuple of (number of rows written, path written to, format).
+    """
+    if fmt is None:
+        fmt = guess_format(filepath)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError('Unknown export format: %s. Try one of: %s' % (
+            fmt, ', '.join(EXPORT_FORMATS)))
+    if compression is None:
+        compression = guess_compression(filepath)
+    if fmt in ('parquet', 'arrow') and pa is None:
+        fallback = 'npz' if columnar.np is not None else 'rows'
+        filepath = os.path.splitext(filepath)[0] + '.' + fallback
+        print("pyarrow is not installed, writing %s format to %s "
+              "instead" % (fallback, filepath))
+        fmt = fallback
+    if fmt == 'npz' and columnar.np is None:
+        filepath = os.path.splitext(filepath)[0] + '.rows'
+        print("numpy is not installed, writing rows format to %s "
+              "instead" % filepath)
+        fmt = 'rows'
+    writer = WRITERS[fmt]
+    if fmt == 'npz':
+        if compression:
+            raise ValueError('npz files are always compressed')
+        rows = writer(cursor, filepath, batch_size, dtypes=dtypes)
+    elif fmt == 'arrow':
+        if compression:
+            raise ValueError('arrow files can not be compressed, '
+                             'try parquet')
+        rows = writer(cursor, filepath, batch_size)
+    else:
+        rows = writer(cursor, filepath, batch_size, compression=compression)
+    return rows, filepath, fmt
+
+
+def csv_writer(out):
+    """Return a csv writer for the text stream out."""
+    if PY2:  # the python 2 csv module can't write unicode
+        return UnicodeWriter(out)
+    return csv.writer(out)
+
+
+def write_csv_rows(cursor, writer, batch_size=DEFAULT_BATCH_SIZE):
+    """Write column headings and then all rows from cursor as CSV.
+
+    Rows are fetched and handed to writer.writerows() a batch at a time.
+
+    Args:
+        cursor: result set, see SqlPlugin.render_result().
+        writer: see csv_writer().
+        batch_size: number of rows to fetch and write at a time.
+    Returns:
+        number of rows written.
+    """
+    writer.writerow(list(cursor.keys()))
+    rows = 0
+    for batch in iter_batches(cursor, batch_size):
+        writer.writerows(batch)
+        rows += len(batch)
+    return rows
+
+
+def encode_csv(rows):
+    """Return rows as utf-8 encoded CSV."""
+    if PY2:
+        buf = io.BytesIO()
+        UnicodeWriter(buf).writerows(rows)
+        return buf.getvalue()
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+
+def compress(data, compression=None):
+    """Return data compressed as a single gzip member or zstd frame.
+
+    Compressed chunks can be appended one after another: gzip and zstd
+    readers decompress concatenated members (frames) as one stream.
+    """
+    if compression is None:
+        return data
+    if compression == 'gzip':
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as out:
+            out.write(data)
+        return buf.getvalue()
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd compression requires the zstandard '
+                             'package: pip install zstandard')
+        return zstandard.ZstdCompressor().compress(data)
+    raise ValueError('Unknown compression: %s. Try gzip or zstd' %
+                     compression)
+
+
+def write_csv(cursor, filepath, batch_size=DEFAULT_BATCH_SIZE,
+              compression=None):
+    """Write cursor to filepath as utf-8 encoded CSV.
+
+    Text goes through a single buffered io.TextIOWrapper, which encodes
+    it a buffer-full at a time on its way to the (compressed) file.
+    """
+    with open_output(filepath, compression) as raw:
+        if PY2:
+            return write_csv_rows(cursor, csv_writer(raw), batch_size)
+        out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        try:
+            return write_csv_rows(cursor, csv_writer(out), batch_size)
+        finally:
+            out.detach()  # flush, but leave raw for the with to close
+
+
+def _arrow_batches(cursor, batch_size):
+    """Yield pyarrow.RecordBatch objects with a consistent schema.
+
+    Column types are inferred from the first values which are not NULL.
+    Batches are held back until every column has had such a value, so
+    that a column which starts with NULLs still gets its real type.
+    Columns which are NULL throughout get arrow's null type. If no value
+    turns up within MAX_PENDING_ROWS rows, the column is written as
+    strings, to bound the memory used by held back batches.
+    """
+    names = columnar.unique_names(list(cursor.keys()))
+    types = [None] * len(names)
+    as_text = set()  # indexes of columns written as strings
+    pending = []
+    pending_rows = 0
+    schema_fixed = False
+
+    def make_batch(columns):
+        arrays = []
+        for i, values in enumerate(columns):
+            values = list(values)
+            if i in as_text:
+                values = [None if value is None else text_type(value)
+                          for value in values]
+            arrays.append(pa.array(values, type=types[i]))
+        return pa.RecordBatch.from_arrays(arrays, names)
+
+    for rows in iter_batches(cursor, batch_size):
+        columns = list(zip(*rows))
+        if schema_fixed:
+            yield make_batch(columns)
+            continue
+        for i, values in enumerate(columns):
+            if types[i] is None:
+                typ = pa.array(list(values)).type
+                if typ != pa.null():
+                    types[i] = typ
+        pending.append(columns)
+        pending_rows += len(rows)
+        if None in types and pending_rows < MAX_PENDING_ROWS:
+            continue
+        for i, typ in enumerate(types):
+            if typ is None:
+                log.debug('No values in the first %i rows of %s, writing '
+                          'it as strings', pending_rows, names[i])
+                types[i] = pa.string()
+                as_text.add(i)
+        schema_fixed = True
+        for columns in pending:
+            yield make_batch(columns)
+        pending = []
+    types = [pa.null() if typ is None else typ for typ in types]
+    for columns in pending:
+        yield make_batch(columns)
+
+
+def write_parquet(cursor, filepath, batch_size=DEFAULT_BATCH_SIZE,
+                  compression=None):
+    rows = 0
+    writer = None
+    try:
+        for batch in _arrow_batches(cursor, batch_size):
+            if writer is None:
+                writer = pq.ParquetWriter(filepath, batch.schema,
+                                          compression=compression or
+                                          'snappy')
+            writer.write_table(pa.Table.from_batches([batch]))
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_arrow(cursor, filepath, batch_size=DEFAULT_BATCH_SIZE):
+    rows = 0
+    writer = None
+    sink = pa.OSFile(filepath, 'wb')
+    try:
+        for batch in _arrow_batches(cursor, batch_size):
+            if writer is None:
+                writer = pa.ipc.new_file(sink, batch.schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+        sink.close()
+    return rows
+
+
+def write_npz(cursor, filepath, batch_size=DEFAULT_BATCH_SIZE, dtypes=None):
+    """Write one array per column to a compressed .npz archive.
+
+    The .npz format can't be appended to, so all columns are fetched
+    into memory (as typed arrays, see columnar.fetch_columns) first.
+    """
+    columns = columnar.fetch_columns(cursor, dtypes=dtypes,
+                                     chunksize=batch_size)
+    # given a file name, numpy would add .npz to it if it's missing
+    with open(filepath, 'wb') as fout:
+        columnar.np.savez_compressed(fout, **columns)
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+# Native 'rows' format:
+#   ROWS_MAGIC
+#   uint32 column count, then for each column: uint32 length, utf-8 name
+#   rows, one after another: for each column a one byte type tag followed
+#   by the value (see _encode_value). All integers are little-endian.
+_uint32 = struct.Struct('<I')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+
+
+def _pack_bytes(tag, data):
+    return tag + _uint32.pack(len(data)) + data
+
+
+def _encode_value(value):
+    if value is None:
+        return b'N'
+    if isinstance(value, bool):
+        return b'?' + (b'\x01' if value else b'\x00')
+    if isinstance(value, numbers.Integral) and -2 ** 63 <= value < 2 ** 63:
+        return b'i' + _int64.pack(value)
+    if isinstance(value, float):
+        return b'f' + _float64.pack(value)
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return _pack_bytes(b'b', value)
+    if isinstance(value, basestring):
+        return _pack_bytes(b's', value.encode('utf-8'))
+    if isinstance(value, decimal.Decimal):
+        return _pack_bytes(b'd', str(value).encode('utf-8'))
+    if isinstance(value, dt.datetime):
+        return _pack_bytes(b'T', value.isoformat().encode('utf-8'))
+    if isinstance(value, dt.date):
+        return _pack_bytes(b'D', value.isoformat().encode('utf-8'))
+    if isinstance(value, dt.time):
+        return _pack_bytes(b't', value.isoformat().encode('utf-8'))
+    return _pack_bytes(b's', str(value).encode('utf-8'))
+
+
+def rows_header(keys):
+    """Return the header of a 'rows' format file with columns keys."""
+    header = [ROWS_MAGIC, _uint32.pack(len(keys))]
+    for key in keys:
+        header.append(_uint32.pack(len(key.encode('utf-8'))))
+        header.append(key.encode('utf-8'))
+    return b''.join(header)
+
+
+def encode_rows(rows):
+    """Return rows encoded in the 'rows' format."""
+    return b''.join(_encode_value(value) for row in rows for value in row)
+
+
+def write_rows(cursor, filepath, batch_size=DEFAULT_BATCH_SIZE,
+               compression=None):
+    rows = 0
+    with open_output(filepath, compression) as out:
+        out.write(rows_header(list(cursor.keys())))
+        for batch in iter_batches(cursor, batch_size):
+            out.write(encode_rows(batch))
+            rows += len(batch)
+    return rows
+
+
+_decoders = {
+    b's': lambda data: data.decode('utf-8'),
+    b'b': lambda data: data,
+    b'd': lambda data: decimal.Decimal(data.decode('utf-8')),
+    b'T': lambda data: dateparser.parse(data.decode('utf-8')),
+    b'D': lambda data: dateparser.parse(data.decode('utf-8')).date(),
+    b't': lambda data: dateparser.parse(data.decode('utf-8')).time(),
+}
+
+
+def open_input(filepath, compression=None):
+    """Open filepath for reading bytes, see open_output()."""
+    if compression == 'gzip':
+        return gzip.open(filepath, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd decompression requires the zstandard '
+                             'package: pip install zstandard')
+        return zstandard.open(filepath, 'rb')
+    return io.open(filepath, 'rb')
+
+
+def read_rows(filepath, compression=None):
+    """Read a file written in the native 'rows' format.
+
+    Args:
+        filepath: path of the file to read.
+        compression: None, 'gzip' or 'zstd'. Default is
+                     guess_compression(filepath).
+    Returns:
+        tuple of (list of column names, generator of row tuples).
+    """
+    fin = open_input(filepath, compression or guess_compression(filepath))
+
+    def read(size):
+        data = fin.read(size)
+        if len(data) != size:
+            raise ValueError('%s is truncated' % filepath)
+        return data
+
+    if fin.read(len(ROWS_MAGIC)) != ROWS_MAGIC:
+        fin.close()
+        raise ValueError('%s is not an ipydb rows file' % filepath)
+    ncols = _uint32.unpack(read(4))[0]
+    keys = [read(_uint32.unpack(read(4))[0]).decode('utf-8')
+            for _ in range(ncols)]
+
+    def read_value(tag):
+        if tag == b'N':
+            return None
+        if tag == b'?':
+            return read(1) == b'\x01'
+        if tag == b'i':
+            return _int64.unpack(read(8))[0]
+        if tag == b'f':
+            return _float64.unpack(read(8))[0]
+        return _decoders[tag](read(_uint32.unpack(read(4))[0]))
+
+    def rows():
+        with fin:
+            while True:
+                tag = fin.read(1)
+                if not tag:
+                    return
+                row = [read_value(tag)]
+                row.extend(read_value(read(1)) for _ in range(ncols - 1))
+                yield tuple(row)
+    return keys, rows()
+
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+    'npz': write_npz,
+    'rows': write_rows,
+}
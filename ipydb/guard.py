@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+A pre-execution cost guard for unbounded SELECTs.
+
+When enabled, a SELECT without a LIMIT (or TOP, FETCH FIRST, ROWNUM)
+has its result size estimated before it is run: from the row estimates
+in the metadata cache for a plain `select * from TABLE`, otherwise with
+the dialect's EXPLAIN. Above a threshold the guard prompts, adds a LIMIT
+or refuses to run the query. The time the guard itself takes is
+recorded, so that its cost on cheap queries can be checked with
+%costguard.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+import logging
+import os
+import re
+import time
+
+import sqlalchemy as sa
+
+from ipydb.utils import multi_choice_prompt
+
+log = logging.getLogger(__name__)
+
+GUARD_MODES = ['off', 'prompt', 'limit', 'refuse']
+DEFAULT_THRESHOLD = 1000000  # estimated rows
+DEFAULT_LIMIT = 1000
+# stands in for the query in the wrapper built by limit_query
+PLACEHOLDER = 'IPYDB_GUARD_QUERY'
+
+reselect = re.compile(r'^[\s(]*(select|with)\b', re.I)
+rebounded = re.compile(
+    r'\b(limit|top|fetch\s+(first|next)|rownum|into)\b', re.I)
+reliterals = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|"
+                        r"/\*.*?\*/", re.S)
+repgrows = re.compile(r'\brows=(\d+)')
+resimplescan = re.compile(r'^\s*select\s+\*\s+from\s+(\w+)\s*;?\s*$',
+                          re.I)
+resqlitescan = re.compile(r'^SCAN (?:TABLE )?(\w+)(?! USING)', re.I)
+
+
+def is_unbounded_select(sql):
+    """Return True if sql is a SELECT which doesn't limit its rows.
+
+    String literals, quoted identifiers and comments are ignored, so
+    that e.g. select 'limit' from t is still unbounded.
+    """
+    if not reselect.match(sql):
+        return False
+    return not rebounded.search(reliterals.sub(' ', sql))
+
+
+def limit_query(sql, dialect, limit):
+    """Return sql wrapped in a select which returns at most limit rows.
+
+    The limit is rendered by SqlAlchemy for dialect, e.g. as LIMIT, TOP
+    or ROWNUM. sql itself is left as it is, so that any bind parameters
+    in it are still bound when the wrapped query is run. A trailing
+    semicolon is removed, and sql goes on lines of its own so that a
+    trailing comment can't comment out the rest of the wrapper.
+    """
+    inner = sa.text(PLACEHOLDER).columns().alias('ipydb_guard')
+    query = sa.select([sa.literal_column('*')]).select_from(inner) \
+        .limit(limit)
+    wrapper = str(query.compile(dialect=dialect,
+                                compile_kwargs={'literal_binds': True}))
+    sql = re.sub(r'[\s;]+$', '', sql)
+    return wrapper.replace(PLACEHOLDER, '\n%s\n' % sql, 1)
+
+
+def cached_estimate(database, sql):
+    """Return the cached row estimate for a plain select * from TABLE.
+
+    Any other query can filter or join its tables' rows, so their
+    estimates say nothing about its result size.
+
+    Args:
+        database: an ipydb.metadata.model.Database.
+        sql: query text.
+    Returns:
+        The estimate, or None if sql is not a plain select * from TABLE
+        or the table has no estimate.
+    """
+    match = resimplescan.match(sql)
+    if not match:
+        return None
+    name = match.group(1).lower()
+    for tablename, table in database.tables.items():
+        if tablename.lower() == name:
+            return table.estimated_rows
+    return None
+
+
+def explain_postgresql(conn, sql, params):
+    plan = conn.execute('EXPLAIN ' + sql, **params).fetchall()
+    match = repgrows.search(plan[0][0]) if plan else None
+    return int(match.group(1)) if match else None
+
+
+def explain_mysql(conn, sql, params):
+    """Rows examined: the product of the rows estimates of each step."""
+    estimate = None
+    for row in conn.execute('EXPLAIN ' + sql, **params):
+        if row['rows'] is not None:
+            estimate = (estimate or 1) * int(row['rows'])
+    return estimate
+
+
+def explain_sqlite(conn, sql, params):
+    """Rows of the largest table which is scanned without an index.
+
+    sqlite's query plan has no row estimates, so the estimates are read
+    from sqlite_stat1, which is populated by ANALYZE.
+    """
+    scanned = []
+    for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, **params):
+        match = resqlitescan.match(row[-1])
+        if match:
+            scanned.append(match.group(1))
+    if not scanned:
+        return None
+    estimates = []
+    for table in scanned:
+        stat = conn.execute(sa.text(
+            'select stat from sqlite_stat1 where tbl = :tbl'),
+            tbl=table).first()
+        if stat:
+            estimates.append(int(stat[0].split()[0]))
+    return max(estimates) if estimates else None
+
+
+def explain_oracle(conn, sql, params):
+    statement_id = 'ipydb%i' % os.getpid()
+    conn.execute("EXPLAIN PLAN SET STATEMENT_ID = '%s' FOR %s" % (
+        statement_id, sql), **params)
+    try:
+        row = conn.execute(sa.text(
+            'select cardinality from plan_table '
+            'where statement_id = :sid and id = 0'), sid=statement_id).first()
+    finally:
+        conn.execute(sa.text('delete from plan_table '
+                             'where statement_id = :sid'), sid=statement_id)
+    return int(row[0]) if row and row[0] is not None else None
+
+
+EXPLAINERS = {
+    'postgresql': explain_postgresql,
+    'redshift': explain_postgresql,
+    'mysql': explain_mysql,
+    'sqlite': explain_sqlite,
+    'oracle': explain_oracle,
+}
+
+
+def estimate_rows(engine, sql, params=None):
+    """Return the estimated row count for sql, or None if unknown.
+
+    EXPLAIN is run on its own pooled connection, so that a failure can't
+    abort the user's transaction.
+    """
+    explain = EXPLAINERS.get(engine.dialect.name)
+    if explain is None:
+        return None
+    try:
+        with engine.connect() as conn:
+            return explain(conn, sql, params or {})
+    except Exception:
+        log.debug('Failed to estimate rows for: %s', sql, exc_info=True)
+        return None
+
+
+class CostGuard(object):
+    """Decides whether an unbounded SELECT should be run as-is."""
+
+    def __init__(self, mode='off', threshold=DEFAULT_THRESHOLD,
+                 limit=DEFAULT_LIMIT):
+        """
+        Args:
+            mode: one of GUARD_MODES. What to do with a query estimated
+                  to return more than threshold rows: prompt the user,
+                  add a limit, or refuse to run it. 'off' disables the
+                  guard.
+            threshold: estimated rows above which the guard acts.
+            limit: rows to limit a query to.
+        """
+        self.mode = mode
+        self.threshold = threshold
+        self.limit = limit
+        self.checked = 0
+        self.explained = 0
+        self.cached = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def check(self, engine, sql, params=None, database=None):
+        """Return the query to run in place of sql, or None to refuse.
+
+        Args:
+            engine: SqlAlchemy engine the query will run against.
+            sql: query text.
+            params: bind parameters for sql.
+            database: engine's cached ipydb.metadata.model.Database, for
+                      row estimates which don't need a round trip.
+        """
+        if not self.enabled:
+            return sql
+        start = time.time()
+        estimate = None
+        try:
+            if is_unbounded_select(sql):
+                estimate = self.estimate(engine, sql, params, database)
+        finally:  # the guard's overhead, not including any prompt
+            elapsed = time.time() - start
+            self.checked += 1
+            self.seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            log.debug('cost guard: %s rows estimated in %.1fms',
+                      estimate, elapsed * 1000)
+        if estimate is None or estimate <= self.threshold:
+            return sql
+        action = self.mode
+        if action == 'prompt':
+            action = multi_choice_prompt(
+                'Estimated ~%i rows. [r]un, [l]imit to %i rows or [c]ancel?'
+                % (estimate, self.limit),
+                {'r': 'run', 'l': 'limit', 'c': 'refuse'}, default='c')
+        if action == 'limit':
+            print("Estimated ~%i rows, limiting to %i" % (
+                estimate, self.limit))
+            return limit_query(sql, engine.dialect, self.limit)
+        elif action == 'refuse':
+            print("Not running a query estimated to return ~%i rows "
+                  "(threshold: %i). Add a limit or see %%costguard" % (
+                      estimate, self.threshold))
+            return None
+        return sql
+
+    def estimate(self, engine, sql, params=None, database=None):
+        """Return the estimated rows of an unbounded select, or None.
+
+        Cached table estimates are used for a plain select * from TABLE.
+        Other queries are explained, on dialects which support it.
+        """
+        if database is not None:
+            estimate = cached_estimate(database, sql)
+            if estimate is not None:
+                self.cached += 1
+                return estimate
+        if engine.dialect.name not in EXPLAINERS:
+            return None
+        self.explained += 1
+        return estimate_rows(engine, sql, params)
+
+    def status(self):
+        """Return a list of (statistic, value) describing the guard."""
+        mean = self.seconds / self.checked if self.checked else 0.0
+        return [
+            ('mode', self.mode),
+            ('threshold (rows)', self.threshold),
+            ('limit (rows)', self.limit),
+            ('queries checked', self.checked),
+            ('queries explained', self.explained),
+            ('estimates from cache', self.cached),
+            ('mean overhead (ms)', '%.2f' % (mean * 1000)),
+            ('max overhead (ms)', '%.2f' % (self.max_seconds * 1000)),
+        ]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+A persistent record of the queries run by ipydb.
+
+Each call to SqlPlugin.execute() is saved to an sqlite database next to
+the metadata caches, along with how long it took, so that the most
+expensive queries - individually, or by the total time spent running
+the same query with different literals - can be reported.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+import datetime as dt
+import logging
+import os
+import re
+
+from IPython.utils.path import locate_profile
+import sqlalchemy as sa
+
+log = logging.getLogger(__name__)
+
+HISTORY_FILE = 'history.sqlite'
+
+metadata = sa.MetaData()
+query_history = sa.Table(
+    'query_history', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('sql', sa.Text),
+    sa.Column('fingerprint', sa.Text, index=True),
+    sa.Column('connection', sa.String),
+    sa.Column('started', sa.DateTime, index=True),
+    sa.Column('duration', sa.Float),
+    sa.Column('rowcount', sa.Integer, nullable=True),
+    sa.Column('error', sa.Text, nullable=True))
+
+rewhitespace = re.compile(r'\s+')
+restring = re.compile(r"'(?:[^']|'')*'")
+renumber = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.I)
+relist = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+resince = re.compile(r'^\s*(\d+)\s*([smhdw])\s*$', re.I)
+SINCE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days',
+               'w': 'weeks'}
+
+
+def normalize_sql(sql):
+    """Return sql with runs of whitespace collapsed and no trailing ;"""
+    return rewhitespace.sub(' ', sql).strip().rstrip(';').rstrip()
+
+
+def fingerprint(sql):
+    """Return sql with its literal values replaced by ?
+
+    Queries which differ only by their literals, e.g.
+    select * from t where id = 1 and select * from t where id = 2,
+    have the same fingerprint. IN-lists of any length become (?).
+    """
+    sql = restring.sub('?', normalize_sql(sql))
+    sql = renumber.sub('?', sql)
+    return relist.sub('(?)', sql).lower()
+
+
+def parse_since(since):
+    """Return the datetime for a --since argument.
+
+    Args:
+        since: a relative age such as 30m, 12h, 7d or 2w, or a date
+               or datetime understood by dateutil, e.g. 2014-03-01.
+    """
+    match = resince.match(since)
+    if match:
+        delta = dt.timedelta(**{
+            SINCE_UNITS[match.group(2).lower()]: int(match.group(1))})
+        return dt.datetime.now() - delta
+    from dateutil import parser as dateparser
+    return dateparser.parse(since)
+
+
+def get_history_engine():
+    """Return an SA engine for the history database in the ipython
+    profile directory."""
+    path = os.path.join(locate_profile(), 'ipydb')
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return sa.create_engine(
+        u'sqlite:////%s' % os.path.join(path, HISTORY_FILE))
+
+
+class QueryHistory(object):
+    """Records executed queries and reports on them."""
+
+    def __init__(self, engine=None):
+        """
+        Args:
+            engine: SA engine of the history database. Default is
+                    get_history_engine(), which is created on first use.
+        """
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_history_engine()
+            # history is a convenience: don't wait for fsync per query
+            sa.event.listen(self._engine, 'connect',
+                            lambda conn, record:
+                            conn.execute('PRAGMA synchronous = OFF'))
+            metadata.create_all(self._engine)
+        return self._engine
+
+    def record(self, sql, connection, started, duration, rowcount=None,
+               error=None):
+        """Save a query execution to the history database.
+
+        Args:
+            sql: the query text.
+            connection: name of the connection the query ran on.
+            started: datetime the query started.
+            duration: seconds taken to execute the query.
+            rowcount: rows affected, None if unknown.
+            error: error message if the query failed.
+        """
+        self.engine.execute(query_history.insert().values(
+            sql=normalize_sql(sql), fingerprint=fingerprint(sql),
+            connection=connection, started=started, duration=duration,
+            rowcount=rowcount, error=error))
+
+    def _select(self, columns, since=None, connection=None):
+        query = sa.select(columns)
+        if since is not None:
+            query = query.where(query_history.c.started >= since)
+        if connection is not None:
+            query = query.where(query_history.c.connection == connection)
+        return query
+
+    def recent(self, limit=20, since=None, connection=None):
+        """Return the latest queries, newest first.
+
+        Returns:
+            list of (started, duration, rowcount, connection, sql, error).
+        """
+        c = query_history.c
+        query = self._select([c.started, c.duration, c.rowcount,
+                              c.connection, c.sql, c.error],
+                             since, connection)
+        return self.engine.execute(
+            query.order_by(c.id.desc()).limit(limit)).fetchall()
+
+    def slowest(self, limit=20, since=None, connection=None):
+        """Return the queries which took longest, slowest first.
+
+        Returns:
+            list of (started, duration, rowcount, connection, sql, error).
+        """
+        c = query_history.c
+        query = self._select([c.started, c.duration, c.rowcount,
+                              c.connection, c.sql, c.error],
+                             since, connection)
+        return self.engine.execute(
+            query.order_by(c.duration.desc()).limit(limit)).fetchall()
+
+    def by_fingerprint(self, limit=20, since=None, connection=None):
+        """Return fingerprints ordered by the total time spent on them.
+
+        Returns:
+            list of (fingerprint, calls, total, mean, max, errors).
+        """
+        c = query_history.c
+        total = sa.func.sum(c.duration)
+        query = self._select([
+            c.fingerprint, sa.func.count(c.id), total,
+            sa.func.avg(c.duration), sa.func.max(c.duration),
+            sa.func.count(c.error)], since, connection)
+        return self.engine.execute(
+            query.group_by(c.fingerprint).order_by(total.desc())
+            .limit(limit)).fetchall()
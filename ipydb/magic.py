@@ -15,8 +15,9 @@ from IPython.core.magic_arguments import magic_arguments, \
     argument, parse_argstring
 from IPython.utils.process import arg_split
 
-import sqlparse
 from ipydb.asciitable import PivotResultSet
+from ipydb.guard import GUARD_MODES
+from ipydb.utils import iter_sql_statements
 
 SQL_ALIASES = 'select insert update delete create alter drop'.split()
 
@@ -118,16 +119,47 @@ class SqlMagics(Magics):
     @magic_arguments()
     @argument('-r', '--return', dest='ret', action='store_true',
               help='Return a resultset instead of printing the results')
+    @argument('--df', dest='df', action='store_true',
+              help='Return the results as a pandas DataFrame')
+    @argument('--numpy', dest='numpy', action='store_true',
+              help='Return the results as a dictionary of numpy arrays')
     @argument('-p', '--pivot', dest='single', action='store_true',
               help='View in "single record" mode')
     @argument('-m', '--multiparams', dest='multiparams', default=None,
-              help='A collection of dictionaries of bind parameters')
+              help='An iterable (e.g. a list or generator) of '
+                   'dictionaries of bind parameters')
+    @argument('-b', '--batch-size', dest='batch_size', type=int,
+              default=None,
+              help='Number of -m parameter sets to send at a time, '
+                   'default 5000')
     @argument('-a', '--params', dest='params', default=None,
               help='A dictionary of bind parameters for the sql statement')
     @argument('-f', '--format', action='store_true',
               help='pretty-print sql statement and exit')
     @argument('-o', '--output', action='store', dest='file',
-              help='Write sql output as CSV to the given file')
+              help='Write sql output to the given file. The format is '
+                   'chosen by the file extension: .csv, .parquet, .arrow, '
+                   '.npz or .rows, default csv')
+    @argument('-O', '--output-format', dest='output_format', default=None,
+              help='Format for -o: csv, parquet, arrow, npz or rows')
+    @argument('-z', '--compress', dest='compression', default=None,
+              choices=['gzip', 'zstd'],
+              help='Compress -o output. Default is by file extension: '
+                   '.gz or .zst')
+    @argument('--on', dest='on', default=None,
+              help='Run against the live connection ON instead of the '
+                   'current connection (see %%use)')
+    @argument('--profile', action='store_true', default=False,
+              help='Show how long each stage took: execute, fetch, '
+                   'formatting and paging')
+    @argument('--profile-top', dest='profile_top', type=int, default=None,
+              metavar='N',
+              help='With --profile, also cProfile the client-side stages '
+                   'and list the top N functions')
+    @argument('--profile-split', dest='profile_split', action='store_true',
+              default=False,
+              help='With --profile, split fetching into the driver and '
+                   'sqlalchemy row building. Runs the query twice')
     @argument('sql_statement',  help='The SQL statement to run', nargs="*")
     @line_cell_magic
     def sql(self, args='', cell=None):
@@ -153,6 +185,20 @@ class SqlMagics(Magics):
             for row in results:
                 do_things_with(row.first_name)
 
+        Writing results to a file:
+            Use -o to write results to a file instead of displaying them.
+            Columnar formats are written a batch of rows at a time:
+
+            %select -o people.parquet * from person
+            %select -o people.dat -O rows * from person
+            %select -o people.csv.gz * from person
+
+        Returning columns:
+            To fetch results straight into typed numpy arrays, one per
+            column, use --numpy. Use --df for a pandas DataFrame:
+
+            frame = %select --df * from employees
+
         Shortcut Aliases to %sql:
             ipydb defines some 'short-cut' aliases which call %sql.
             Aliases have been added for:
@@ -167,6 +213,32 @@ class SqlMagics(Magics):
 
                 %sql select * from my_table
 
+        Executing many times:
+            Use -m to run a statement once for each set of bind parameters
+            in a list, or any iterable. Generators are consumed in batches
+            of -b (default 5000) within the current transaction, so memory
+            use stays constant:
+
+            rows = ({'id': i, 'name': 'n%d' % i} for i in range(10 ** 7))
+            %insert -m rows into person (id, name) values (:id, :name)
+
+        Running against another connection:
+            Use --on to run a statement against another live connection
+            (see %use) without switching to it:
+
+                %select --on=otherdb count(*) from my_table
+
+        Profiling:
+            Use --profile to see whether a slow query is spent in the
+            database or in the client: the time taken to execute, fetch,
+            format and page the results is shown after them.
+            --profile-top N also lists the N client-side functions which
+            took the longest. --profile-split runs the query a second
+            time to split the fetch time between the driver and
+            sqlalchemy:
+
+                %select --profile --profile-top=15 * from my_table
+
         """
         args = parse_argstring(self.sql, args)
         params = None
@@ -175,6 +247,7 @@ class SqlMagics(Magics):
         if cell is not None:
             sql += '\n' + cell
         if args.format:
+            import sqlparse
             sqlstr = sqlparse.format(sql, reindent=True)
             if args.ret:
                 return sqlstr
@@ -183,19 +256,37 @@ class SqlMagics(Magics):
             return
         if args.params:
             params = self.shell.user_ns.get(args.params, {})
+        if args.profile or args.profile_top or args.profile_split:
+            self.ipydb.profile_query(sql, params=params, on=args.on,
+                                     top=args.profile_top,
+                                     split=args.profile_split)
+            return
         if args.multiparams:
             multiparams = self.shell.user_ns.get(args.multiparams, [])
+            rows = self.ipydb.execute_many(sql, multiparams,
+                                           batch_size=args.batch_size,
+                                           on=args.on)
+            if args.ret:
+                return rows
+            return
         result = self.ipydb.execute(sql, params=params,
-                                    multiparams=multiparams)
+                                    multiparams=multiparams, on=args.on)
         if args.ret:
             return result
+        if (args.df or args.numpy) and result and result.returns_rows:
+            return self.ipydb.fetch_columns(result, sql, dataframe=args.df,
+                                            on=args.on)
         if result and result.returns_rows:
             if args.single:
                 self.ipydb.render_result(
-                    PivotResultSet(result), paginate=False, filepath=args.file)
+                    PivotResultSet(result), paginate=False, filepath=args.file,
+                    output_format=args.output_format,
+                    compression=args.compression)
             else:
                 self.ipydb.render_result(
-                    result, paginate=not bool(args.file), filepath=args.file)
+                    result, paginate=not bool(args.file), filepath=args.file,
+                    output_format=args.output_format,
+                    compression=args.compression)
         elif result and not result.returns_rows:
             # XXX: do all drivers support this?
             s = 's' if result.rowcount != 1 else ''
@@ -203,11 +294,52 @@ class SqlMagics(Magics):
     sql.__description__ = 'Run an sql statement against ' \
         'the current ipydb connection.'
 
+    @magic_arguments()
+    @argument('-n', dest='repeat', type=int, default=10,
+              help='Number of timed runs. default: 10')
+    @argument('-w', '--warmup', type=int, default=1,
+              help='Number of untimed runs before timing. default: 1')
+    @argument('sql_statement', help='The SQL statement to time', nargs='*')
+    @line_cell_magic
+    def sqlbench(self, args='', cell=None):
+        """Time repeated runs of an SQL statement.
+
+        Usage: %sqlbench [-n N] [--warmup K] SELECT ...
+
+        Runs the statement K times untimed and then N times timed, and
+        shows min/median/p95/p99 latency for each stage of the query:
+        execute, first row, fetching all rows and converting rows to
+        python tuples. Results are not displayed, so the timings exclude
+        formatting and paging.
+
+        To compare two variants of a query give both, separated by ';':
+
+            %%sqlbench -n 20
+            select * from person where name like 'J%';
+            select * from person where substr(name, 1, 1) = 'J'
+        """
+        args = parse_argstring(self.sqlbench, args)
+        sql = ' '.join(args.sql_statement)
+        if cell is not None:
+            sql += '\n' + cell
+        queries = [statement for lineno, statement in
+                   iter_sql_statements(sql.splitlines(True), delimiter=';')]
+        if not queries or len(queries) > 2:
+            print("Usage: %sqlbench [-n N] [--warmup K] "
+                  "STATEMENT [; STATEMENT2]")
+            return
+        self.ipydb.benchmark(queries, repeat=max(args.repeat, 1),
+                             warmup=max(args.warmup, 0))
+    sqlbench.__description__ = 'Time repeated runs of an SQL statement'
+
     @magic_arguments()
     @argument('-d', '--delimiter', action='store', default='/',
-              help='Statement delimiter. Must be on a new line by itself')
+              help="Statement delimiter. Either ';' or a delimiter which "
+                   "must be on a new line by itself")
     @argument('-i', '--interactive', action='store_true', default=False,
               help='Interactive mode - show and prompt each SQL statement')
+    @argument('--resume-from', dest='resume_from', type=int, default=1,
+              help='Skip statements before statement number RESUME_FROM')
     @argument('file', action='store', help='SQL script file')
     @line_magic
     def runsql(self, param=''):
@@ -215,16 +347,249 @@ class SqlMagics(Magics):
 
         SQL statements in the input file are expected to be delimited
         by '/' by itself on a new line. This can be overidden with the
-        -d option.
+        -d option, use -d ';' for semicolon-terminated statements.
+
+        Elapsed time and rows affected are shown for each statement.
+        If a statement fails, the script can be continued from the failed
+        statement once the problem is fixed:
+
+            %runsql --resume-from 39000 migration.sql
         """
         args = parse_argstring(self.runsql, param)
         self.ipydb.run_sql_script(
             args.file,
             interactive=args.interactive,
-            delimiter=args.delimiter)
+            delimiter=args.delimiter,
+            resume_from=args.resume_from)
     runsql.__description__ = 'Run delimited SQL ' \
         'statements from a file'
 
+    @magic_arguments()
+    @argument('-b', '--batch-size', dest='batch_size', type=int,
+              default=None,
+              help='Number of rows to insert at a time, default 5000. '
+                   'Not used by PostgreSQL COPY')
+    @argument('-d', '--delimiter', action='store', default=',',
+              help='CSV field delimiter')
+    @argument('file', action='store', help='CSV file to load')
+    @argument('table', action='store', help='Table to load rows into')
+    @line_magic
+    def load_csv(self, param=''):
+        """Load rows from a CSV file into a table.
+
+        Usage: %load_csv [-b BATCH_SIZE] [-d DELIMITER] FILE TABLE
+
+        The first line of FILE must be a header naming columns of TABLE.
+        The file is streamed and inserted in batches within a single
+        transaction, so very large files can be loaded without reading
+        them into memory. On PostgreSQL (with psycopg2) the file is
+        streamed to COPY instead, and BATCH_SIZE is not used.
+        """
+        args = parse_argstring(self.load_csv, param)
+        self.ipydb.load_csv(args.file, args.table,
+                            batch_size=args.batch_size,
+                            delimiter=args.delimiter)
+    load_csv.__description__ = 'Load rows from a CSV file into a table'
+
+    @magic_arguments()
+    @argument('-b', '--batch-size', dest='batch_size', type=int,
+              default=None,
+              help='Number of rows to insert at a time, default 5000')
+    @argument('frame', action='store',
+              help='Name of a DataFrame or numpy record array')
+    @argument('table', action='store', help='Table to insert rows into')
+    @line_magic
+    def insert_frame(self, param=''):
+        """Insert the rows of a DataFrame or numpy record array into a table.
+
+        Usage: %insert_frame [-b BATCH_SIZE] FRAME TABLE
+
+        The column names of FRAME must be columns of TABLE. Values are
+        converted a column at a time and inserted in batches within a
+        single transaction.
+        """
+        args = parse_argstring(self.insert_frame, param)
+        if args.frame not in self.shell.user_ns:
+            print("No variable named %s" % args.frame)
+            return
+        self.ipydb.insert_frame(self.shell.user_ns[args.frame], args.table,
+                                batch_size=args.batch_size)
+    insert_frame.__description__ = 'Insert a DataFrame into a table'
+
+    @magic_arguments()
+    @argument('-s', '--slowest', action='store_true', default=False,
+              help='Show the slowest queries')
+    @argument('-f', '--by-fingerprint', dest='by_fingerprint',
+              action='store_true', default=False,
+              help='Show total time spent per query, grouping queries '
+                   'which differ only by their literal values')
+    @argument('--since', default=None,
+              help='Only include queries run since SINCE: 30m, 12h, 7d, '
+                   '2w or a date')
+    @argument('-n', '--limit', type=int, default=20,
+              help='Number of rows to show, default 20')
+    @argument('--here', action='store_true', default=False,
+              help='Only include queries run on the current connection')
+    @line_magic
+    def sqlhistory(self, param=''):
+        """Show queries recorded in ipydb's query history.
+
+        Usage: %sqlhistory [-s | -f] [--since SINCE] [-n LIMIT] [--here]
+
+        Every statement run by ipydb is recorded, with its duration,
+        row count and any error, in history.sqlite in the ipython
+        profile directory. Without options the latest queries are shown.
+
+        Examples:
+            %sqlhistory --slowest --since 7d
+            %sqlhistory --by-fingerprint --since 2014-03-01
+        """
+        args = parse_argstring(self.sqlhistory, param)
+        self.ipydb.show_history(slowest=args.slowest,
+                                by_fingerprint=args.by_fingerprint,
+                                since=args.since, limit=args.limit,
+                                here=args.here)
+    sqlhistory.__description__ = 'Show executed queries and their durations'
+
+    @magic_arguments()
+    @argument('-j', '--json', dest='filepath', default=None,
+              help='Also write the metrics to this file as JSON')
+    @argument('-r', '--reset', action='store_true', default=False,
+              help='Reset the metrics after showing them')
+    @line_magic
+    def ipydb_stats(self, param=''):
+        """Show where time has gone in this session.
+
+        Usage: %ipydb_stats [-j FILE] [-r]
+
+        Shows counters (e.g. metadata cache hits and misses), gauges and
+        latency histograms (e.g. execute, completion, rendering and each
+        phase of schema reflection) recorded since ipydb was loaded or
+        the metrics were last reset.
+
+        Examples:
+            %ipydb_stats
+            %ipydb_stats -j /tmp/ipydb-stats.json --reset
+        """
+        args = parse_argstring(self.ipydb_stats, param)
+        self.ipydb.show_stats(filepath=args.filepath, reset=args.reset)
+    ipydb_stats.__description__ = 'Show session metrics: timings, ' \
+        'cache hits and counters'
+
+    @magic_arguments()
+    @argument('-t', '--threshold', type=int, default=None,
+              help='Estimated rows above which the guard acts')
+    @argument('-l', '--limit', type=int, default=None,
+              help='Rows to limit queries to in limit mode')
+    @argument('mode', nargs='?', default=None, choices=GUARD_MODES,
+              help='What to do with an expensive query: %s' %
+              ', '.join(GUARD_MODES))
+    @line_magic
+    def costguard(self, param=''):
+        """Guard against SELECTs which would return too many rows.
+
+        Usage: %costguard [off | prompt | limit | refuse] [-t ROWS] [-l ROWS]
+
+        When the guard is on, a SELECT without a LIMIT has its row count
+        estimated with EXPLAIN (sqlite: from ANALYZE statistics) before
+        it runs. Above the threshold the guard either prompts, adds a
+        limit or refuses to run the query. The guard's settings and its
+        own overhead per query are shown.
+
+        Examples:
+            %costguard refuse -t 5000000
+            %costguard limit -l 500
+        """
+        args = parse_argstring(self.costguard, param)
+        self.ipydb.show_cost_guard(mode=args.mode, threshold=args.threshold,
+                                   limit=args.limit)
+    costguard.__description__ = 'Guard against unbounded, expensive SELECTs'
+
+    @magic_arguments()
+    @argument('-p', '--parallel', type=int, default=1,
+              help='Number of partitions, each exported on its own '
+                   'connection')
+    @argument('-O', '--output-format', dest='output_format', default='csv',
+              help='csv, parquet, arrow, npz or rows. Default csv')
+    @argument('-z', '--compress', dest='compression', default=None,
+              choices=['gzip', 'zstd'], help='Compress output files')
+    @argument('-c', '--chunk-size', dest='chunk_size', type=int,
+              default=None,
+              help='Rows to write between checkpoints, default 50000')
+    @argument('-r', '--resume', action='store_true', default=False,
+              help='Resume an interrupted export into DIR')
+    @argument('table', action='store', help='Table to export')
+    @argument('directory', action='store',
+              help='Directory to write files and manifest.json into')
+    @line_magic
+    def export(self, param=''):
+        """Export all rows of a table to files in a directory.
+
+        Usage: %export [-p N] [-O FORMAT] [-z gzip|zstd] [-r] TABLE DIR
+
+        With --parallel N the table's numeric primary key range is split
+        into N partitions which are streamed concurrently, each on its own
+        pooled connection and into its own file. DIR/manifest.json records
+        each file's key range, row count and sha256 checksum.
+        Tables without a numeric primary key are exported as one stream.
+
+        csv and rows exports are paged through by primary key, and a
+        checkpoint is saved after each chunk of rows. If an export is
+        interrupted, run it again with --resume to carry on from the last
+        checkpoint.
+        """
+        args = parse_argstring(self.export, param)
+        self.ipydb.export_table(args.table, args.directory,
+                                parallel=args.parallel,
+                                output_format=args.output_format,
+                                compression=args.compression,
+                                chunk_size=args.chunk_size,
+                                resume=args.resume)
+    export.__description__ = 'Export a table to files, optionally ' \
+        'in parallel'
+
+    @magic_arguments()
+    @argument('-s', '--sample', type=int, default=None,
+              help='Only profile the first SAMPLE rows of the table')
+    @argument('table', action='store', help='Table to profile')
+    @line_magic
+    def profile_table(self, param=''):
+        """Show null, distinct, min, max and average length per column.
+
+        Usage: %profile_table [--sample N] TABLE
+
+        The statistics are computed by the database with a single
+        aggregate query, so no rows are fetched. (Not called %profile,
+        which is IPython's magic for showing the active profile.)
+        """
+        args = parse_argstring(self.profile_table, param)
+        self.ipydb.profile_table(args.table, sample=args.sample)
+    profile_table.__description__ = 'Profile the columns of a table'
+
+    @magic_arguments()
+    @argument('table', action='store', help='Table to browse')
+    @argument('-w', '--where', nargs='+', default=None,
+              help='Only show rows matching this SQL condition')
+    @line_magic
+    def browse(self, param=''):
+        """Page forwards and backwards through a table.
+
+        Usage: %browse TABLE [--where CONDITION]
+
+        Pages are fetched one at a time, in primary key order, with
+        queries of the form: where key > (last key shown) limit N.
+        Every page is a cheap, indexed query, however deep into the table
+        you page. The table must have a primary key.
+
+        Examples:
+            %browse events
+            %browse events --where kind = 'click'
+        """
+        args = parse_argstring(self.browse, param)
+        self.ipydb.browse(args.table, where=' '.join(args.where)
+                          if args.where else None)
+    browse.__description__ = 'Page through a table by primary key'
+
     @line_magic
     def tables(self, param=''):
         """Show a list of tables for the current db connection.
@@ -356,6 +721,15 @@ class SqlMagics(Magics):
         Each database connection defined in ~/.db-connections is
         then referenceable via its section heading, or NICKNAME.
 
+        Connection pooling can be tuned per connection with the optional
+        keys: pool_size, max_overflow, pool_timeout, pool_recycle
+        (seconds) and pool_pre_ping (yes/no). For example:
+
+            [mydb]
+            ...
+            pool_recycle: 3600
+            pool_pre_ping: yes
+
         Note: Before you can connect, you will need to install a python driver
         for your chosen database. For a list of recommended drivers,
         see the SQLAlchemy documentation:
@@ -364,6 +738,20 @@ class SqlMagics(Magics):
         """
         self.ipydb.connect(param)
 
+    @line_magic
+    def use(self, param):
+        """Switch to another live database connection.
+
+        Usage: %use NICKNAME
+
+        ipydb keeps the most recently used connections open, along with
+        their cached schema metadata, so switching back to one of them
+        is instant. Connections made with %connecturl can be used by
+        their URL. With no NICKNAME, live connections are listed.
+        If NICKNAME is not live, this is the same as %connect NICKNAME.
+        """
+        self.ipydb.use(param.strip())
+
     @line_magic
     def connecturl(self, param):
         """Connect to a database using an SqlAlchemy style connection URL.
@@ -381,6 +769,16 @@ class SqlMagics(Magics):
         """
         self.ipydb.connect_url(param)
 
+    @line_magic
+    def pool(self, arg):
+        """Show connection pool statistics for the current connection.
+
+        Shows checked-out and idle connections along with percentiles of
+        the time spent waiting for a connection from the pool and the time
+        taken to establish new connections.
+        """
+        self.ipydb.show_pool()
+
     @line_magic
     def flushmetadata(self, arg):
         """Flush ipydb's schema caches for the current connection.
@@ -393,7 +791,7 @@ class SqlMagics(Magics):
     @line_magic
     def rereflect(self, arg):
         """Force re-loading of completion metadata."""
-        if not self.ipydb.connected:
+        if not self.ipydb.wait_for_connection():
             print(self.ipydb.not_connected_message)
             return
         self.ipydb.metadata_accessor.get_metadata(
@@ -411,7 +809,7 @@ class SqlMagics(Magics):
         Note: if a configuration exists for NICKNAME it will be overwritten
         with the current engine's connection parameters.
         """
-        if not self.ipydb.connected:
+        if not self.ipydb.wait_for_connection():
             print(self.ipydb.not_connected_message)
             return
         if not len(arg.strip()):
@@ -17,28 +17,52 @@ import logging
 import multiprocessing
 from multiprocessing.pool import ThreadPool
 import os
+import threading
+import time
+import weakref
 
 import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.engine.url import URL
 from IPython.utils.path import locate_profile
 
+from ipydb.metrics import registry
 from ipydb.utils import timer
 from . import model as m
 from . import persist
+from . import stats
+from .lock import FileLock
 
 # invalidate db metadata if it is older than CACHE_MAX_AGE
 MAX_CACHE_AGE = dt.timedelta(minutes=20)
+# bump when ipydb.metadata.model changes: older caches are rebuilt
+SCHEMA_VERSION = 2
+# seconds to wait for another session which is reflecting the same db
+REFLECT_LOCK_TIMEOUT = 15 * 60
+# seconds between checks for its result while waiting
+REFLECT_POLL_INTERVAL = 1
+# seconds to wait for another session's write to the cache to finish
+BUSY_TIMEOUT = 30
 
 log = logging.getLogger(__name__)
 
 Session = orm.sessionmaker()
 
+# get_metadata() is called for every completion, so the per-database key,
+# sqlite engine and schema are worked out once and then looked up.
+_cache_lock = threading.Lock()
+_metadata_engines = weakref.WeakKeyDictionary()  # engine -> (key, engine)
+_stores = {}  # sqlite url -> metadata engine
+_schemas_created = weakref.WeakSet()  # metadata engines
+
 
 def get_metadata_engine(other_engine):
     """Create and return an SA engine for which will be used for
     storing ipydb db metadata about the input engine.
 
+    The result is cached: engines for the same database share one
+    metadata engine.
+
     Args:
         other_engine - SA engine for which we will be storing metadata for.
     Returns:
@@ -46,12 +70,51 @@ def get_metadata_engine(other_engine):
         other_engine. sa_engine is the SA engine that will be used for storing
         metadata about `other_engine`
     """
-    path = os.path.join(locate_profile(), 'ipydb')
-    if not os.path.exists(path):
-        os.makedirs(path)
-    dbfilename = get_db_filename(other_engine)
-    dburl = u'sqlite:////%s' % os.path.join(path, dbfilename)
-    return dbfilename, sa.create_engine(dburl)
+    cached = _metadata_engines.get(other_engine)
+    if cached is not None:
+        return cached
+    with _cache_lock:
+        path = os.path.join(locate_profile(), 'ipydb')
+        if not os.path.exists(path):
+            os.makedirs(path)
+        dbfilename = get_db_filename(other_engine)
+        dburl = u'sqlite:////%s' % os.path.join(path, dbfilename)
+        if dburl not in _stores:
+            _stores[dburl] = create_store_engine(dburl)
+        cached = _metadata_engines[other_engine] = (dbfilename,
+                                                    _stores[dburl])
+    return cached
+
+
+def create_store_engine(dburl):
+    """Return an engine for a metadata cache shared between sessions.
+
+    The cache is in WAL mode, so that sessions can read it while another
+    session writes to it, and waits for BUSY_TIMEOUT for other writers.
+    """
+    engine = sa.create_engine(dburl, connect_args={'timeout': BUSY_TIMEOUT})
+
+    @sa.event.listens_for(engine, 'connect')
+    def set_wal(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+    return engine
+
+
+def reflection_lock(ipydb_engine):
+    """Return the FileLock for reflecting into a metadata cache.
+
+    Returns None for an in-memory cache, which isn't shared.
+    """
+    path = ipydb_engine.url.database
+    if not path or path == ':memory:':
+        return None
+    return FileLock(path + '.lock')
+
+
+def clear_schema(conn):
+    """Delete all cached metadata, keeping the cache's tables."""
+    for table in reversed(m.Base.metadata.sorted_tables):
+        conn.execute(table.delete())
 
 
 def get_db_filename(engine):
@@ -79,11 +142,25 @@ def session_scope(engine):
         session.close()
 
 
+def ensure_schema(engine):
+    """Run create_schema() for a metadata engine, once."""
+    if engine not in _schemas_created:
+        create_schema(engine)
+
+
 def create_schema(engine):
+    version = engine.execute('PRAGMA user_version').scalar()
+    if version != SCHEMA_VERSION:
+        log.debug('Rebuilding metadata cache schema version %s', version)
+        delete_schema(engine)
     m.Base.metadata.create_all(engine)
+    if version != SCHEMA_VERSION:
+        engine.execute('PRAGMA user_version = %i' % SCHEMA_VERSION)
+    _schemas_created.add(engine)
 
 
 def delete_schema(engine):
+    _schemas_created.discard(engine)
     m.Base.metadata.drop_all(engine)
 
 
@@ -107,7 +184,7 @@ class MetaDataAccessor(object):
 
     def read_expunge(self, ipydb_engine):
         with session_scope(ipydb_engine) as session, \
-                timer('Read-Expunge', log=log):
+                timer('Read-Expunge', log=log, metric='persist.read'):
             db = persist.read(session)
             session.expunge_all()  # unhook SA
         return db
@@ -115,11 +192,12 @@ class MetaDataAccessor(object):
     def get_metadata(self, engine, noisy=False, force=False):
         """Fetch metadata for an sqlalchemy engine"""
         db_key, ipydb_engine = get_metadata_engine(engine)
-        create_schema(ipydb_engine)
+        ensure_schema(ipydb_engine)
         db = self.databases[db_key]
         if db.reflecting:
             log.debug('Is already reflecting')
             # we're already busy
+            registry.increment('metadata.hit')
             return db
         if force:
             log.debug('was foreced to re-reflect')
@@ -131,6 +209,7 @@ class MetaDataAccessor(object):
             self.spawn_reflection_thread(db_key, db, engine.url)
             return db
         if db.age > MAX_CACHE_AGE:
+            registry.increment('metadata.miss')
             log.debug('Cache expired age:%s reading from sqlite', db.age)
             # read from sqlite, should be fast enough to do synchronously
             db = self.read_expunge(ipydb_engine)
@@ -143,6 +222,8 @@ class MetaDataAccessor(object):
                 if noisy:
                     print("ipydb is fetching database metadata")
                 self.spawn_reflection_thread(db_key, db, engine.url)
+        else:
+            registry.increment('metadata.hit')
         return db
 
     def spawn_reflection_thread(self, db_key, db, dburl_to_reflect):
@@ -155,36 +236,117 @@ class MetaDataAccessor(object):
     def reflect_db(self, db_key, db, dburl_to_reflect):
         """runs in a new thread"""
         db.reflecting = True
-        target_engine = sa.create_engine(dburl_to_reflect)
-        db_key, ipydb_engine = get_metadata_engine(target_engine)
-        db.sa_metadata.bind = target_engine
-        with timer('sa reflect', log=log):
-            db.sa_metadata.reflect()
-        with timer('drop-recreate schema', log=log):
-            delete_schema(ipydb_engine)
-            create_schema(ipydb_engine)
-        with timer('Persist sa data', log=log):
-            persist.write_sa_metadata(ipydb_engine, db.sa_metadata)
+        start = time.time()
+        registry.increment('reflect.runs')
+        # reflection is a one-off, so don't keep pooled connections open
+        target_engine = sa.create_engine(dburl_to_reflect,
+                                         poolclass=sa.pool.NullPool)
+        lock = None
+        try:
+            db_key, ipydb_engine = get_metadata_engine(target_engine)
+            ensure_schema(ipydb_engine)
+            # one session reflects, other sessions wait and read its result
+            lock = reflection_lock(ipydb_engine)
+            if lock is not None and not lock.acquire(blocking=False):
+                log.debug('Waiting for another session to reflect')
+                registry.increment('reflect.waits')
+                with timer('wait for reflecting session', log=log,
+                           metric='reflect.wait'):
+                    picked_up = self.wait_for_reflection(
+                        db, ipydb_engine, lock, dt.datetime.now())
+                if picked_up is None:
+                    log.debug('Gave up waiting for another session')
+                    return
+                if picked_up:
+                    registry.increment('reflect.picked_up')
+                    return
+            db.sa_metadata.bind = target_engine
+            with timer('sa reflect', log=log, metric='reflect.sa_reflect'):
+                db.sa_metadata.reflect()
+            with timer('table statistics', log=log,
+                       metric='reflect.statistics'):
+                table_stats = stats.collect(target_engine)
+            # replace the cache in one transaction: sessions reading it
+            # see either the old or the new metadata
+            with ipydb_engine.begin() as conn:
+                with timer('clear cache', log=log, metric='reflect.clear'):
+                    clear_schema(conn)
+                with timer('Persist sa data', log=log,
+                           metric='persist.write'):
+                    persist.write_sa_metadata(conn, db.sa_metadata,
+                                              table_stats)
+            self.read_into(db, ipydb_engine)
+        except Exception:
+            registry.increment('reflect.errors')
+            raise
+        finally:
+            if lock is not None:
+                lock.release()
+            target_engine.dispose()
+            db.reflecting = False
+            registry.observe('reflect', time.time() - start)
+
+    def wait_for_reflection(self, db, ipydb_engine, lock, since):
+        """Wait for another session to reflect into ipydb_engine.
+
+        The cache is checked every REFLECT_POLL_INTERVAL seconds, so that
+        the other session's result is read as soon as it is written,
+        even if that session then holds on to the lock.
+
+        Args:
+            since: datetime when this session found the cache stale.
+        Returns:
+            True if metadata written since `since` was read into db.
+            False if the lock was acquired without a new result (the
+            other session failed), so that this session should reflect.
+            None if REFLECT_LOCK_TIMEOUT passed first.
+        """
+        deadline = time.time() + REFLECT_LOCK_TIMEOUT
+        while True:
+            acquired = lock.acquire(
+                timeout=min(REFLECT_POLL_INTERVAL,
+                            max(deadline - time.time(), 0)))
+            written = persist.written_at(ipydb_engine)
+            if written is not None and written >= since:
+                self.read_into(db, ipydb_engine)
+                return True
+            if acquired:
+                return False
+            if time.time() >= deadline:
+                return None
+
+    def read_into(self, db, ipydb_engine):
+        """Update db with the metadata cached in ipydb_engine.
+
+        Returns:
+            The cached metadata, as a model.Database.
+        """
         # make sure that everything was eager loaded, and update
         # db metadata from other thread XXX: dicey
         with session_scope(ipydb_engine) as session:
-            with timer('read-expunge after write', log=log):
+            with timer('read-expunge after write', log=log,
+                       metric='persist.read'):
                 database = persist.read(session)
                 db.update_tables(database.tables.values())
                 db.sa_metadata = database.sa_metadata
+                db.modified = database.modified
                 session.expunge_all()  # unhook SA
-        db.reflecting = False
+        registry.gauge('metadata.tables', len(database.tables))
+        return database
 
     def flush(self, engine):
         """Delete all metadata associated with engine."""
         self.pool.terminate()
         self.pool.join()
         db_key, ipydb_engine = get_metadata_engine(engine)
-        del self.databases[db_key]
-        delete_schema(ipydb_engine)
-        create_schema(ipydb_engine)
+        self.databases.pop(db_key, None)
+        ensure_schema(ipydb_engine)
+        # other sessions can be reading the cache: empty it in one
+        # transaction rather than dropping its tables
+        with ipydb_engine.begin() as conn:
+            clear_schema(conn)
         self.pool = ThreadPool(multiprocessing.cpu_count() * 2)
 
     def reflecting(self, engine):
-        db_key = get_db_filename(engine)
+        db_key, ipydb_engine = get_metadata_engine(engine)
         return self.databases[db_key].reflecting
@@ -0,0 +1,78 @@
+"""Advisory file locks shared by all ipython sessions on a machine.
+
+Several sessions connected to the same database share its metadata
+cache. A lock file next to the cache elects the one session which
+reflects the database; the others wait for it and read its result.
+
+Locks are taken with flock(), so they are released by the operating
+system when a session exits or crashes: a lock can't be left behind.
+flock() isn't available on windows, where locking is skipped and each
+session reflects on its own.
+"""
+import errno
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class FileLock(object):
+    """An exclusive lock on a file, held by one process (or thread)
+    at a time.
+
+    Usage:
+        lock = FileLock('/path/to/file.lock')
+        if lock.acquire(timeout=60):
+            try:
+                do_things()
+            finally:
+                lock.release()
+    """
+
+    poll_interval = 0.1  # seconds between attempts while waiting
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self, blocking=True, timeout=None):
+        """Take the lock.
+
+        Args:
+            blocking: wait for the lock if another process holds it.
+            timeout: give up waiting after this many seconds.
+        Returns:
+            True if the lock was taken.
+        """
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:  # pragma: no cover
+            log.debug('No fcntl, not locking %s', self.path)
+            return True
+        start = time.time()
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except (IOError, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            if not blocking or (timeout is not None and
+                                time.time() - start >= timeout):
+                return False
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """Release the lock, if held."""
+        if self.fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
@@ -178,6 +178,9 @@ restr = re.compile(r'TEXT|VARCHAR.*|CHAR.*', re.I)
 renumeric = re.compile(r'FLOAT.*|DECIMAL.*|INT.*|DOUBLE.*|'
                        'FIXED.*|SHORT.*|NUMBER.*|NUMERIC.*', re.I)
 redate = re.compile(r'DATE|TIME|DATETIME|TIMESTAMP', re.I)
+# sub-classifications of renumeric
+reinteger = re.compile(r'INT|SHORT', re.I)
+refloat = re.compile(r'FLOAT|DOUBLE|REAL', re.I)
 
 
 def sql_default(column):
@@ -220,6 +223,10 @@ class Table(Base, TimesMixin):
     __tablename__ = 'dbtable'
     id = sa.Column(sa.Integer, primary_key=True)
     name = sa.Column(sa.String, index=True, unique=True)
+    # planner statistics from the database catalog, see stats.py
+    estimated_rows = sa.Column(sa.BigInteger, nullable=True)
+    estimated_bytes = sa.Column(sa.BigInteger, nullable=True)
+    analyzed = sa.Column(sa.DateTime, nullable=True)
 
     def column(self, name):
         for column in self.columns:
@@ -266,3 +273,10 @@ class Index(Base):
     table = orm.relationship('Table', backref='indexes', order_by=name)
     columns = orm.relationship('Column', secondary=lambda: index_column_table,
                                backref='indexes')
+
+
+class Reflection(Base):
+    """When the cached metadata was written: at most one row."""
+    __tablename__ = 'dbreflection'
+    id = sa.Column(sa.Integer, primary_key=True)
+    written = sa.Column(sa.DateTime, default=dt.datetime.now)
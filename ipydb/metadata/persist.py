@@ -6,13 +6,27 @@ from sqlalchemy import orm
 from ipydb.metadata import model as m
 
 
-def write_sa_metadata(engine, sa_metadata):
+def write_sa_metadata(engine, sa_metadata, stats=None):
     """Bulk import of SqlAlchemy metadata into sqlite engine.
 
     We can assume that engine is a bunch of empty tables, hence
     should not need to do upsert/existence checking.
+
+    stats is an optional dict of {table name: (estimated rows,
+    estimated bytes, analyzed)}, see ipydb.metadata.stats.collect().
     """
-    data = [{'name': t.name} for t in sa_metadata.sorted_tables]
+    stats = stats or {}
+
+    def get_table_data():
+        for table in sa_metadata.sorted_tables:
+            rows, size, analyzed = stats.get(table.name, (None, None, None))
+            yield {
+                'name': table.name,
+                'estimated_rows': rows,
+                'estimated_bytes': size,
+                'analyzed': analyzed,
+            }
+    data = list(get_table_data())
     if data:
         engine.execute(m.Table.__table__.insert(), data)
     result = engine.execute('select name, id from dbtable')
@@ -108,18 +122,15 @@ def write_sa_metadata(engine, sa_metadata):
     data = list(get_fk_data())
     if data:
         engine.execute(upd, data)
+    engine.execute(m.Reflection.__table__.insert())
 
 
 def read(session):
-    tables = session.query(m.Table).\
-        options(
-            orm.joinedload('columns')
-            .joinedload('referenced_by'),
-            orm.joinedload('columns')
-            .joinedload('referenced_column'),
-            orm.joinedload('indexes')
-            .joinedload('columns')
-        ).all()
+    tables = session.query(m.Table).options(
+        orm.joinedload('columns').joinedload('referenced_by'),
+        orm.joinedload('columns').joinedload('referenced_column'),
+        orm.joinedload('indexes').joinedload('columns')
+    ).all()
     # XXX: for some reason this is the only way that I could
     # force eager-loading of the column.referenced_column,
     # no idea why or how else to do it.
@@ -129,4 +140,15 @@ def read(session):
                 c.referenced_column.table
             for r in c.referenced_by:
                 r.table
-    return m.Database(tables=tables)
+    database = m.Database(tables=tables)
+    # an empty database has no table times to tell its age by
+    written = written_at(session)
+    if written is not None:
+        database.modified = written
+    return database
+
+
+def written_at(connectable):
+    """Return when the cached metadata was written, or None."""
+    return connectable.execute(
+        sa.select([sa.func.max(m.Reflection.written)])).scalar()
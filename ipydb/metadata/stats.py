@@ -0,0 +1,115 @@
+"""Cheap table statistics read from the database catalog.
+
+Row counts and sizes are the estimates kept by the database for its
+query planner (e.g. postgres' pg_class.reltuples, oracle's NUM_ROWS),
+so collecting them costs one catalog query rather than a count(*) per
+table. They are only as fresh as the database's last ANALYZE.
+"""
+import logging
+
+import sqlalchemy as sa
+
+log = logging.getLogger(__name__)
+
+# queries returning (table name, estimated rows, estimated bytes,
+# last analyzed) for the tables in the connection's default schema.
+STATS_QUERIES = {
+    'postgresql': """
+        select
+            c.relname,
+            case when c.reltuples < 0 then null else c.reltuples end,
+            pg_total_relation_size(c.oid),
+            greatest(s.last_analyze, s.last_autoanalyze)
+        from
+            pg_class c
+            inner join pg_namespace n on n.oid = c.relnamespace
+            left join pg_stat_all_tables s on s.relid = c.oid
+        where
+            c.relkind in ('r', 'p', 'm')
+            and n.nspname = current_schema()
+    """,
+    'mysql': """
+        select
+            table_name, table_rows, data_length + index_length, null
+        from
+            information_schema.tables
+        where
+            table_schema = database()
+    """,
+    'oracle': """
+        select
+            t.table_name, t.num_rows, s.bytes, t.last_analyzed
+        from
+            user_tables t
+            left join (
+                select segment_name, sum(bytes) bytes
+                from user_segments
+                group by segment_name
+            ) s on s.segment_name = t.table_name
+    """,
+    'mssql': """
+        select
+            t.name,
+            sum(case when p.index_id in (0, 1) then p.row_count end),
+            sum(p.reserved_page_count) * 8192,
+            max(stats_date(t.object_id, 1))
+        from
+            sys.tables t
+            inner join sys.dm_db_partition_stats p
+                on p.object_id = t.object_id
+        where
+            t.schema_id = schema_id()
+        group by t.name
+    """,
+}
+STATS_QUERIES['redshift'] = STATS_QUERIES['postgresql']
+
+
+def sqlite_stats(conn):
+    """Rows from sqlite_stat1 (written by ANALYZE), sizes from dbstat.
+
+    Either may be missing: sqlite_stat1 until ANALYZE has been run, and
+    dbstat unless sqlite was compiled with SQLITE_ENABLE_DBSTAT_VTAB.
+    """
+    stats = {}
+    try:
+        for table, stat in conn.execute(
+                'select tbl, stat from sqlite_stat1'):
+            stats[table] = [int(stat.split()[0]), None, None]
+    except sa.exc.DBAPIError:
+        log.debug('No sqlite_stat1, run ANALYZE for row estimates')
+    try:
+        for table, size in conn.execute(
+                'select name, sum(pgsize) from dbstat group by name'):
+            stats.setdefault(table, [None, None, None])[1] = size
+    except sa.exc.DBAPIError:
+        log.debug('No dbstat virtual table for table sizes')
+    return [(table,) + tuple(stat) for table, stat in stats.items()]
+
+
+def collect(engine):
+    """Return {table name: (estimated rows, estimated bytes, analyzed)}.
+
+    Any statistic may be None. Statistics are optional, so failures
+    (e.g. no permission to read the catalog) return what was found.
+    """
+    dialect = engine.dialect
+    normalize = getattr(dialect, 'normalize_name', None) or (lambda n: n)
+    try:
+        with engine.connect() as conn:
+            if dialect.name == 'sqlite':
+                rows = sqlite_stats(conn)
+            elif dialect.name in STATS_QUERIES:
+                rows = conn.execute(STATS_QUERIES[dialect.name]).fetchall()
+            else:
+                return {}
+    except Exception:
+        log.debug('Failed to read table statistics', exc_info=True)
+        return {}
+    stats = {}
+    for name, estimate, size, analyzed in rows:
+        stats[normalize(name)] = (
+            None if estimate is None else int(estimate),
+            None if size is None else int(size),
+            analyzed)
+    return stats
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Counters, gauges and latency histograms describing an ipydb session.
+
+Instrumented code records into the module's `registry`:
+
+    from ipydb.metrics import registry
+    registry.increment('metadata.hit')
+    registry.gauge('metadata.tables', 42)
+    with registry.timed('execute'):
+        ...
+
+Recording a metric is a dictionary lookup and an append, so metrics are
+always collected. They are shown by %ipydb_stats, which can also dump
+them as JSON.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+from ipydb.utils import percentile
+
+
+class Histogram(object):
+    """Latencies of an operation.
+
+    Counts and totals cover every observation. Percentiles are computed
+    from a bounded sample of the most recent observations.
+    """
+
+    max_samples = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=self.max_samples)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Return a dict of statistics, times in milliseconds."""
+        samples = sorted(self.samples)
+        summary = {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0,
+            'max_ms': self.max * 1000,
+        }
+        for pct in (50, 95, 99):
+            value = percentile(samples, pct)
+            summary['p%i_ms' % pct] = None if value is None else value * 1000
+        return summary
+
+
+class Registry(object):
+    """Named counters, gauges and histograms, safe to use from threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(int)
+            self.gauges = {}
+            self.histograms = defaultdict(Histogram)
+
+    def increment(self, name, value=1):
+        """Add value to the counter name."""
+        with self.lock:
+            self.counters[name] += value
+
+    def gauge(self, name, value):
+        """Set the gauge name to its current value."""
+        self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        """Record a latency for the histogram name."""
+        with self.lock:
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        """Record the time taken by a with block, even if it raises."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start)
+
+    def snapshot(self):
+        """Return all metrics as a dict which can be dumped as JSON."""
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': dict((name, histogram.summary())
+                                   for name, histogram in
+                                   self.histograms.items()),
+            }
+
+    def rows(self):
+        """Return a list of (metric, count, value) rows for display.
+
+        Counters and gauges only have a value. A histogram's value is its
+        total time, with its mean, percentiles and maximum.
+        """
+        def ms(value):
+            return '-' if value is None else '%.2f' % value
+        snapshot = self.snapshot()
+        rows = []
+        for name, count in sorted(snapshot['counters'].items()):
+            rows.append((name, '', count))
+        for name, value in sorted(snapshot['gauges'].items()):
+            rows.append((name, '', value))
+        for name, summary in sorted(snapshot['histograms'].items()):
+            rows.append((
+                name, summary['count'],
+                '%s ms total, mean %s p50 %s p95 %s p99 %s max %s' % tuple(
+                    ms(summary[key]) for key in (
+                        'total_ms', 'mean_ms', 'p50_ms', 'p95_ms',
+                        'p99_ms', 'max_ms'))))
+        return rows
+
+    def dump(self, filepath):
+        """Write a snapshot of all metrics to filepath as JSON."""
+        snapshot = self.snapshot()
+        snapshot['time'] = time.time()
+        with open(filepath, 'w') as fout:
+            json.dump(snapshot, fout, indent=2, sort_keys=True, default=str)
+
+
+registry = Registry()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+An in-process pager for result sets.
+
+Unlike piping a rendered result set into less, rows are only fetched
+from the cursor as the user pages forward: glancing at the first screen
+of `select * from big_table` and quitting costs one page of fetches.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+from collections import deque
+import logging
+import sys
+
+from ipydb.asciitable import TableRenderer
+from ipydb.metrics import registry
+from ipydb.utils import getch, ibatch, termsize
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 20  # rendered pages kept for paging back
+BACK_KEYS = u'bkp'
+QUIT_KEYS = u'qQ\x03\x04\x1b'  # q, ctrl-c, ctrl-d, escape
+# escape sequences of keys which page: other sequences are ignored
+SEQUENCE_KEYS = {
+    u'\x1b[A': u'b', u'\x1bOA': u'b',  # up
+    u'\x1b[5~': u'b',  # page up
+    u'\x1b[B': u' ', u'\x1bOB': u' ',  # down
+    u'\x1b[6~': u' ',  # page down
+}
+CLEAR_SCREEN = u'\x1b[H\x1b[2J'
+PROMPT = u'-- page %i: [space] next  [b] back  [q] quit --'
+
+
+def read_key(getkey, prompt):
+    """Return the next key press from getkey(prompt), with paging keys'
+    escape sequences translated (see SEQUENCE_KEYS) and other sequences
+    skipped. The prompt is erased once a key is pressed."""
+    while True:
+        key = getkey(prompt)
+        sys.stdout.write(u'\r' + u' ' * len(prompt) + u'\r')
+        if key in SEQUENCE_KEYS:
+            return SEQUENCE_KEYS[key]
+        if len(key) < 2 or not key.startswith(u'\x1b'):
+            return key
+        log.debug('Ignoring key sequence %r', key)
+
+
+class LazyPager(object):
+    """Page through a result set, fetching rows on demand.
+
+    A bounded window of rendered pages is kept so that the user can page
+    back. The cursor is closed when the user quits or reaches the end.
+    """
+
+    def __init__(self, cursor, out=None, max_fieldsize=100,
+                 window=DEFAULT_WINDOW, getkey=getch):
+        """
+        Args:
+            cursor: result set, see SqlPlugin.render_result().
+            out: stream to write pages to, default sys.stdout.
+            max_fieldsize: see asciitable.render_page().
+            window: number of rendered pages to keep for paging back.
+            getkey: callable taking a prompt and returning a key press.
+        """
+        self.cursor = cursor
+        self.out = out or sys.stdout
+        self.renderer = TableRenderer(list(cursor.keys()),
+                                      max_fieldsize=max_fieldsize)
+        self.window = deque(maxlen=window)
+        self.getkey = getkey
+        self.finished = False
+        self.pages_fetched = 0
+        self._batches = None
+
+    def next_page(self, page_rows):
+        """Fetch and render the next page, None if there isn't one."""
+        if self._batches is None:
+            self._batches = ibatch(self.cursor, page_rows)
+        rows = next(self._batches, None)
+        if not rows:
+            self.finished = True
+            return None
+        self.pages_fetched += 1
+        self.finished = len(rows) < page_rows
+        with registry.timed('render.page'):
+            page = self.renderer.render(rows)
+        return self.pages_fetched, page
+
+    def run(self):
+        """Show pages until the user quits or the rows run out."""
+        cols, lines = termsize()
+        page_rows = max(lines - 5, 1)  # headings, borders and prompt
+        try:
+            page = self.next_page(page_rows)
+            if page is None:
+                return
+            self.window.append(page)
+            position = 0
+            redraw = False
+            while True:
+                number, text = self.window[position]
+                if redraw:  # don't leave an old page above a later one
+                    self.out.write(CLEAR_SCREEN)
+                self.out.write(text)
+                self.out.flush()
+                if self.finished and position == len(self.window) - 1:
+                    return
+                key = self.read_key(PROMPT % number)
+                if key in QUIT_KEYS or not key:
+                    return
+                redraw = True
+                if key in BACK_KEYS:  # any other key pages forward
+                    position = max(position - 1, 0)
+                elif position < len(self.window) - 1:
+                    position += 1
+                else:
+                    page = self.next_page(page_rows)
+                    if page is None:
+                        return
+                    self.window.append(page)  # drops the oldest page
+                    position = len(self.window) - 1
+                    redraw = False
+        finally:
+            self.close()
+
+    def read_key(self, prompt):
+        return read_key(self.getkey, prompt)
+
+    def close(self):
+        close = getattr(self.cursor, 'close', None)
+        if close is not None:
+            close()
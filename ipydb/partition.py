@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+"""
+Export whole tables, split by primary key range across connections.
+
+A table with a single numeric primary key column is divided into N
+key ranges of roughly equal width. Each range is streamed on its own
+pooled connection into its own file, and a manifest.json listing each
+file's key range, row count and sha256 checksum is written alongside.
+
+csv and rows files are written in chunks using keyset pagination on the
+primary key (where key > last key written order by key). After each
+chunk is on disk a checkpoint is saved next to the file, from which an
+interrupted export can be resumed without duplicating rows. The key
+ranges are saved too, so that a resumed export carries on with the same
+partitions even if rows have been added or deleted since.
+
+:copyright: (c) 2012 by Jay Sweeney.
+:license: see LICENSE for more details.
+"""
+from __future__ import print_function
+import decimal
+import hashlib
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+import numbers
+import os
+import time
+
+import sqlalchemy as sa
+
+from ipydb import export
+from ipydb.metadata.model import renumeric
+
+log = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+CHECKPOINT = '.checkpoint'
+PLAN = '.partitions'  # key ranges of a resumable export in progress
+DEFAULT_CHUNK_SIZE = 50000
+RESUMABLE_FORMATS = ['csv', 'rows']
+EXTENSIONS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'npz': '.npz',
+    'rows': '.rows',
+}
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def numeric_primary_key(table):
+    """Return table's primary key column if it can be range partitioned.
+
+    Args:
+        table: an ipydb.metadata.model.Table.
+    Returns:
+        The model.Column of a single column, numeric primary key,
+        otherwise None.
+    """
+    keys = [c for c in table.columns if c.primary_key]
+    if len(keys) != 1:
+        return None
+    if not renumeric.search(str(keys[0].type)):
+        return None
+    return keys[0]
+
+
+def split_range(low, high, parts):
+    """Split the closed range [low, high] into up to `parts` ranges.
+
+    Returns:
+        list of (lower, upper) tuples. lower is inclusive and upper
+        is exclusive. The first lower and the last upper are None
+        (unbounded), so that together the ranges cover every key.
+    """
+    if parts < 2 or low is None or high is None or low >= high:
+        return [(None, None)]
+    integral = isinstance(low, numbers.Integral) and \
+        isinstance(high, numbers.Integral)
+    if integral:
+        parts = min(parts, high - low + 1)
+    bounds = [None]
+    for i in range(1, parts):
+        if integral:
+            bounds.append(low + (high - low + 1) * i // parts)
+        else:
+            low, high = float(low), float(high)
+            bounds.append(low + (high - low) * i / parts)
+    bounds.append(None)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def partition_query(sa_table, column, lower, upper):
+    """Return a select of the rows of sa_table in a key range."""
+    query = sa.select([sa_table])
+    key = sa_table.c[column]
+    if lower is not None:
+        query = query.where(key >= lower)
+    if upper is not None:
+        query = query.where(key < upper)
+    return query
+
+
+def keyset_query(sa_table, column, lower, upper, last_key, limit):
+    """Return a select of the next `limit` rows after last_key."""
+    query = partition_query(sa_table, column, lower, upper)
+    key = sa_table.c[column]
+    if last_key is not None:
+        query = query.where(key > last_key)
+    return query.order_by(key).limit(limit)
+
+
+def fetch_chunk(conn, query):
+    return conn.execute(query).fetchall()
+
+
+def _dump_key(value):
+    if isinstance(value, decimal.Decimal):
+        return {'decimal': str(value)}
+    return value
+
+
+def _load_key(value):
+    if isinstance(value, dict):
+        return decimal.Decimal(value['decimal'])
+    return value
+
+
+def read_checkpoint(filepath):
+    """Return the saved checkpoint for an export file, or None."""
+    path = filepath + CHECKPOINT
+    if not os.path.exists(path):
+        return None
+    with open(path) as fin:
+        state = json.load(fin)
+    state['last_key'] = _load_key(state['last_key'])
+    return state
+
+
+def save_checkpoint(filepath, state):
+    """Atomically save the checkpoint for an export file.
+
+    Args:
+        filepath: the export file.
+        state: dict of last_key (last primary key written), rows (rows
+               written), offset (bytes of filepath which are complete)
+               and done.
+    """
+    path = filepath + CHECKPOINT
+    saved = dict(state, last_key=_dump_key(state['last_key']))
+    with open(path + '.tmp', 'w') as fout:
+        json.dump(saved, fout)
+        fout.flush()
+        os.fsync(fout.fileno())
+    if os.name == 'nt' and os.path.exists(path):  # pragma: nocover
+        os.remove(path)
+    os.rename(path + '.tmp', path)
+
+
+def read_plan(directory):
+    """Return the saved partitioning of an export in progress, or None.
+
+    Returns:
+        dict of parallel (as requested) and ranges (see split_range()).
+    """
+    path = os.path.join(directory, PLAN)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fin:
+        plan = json.load(fin)
+    plan['ranges'] = [(_load_key(lower), _load_key(upper))
+                      for lower, upper in plan['ranges']]
+    return plan
+
+
+def save_plan(directory, parallel, ranges):
+    """Save the key ranges an export was split into, see read_plan()."""
+    with open(os.path.join(directory, PLAN), 'w') as fout:
+        json.dump({'parallel': parallel,
+                   'ranges': [(_dump_key(lower), _dump_key(upper))
+                              for lower, upper in ranges]}, fout)
+        fout.flush()
+        os.fsync(fout.fileno())
+
+
+def file_checksum(filepath, blocksize=1 << 20):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as fin:
+        for block in iter(lambda: fin.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def partition_filename(tablename, index, fmt, compression=None):
+    """Return the file name for partition number index of a table."""
+    return '%s.%04i%s%s' % (tablename, index, EXTENSIONS[fmt],
+                            COMPRESSION_EXTENSIONS.get(compression, ''))
+
+
+def pool_capacity(engine):
+    """Return how many more connections engine's pool can check out.
+
+    Args:
+        engine: SqlAlchemy engine.
+    Returns:
+        The number of connections a QueuePool can hand out on top of
+        those already checked out, or None when the pool is unbounded.
+    """
+    pool = engine.pool
+    if not isinstance(pool, sa.pool.QueuePool) or pool._max_overflow < 0:
+        return None
+    return pool.size() + pool._max_overflow - pool.checkedout()
+
+
+def export_partition(engine, query, filepath, fmt='csv', compression=None):
+    """Stream the result of query into filepath on its own connection.
+
+    Returns:
+        dict of file (base name), rows, sha256 and seconds.
+    """
+    start = time.time()
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        try:
+            rows, filepath, fmt = export.export(
+                result, filepath, fmt=fmt, compression=compression)
+        finally:
+            result.close()
+    return {
+        'file': os.path.basename(filepath),
+        'rows': rows,
+        'sha256': file_checksum(filepath),
+        'seconds': round(time.time() - start, 3),
+    }
+
+
+def export_keyset(engine, sa_table, column, lower, upper, filepath,
+                  fmt='csv', compression=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, resume=False):
+    """Export a key range in chunks, checkpointing after each one.
+
+    Each chunk of up to chunk_size rows is fetched with keyset_query(),
+    encoded, (compressed as its own gzip member / zstd frame), written
+    and fsync'ed before the checkpoint is saved. Resuming truncates
+    anything written after the last checkpoint and carries on from the
+    last key, so no row is written twice.
+
+    Args:
+        engine: SqlAlchemy engine.
+        sa_table: sqlalchemy table clause to select from.
+        column: name of the numeric primary key column.
+        lower, upper: key range, see split_range().
+        filepath: file to write.
+        fmt: one of RESUMABLE_FORMATS.
+        compression: None, 'gzip' or 'zstd'.
+        chunk_size: rows per chunk.
+        resume: continue from filepath's checkpoint, if there is one.
+    Returns:
+        dict of file (base name), rows, sha256 and seconds.
+    """
+    start = time.time()
+    keys = [c.name for c in sa_table.columns]
+    index = keys.index(column)
+    encode = export.encode_csv if fmt == 'csv' else export.encode_rows
+    state = read_checkpoint(filepath) if resume else None
+    if state is not None and os.path.exists(filepath):
+        log.debug('resuming %s from key %s', filepath, state['last_key'])
+        out = open(filepath, 'r+b')
+        out.truncate(state['offset'])
+        out.seek(state['offset'])
+    else:
+        out = open(filepath, 'wb')
+        if fmt == 'csv':
+            header = export.encode_csv([keys])
+        else:
+            header = export.rows_header(keys)
+        out.write(export.compress(header, compression))
+        state = {'last_key': None, 'rows': 0, 'offset': out.tell(),
+                 'done': False}
+        save_checkpoint(filepath, state)
+    try:
+        with engine.connect() as conn:
+            while not state['done']:
+                rows = fetch_chunk(conn, keyset_query(
+                    sa_table, column, lower, upper, state['last_key'],
+                    chunk_size))
+                if rows:
+                    out.write(export.compress(encode(rows), compression))
+                    out.flush()
+                    os.fsync(out.fileno())
+                    state['last_key'] = rows[-1][index]
+                    state['rows'] += len(rows)
+                    state['offset'] = out.tell()
+                state['done'] = len(rows) < chunk_size
+                save_checkpoint(filepath, state)
+    finally:
+        out.close()
+    return {
+        'file': os.path.basename(filepath),
+        'rows': state['rows'],
+        'sha256': file_checksum(filepath),
+        'seconds': round(time.time() - start, 3),
+    }
+
+
+def export_table(engine, table, directory, parallel=1, fmt='csv',
+                 compression=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 resume=False):
+    """Export all rows of a table to files in directory.
+
+    When the table has a numeric primary key (see numeric_primary_key())
+    its key range is split into `parallel` partitions which are exported
+    concurrently, each on its own connection from engine's pool.
+    Otherwise the table is exported as a single stream.
+
+    csv and rows exports of tables with a numeric primary key are
+    written by export_keyset(), and can be resumed. A resumed export uses
+    the key ranges saved by the interrupted one, rather than splitting
+    the table's current key range again. Checkpoint files are removed
+    once the manifest has been written.
+
+    Args:
+        engine: SqlAlchemy engine for the table's database.
+        table: ipydb.metadata.model.Table to export.
+        directory: output directory, created if it doesn't exist.
+        parallel: number of partitions / concurrent connections.
+        fmt: one of ipydb.export.EXPORT_FORMATS.
+        compression: None, 'gzip' or 'zstd'.
+        chunk_size: rows per checkpointed chunk, see export_keyset().
+        resume: resume an interrupted export into directory.
+    Returns:
+        The manifest: a dict describing the table and the partitions,
+        which is also written to directory/manifest.json.
+    Raises:
+        ValueError: resuming with a different number of partitions, or
+            parallel exceeds the connections left in engine's pool.
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError('Unknown export format: %s. Try one of: %s' % (
+            fmt, ', '.join(export.EXPORT_FORMATS)))
+    capacity = pool_capacity(engine)
+    if capacity is not None and parallel > capacity:
+        # more partitions than connections would block in the pool
+        # until pool_timeout, after the first files had been written
+        raise ValueError(
+            "--parallel %i needs %i connections, but only %i are "
+            "available from the pool. Use a smaller --parallel, or raise "
+            "pool_size or max_overflow for this connection"
+            % (parallel, parallel, capacity))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    sa_table = sa.table(table.name, *[sa.column(c.name)
+                                      for c in table.columns])
+    key = numeric_primary_key(table)
+    resumable = key is not None and fmt in RESUMABLE_FORMATS
+    if resume and not resumable:
+        print("Only csv and rows exports of tables with a numeric primary "
+              "key can be resumed, restarting the export")
+    plan = read_plan(directory) if resume and resumable else None
+    if plan is not None:
+        if plan['parallel'] != parallel:
+            raise ValueError(
+                "The export in %s was split into %i partitions, resume it "
+                "with --parallel %i"
+                % (directory, plan['parallel'], plan['parallel']))
+        ranges = plan['ranges']
+    elif key is None:
+        if parallel > 1:
+            print("%s has no numeric primary key, exporting as a single "
+                  "stream" % table.name)
+        ranges = [(None, None)]
+    else:
+        column = sa_table.c[key.name]
+        low, high = engine.execute(
+            sa.select([sa.func.min(column), sa.func.max(column)])).first()
+        ranges = split_range(low, high, parallel)
+    if resumable and plan is None:
+        save_plan(directory, parallel, ranges)
+    jobs = []
+    for index, (lower, upper) in enumerate(ranges):
+        filepath = os.path.join(directory, partition_filename(
+            table.name, index, fmt, compression))
+        if resumable:
+            jobs.append((export_keyset, (
+                engine, sa_table, key.name, lower, upper, filepath, fmt,
+                compression, chunk_size, resume)))
+        else:
+            query = partition_query(sa_table, key.name, lower, upper) \
+                if key is not None else sa.select([sa_table])
+            jobs.append((export_partition, (
+                engine, query, filepath, fmt, compression)))
+    log.debug('exporting %s in %i partitions', table.name, len(jobs))
+    pool = ThreadPool(len(jobs))
+    try:
+        results = [pool.apply_async(func, args) for func, args in jobs]
+        partitions = [r.get() for r in results]
+    finally:
+        pool.close()
+        pool.join()
+    for partition, (lower, upper) in zip(partitions, ranges):
+        partition['lower'] = lower
+        partition['upper'] = upper
+    manifest = {
+        'table': table.name,
+        'format': fmt,
+        'compression': compression,
+        'key': key.name if key is not None else None,
+        'rows': sum(p['rows'] for p in partitions),
+        'partitions': partitions,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as fout:
+        json.dump(manifest, fout, indent=2, sort_keys=True, default=str)
+    if resumable:
+        for partition in partitions:
+            os.remove(os.path.join(directory, partition['file'] + CHECKPOINT))
+        os.remove(os.path.join(directory, PLAN))
+    return manifest
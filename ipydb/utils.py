@@ -3,11 +3,19 @@
 import codecs
 import csv
 from io import BytesIO as StringIO
+import itertools
+import math
+import os
+import re
+import sys
 import time
 
 from builtins import input
 from past.builtins import basestring
 
+# seconds to wait for the rest of an escape sequence, see getch()
+ESCAPE_WAIT = 0.05
+
 
 class UnicodeWriter:
     """
@@ -44,6 +52,134 @@ class UnicodeWriter:
             self.writerow(row)
 
 
+def ibatch(iterable, size):
+    """Yield lists of up to `size` items from iterable.
+
+    Unlike asciitable.isublists the last batch is not padded, and
+    only one batch is held in memory at a time.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_batches(cursor, batch_size):
+    """Yield lists of rows from cursor, using fetchmany if it has it."""
+    if hasattr(cursor, 'fetchmany'):
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    else:
+        for rows in ibatch(cursor, batch_size):
+            yield rows
+
+
+# $$ and $tag$ open a postgres dollar-quoted string, closed by the same tag
+_sql_tokens = re.compile(
+    r"'|\"|--|/\*|\*/|;|(?<![\w$])\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_sql_quotes = {"'": "'", '"': '"', '/*': '*/'}
+
+
+def iter_sql_statements(lines, delimiter='/'):
+    """Split an iterable of lines of SQL into statements.
+
+    Lines are consumed lazily and each statement is joined once, so
+    this is suitable for very large scripts.
+
+    Args:
+        lines: iterable of lines of text (eg. a file object).
+        delimiter: ';' splits statements on semicolons which are not
+                   within quotes or comments. Any other delimiter
+                   must appear on a line by itself.
+    Yields:
+        tuples of (line_number, statement) where line_number is the
+        line on which the statement starts.
+    """
+    if delimiter == ';':
+        return _split_semicolons(lines)
+    return _split_delimiter_lines(lines, delimiter)
+
+
+def _split_delimiter_lines(lines, delimiter):
+    parts = []
+    start = None
+    for lineno, line in enumerate(lines, 1):
+        if line.strip() == delimiter:
+            if start is not None:
+                yield start, ''.join(parts)
+            parts = []
+            start = None
+        else:
+            if start is None and line.strip():
+                start = lineno
+            parts.append(line)
+    if start is not None:
+        yield start, ''.join(parts)
+
+
+def _split_semicolons(lines):
+    parts = []
+    start = None
+    quote = None  # closing token of the quote/comment we are inside
+    for lineno, line in enumerate(lines, 1):
+        if start is None and line.strip():
+            start = lineno
+        pos = 0
+        for match in _sql_tokens.finditer(line):
+            token = match.group()
+            if quote:
+                if token == quote:
+                    quote = None
+            elif token in _sql_quotes:
+                quote = _sql_quotes[token]
+            elif token.startswith('$'):
+                quote = token
+            elif token == '--':
+                break
+            elif token == ';':
+                parts.append(line[pos:match.start()])
+                statement = ''.join(parts)
+                if statement.strip():
+                    yield start, statement
+                parts = []
+                pos = match.end()
+                start = lineno if line[pos:].strip() else None
+        if start is not None:
+            parts.append(line[pos:])
+    statement = ''.join(parts)
+    if statement.strip():
+        yield start, statement
+
+
+def percentile(values, pct):
+    """Return the pct'th percentile (nearest-rank) of sorted values.
+
+    Returns None if values is empty.
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[max(rank - 1, 0)]
+
+
+def human_size(nbytes):
+    """Return a byte count as a short string, e.g. 1.5 MB."""
+    if nbytes is None:
+        return ''
+    for unit in ['bytes', 'kB', 'MB', 'GB', 'TB']:
+        if abs(nbytes) < 1024 or unit == 'TB':
+            break
+        nbytes /= 1024.0
+    if unit == 'bytes':
+        return '%i bytes' % nbytes
+    return '%.1f %s' % (nbytes, unit)
+
+
 def multi_choice_prompt(prompt, choices, default=None):
     ans = None
     while ans not in choices.keys():
@@ -69,16 +205,23 @@ class timer(object):
     Usage:
         with(timer("doing something")):
             time.sleep(10)
+
+    With metric, the time is also recorded in that histogram of
+    ipydb.metrics.registry.
     """
-    def __init__(self, name='timer', log=None):
+    def __init__(self, name='timer', log=None, metric=None):
         self.name = name
         self.log = log
+        self.metric = metric
 
     def __enter__(self):
         self.start = time.time()
 
     def __exit__(self, ty, val, tb):
         end = time.time()
+        if self.metric:
+            from ipydb.metrics import registry
+            registry.observe(self.metric, end - self.start)
         msg = "%s : %0.3f ms" % (self.name, (end - self.start) * 1000)
         if self.log and hasattr(self.log, 'debug'):
             self.log.debug(msg)
@@ -120,3 +263,41 @@ def termsize():
         except:
             cr = (25, 80)
     return int(cr[1]), int(cr[0])
+
+
+def isatty():
+    """Return True if ipydb is talking to a terminal."""
+    return sys.stdin.isatty() and sys.stdout.isatty()
+
+
+def getch(prompt=''):
+    """Print prompt and read a single key press from the terminal.
+
+    Keys which send an escape sequence, such as the arrow keys, are
+    returned as the whole sequence, e.g. u'\x1b[A', so that none of it
+    is left over for the shell to read. Falls back to reading a line
+    where the terminal can't be put into raw mode (e.g. on windows).
+    """
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    try:
+        import select
+        import termios
+        import tty
+        fd = sys.stdin.fileno()
+        old = termios.tcgetattr(fd)
+    except Exception:
+        return input()[:1]
+    try:
+        tty.setraw(fd)
+        # read the fd directly: sys.stdin would buffer the rest of a
+        # sequence where select() can't see it
+        data = os.read(fd, 32)
+        while data[:1] == b'\x1b' and select.select([fd], [], [],
+                                                    ESCAPE_WAIT)[0]:
+            data += os.read(fd, 32)
+        key = data.decode(getattr(sys.stdin, 'encoding', None) or 'utf-8',
+                          'replace')
+        return key if data[:1] == b'\x1b' else key[:1]
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old)
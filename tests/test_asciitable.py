@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+from io import StringIO
+
+import mock
+import nose.tools as nt
+
+from ipydb import asciitable
+from ipydb.asciitable import FakedResult
+
+
+def draw(rows, headings, **kw):
+    out = StringIO()
+    with mock.patch('ipydb.asciitable.termsize', return_value=(80, 6)):
+        asciitable.draw(FakedResult(rows, headings), out=out, **kw)
+    return out.getvalue()
+
+
+def test_draw_pages():
+    rows = [(1, u'a\nb\tc', None), (22, u'x' * 12, 1.5), (3, u'\xe9', 2)]
+    nt.assert_equal(
+        u'+----+------------+------+\n'
+        u'| id | name       | v    |\n'
+        u'+----+------------+------+\n'
+        u'| 1  | a^b c      | None |\n'
+        u'| 22 | xxxxx[...] | 1.5  |\n'
+        u'+----+------+---+\n'
+        u'| id | name | v |\n'
+        u'+----+------+---+\n'
+        u'| 3  | \xe9    | 2 |\n',
+        draw(rows, ['id', 'name', 'v'], max_fieldsize=10))
+
+
+def test_draw_pre_paginated():
+    page = [(u'id', 1), (u'born', dt.date(2012, 1, 2))]
+    nt.assert_equal(
+        u'+-------+------------+\n'
+        u'| Field | Value      |\n'
+        u'+-------+------------+\n'
+        u'| id    | 1          |\n'
+        u'| born  | 2012-01-02 |\n'
+        u'+-------+------------+\n\n',
+        draw([page], ['Field', 'Value'], paginate=False))
+
+
+def test_draw_empty():
+    nt.assert_equal(u'', draw([], ['a']))
+
+
+def test_as_text():
+    nt.assert_equal([u'a^b', u'None', u'1'],
+                    asciitable.as_text([u'a\rb', None, 1]))
+    nt.assert_equal([u'a\x00b ', u'c'],
+                    asciitable.as_text([u'a\x00b\t', u'c']))
+    nt.assert_equal(asciitable.as_plain_text,
+                    asciitable.column_formatter([1, None, 2.5]))
+    nt.assert_equal(asciitable.as_text,
+                    asciitable.column_formatter([1, u'x']))
+    nt.assert_equal(asciitable.as_text,
+                    asciitable.column_formatter([None, None]))
+
+
+def test_later_page_is_escaped():
+    renderer = asciitable.TableRenderer(['id', 'note', 'n'])
+    renderer.render([(1, None, 1), (2, None, 2)])
+    page = renderer.render([(3, u'line1\nline2\tx', u'a\nb')])
+    nt.assert_in(u'line1^line2 x', page)
+    nt.assert_in(u'a^b', page)
+    nt.assert_not_in(u'\t', page)
+    nt.assert_equal(4, page.count(u'\n'))  # 2 lines, heading and row
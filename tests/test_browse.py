@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+
+import mock
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb.browse import TableBrowser, page_query
+from ipydb.metadata import model as m
+from ipydb.pager import CLEAR_SCREEN
+
+
+def make_table(composite=False):
+    table = m.Table(name='events')
+    table.columns = [
+        m.Column(name='id', type='INTEGER', primary_key=True),
+        m.Column(name='kind', type='VARCHAR(10)', primary_key=composite),
+    ]
+    return table
+
+
+def test_page_query():
+    sa_table = sa.table('events', sa.column('id'), sa.column('kind'))
+    query = page_query(sa_table, ['id'], where="kind = 'x'", after=(10,),
+                       limit=5)
+    sql = str(query.compile(compile_kwargs={'literal_binds': True}))
+    nt.assert_equal(
+        "SELECT events.id, events.kind \nFROM events \n"
+        "WHERE kind = 'x' AND events.id > 10 ORDER BY events.id\n"
+        " LIMIT 5", sql)
+    query = page_query(sa_table, ['id', 'kind'], before=(10, 'a'), limit=5)
+    sql = str(query.compile(compile_kwargs={'literal_binds': True}))
+    nt.assert_in("(events.id, events.kind) < (10, 'a')", sql)
+    nt.assert_in('ORDER BY events.id DESC, events.kind DESC', sql)
+
+
+class TestTableBrowser(object):
+
+    def setup(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.execute('create table events (id integer, '
+                            'kind varchar(10), primary key (id, kind))')
+        self.engine.execute('insert into events values (?, ?)',
+                            *[(i, 'k%i' % (i % 2)) for i in range(12)])
+        self.executed = []
+        sa.event.listen(self.engine, 'before_cursor_execute',
+                        lambda *args: self.executed.append(args[2]))
+        # 10 terminal lines: 5 rows per page
+        self.ptermsize = mock.patch('ipydb.browse.termsize',
+                                    return_value=(80, 10))
+        self.ptermsize.start()
+        self.pstdout = mock.patch('ipydb.browse.sys.stdout')
+        self.pstdout.start()
+        self.out = StringIO()
+
+    def teardown(self):
+        self.ptermsize.stop()
+        self.pstdout.stop()
+
+    def browse(self, keys, table=None, where=None):
+        keys = list(keys)
+        browser = TableBrowser(self.engine, table or make_table(),
+                               where=where, out=self.out,
+                               getkey=lambda prompt: keys.pop(0))
+        browser.run()
+        return browser
+
+    def test_one_query_per_page(self):
+        self.browse('  q')
+        nt.assert_equal(3, len(self.executed))
+        nt.assert_true(all('LIMIT' in sql for sql in self.executed))
+        nt.assert_in(u'| 11 |', self.out.getvalue())
+
+    def test_stops_at_first_and_last_page(self):
+        # last page has 2 rows: no query for the page after it
+        self.browse('   bbbbq')
+        nt.assert_equal(1 + 2 + 2, len(self.executed))
+        pages = self.out.getvalue().split(u'| id ')
+        nt.assert_in(u'| 0  |', pages[-1])
+
+    def test_back(self):
+        self.browse(' bq')
+        pages = self.out.getvalue().split(u'| id ')
+        nt.assert_in(u'| 5  |', pages[2])
+        nt.assert_in(u'| 0  |', pages[3])
+        nt.assert_not_in(u'| 5  |', pages[3])
+
+    def test_arrow_keys(self):
+        self.browse([u' ', u'\x1b[A', u'\x1b[1;5C', u'\x1b[B', u'q'])
+        nt.assert_equal(4, len(self.executed))
+        pages = self.out.getvalue().split(CLEAR_SCREEN)
+        nt.assert_equal(4, len(pages))
+        nt.assert_in(u'| 5  |', pages[1])
+        nt.assert_in(u'| 0  |', pages[2])  # up pages back
+        nt.assert_not_in(u'| 5  |', pages[2])
+        nt.assert_in(u'| 5  |', pages[3])  # down pages forward
+
+    def test_composite_key_and_where(self):
+        self.browse(' q', table=make_table(composite=True),
+                    where="kind = 'k1'")
+        pages = self.out.getvalue().split(u'| id ')
+        nt.assert_in(u'| 1  | k1   |', pages[1])
+        nt.assert_in(u'| 11 | k1   |', pages[2])
+        nt.assert_not_in(u'k0', self.out.getvalue())
+
+    def test_no_primary_key(self):
+        table = make_table()
+        table.columns[0].primary_key = False
+        with nt.assert_raises(ValueError):
+            TableBrowser(self.engine, table)
@@ -0,0 +1,99 @@
+import datetime as dt
+import decimal
+from io import StringIO
+
+import mock
+import numpy as np
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb import bulk
+from ipydb.metadata import model as m
+
+
+def make_table():
+    tbl = m.Table(id=1, name='thing')
+    tbl.columns = [
+        m.Column(id=1, table_id=1, name='id', type='INTEGER',
+                 primary_key=True, nullable=False, table=tbl),
+        m.Column(id=2, table_id=1, name='name', type='VARCHAR(20)',
+                 nullable=True, table=tbl),
+        m.Column(id=3, table_id=1, name='price', type='NUMERIC(10, 2)',
+                 nullable=True, table=tbl),
+        m.Column(id=4, table_id=1, name='born', type='DATE',
+                 nullable=True, table=tbl),
+    ]
+    return tbl
+
+
+def test_column_converter():
+    tbl = make_table()
+    nt.assert_equal(10, bulk.column_converter(tbl.column('id'))('10'))
+    nt.assert_is_none(bulk.column_converter(tbl.column('id'))(''))
+    nt.assert_equal('', bulk.column_converter(tbl.column('name'))(''))
+    nt.assert_equal(decimal.Decimal('1.50'),
+                    bulk.column_converter(tbl.column('price'))('1.50'))
+    nt.assert_equal(dt.date(2012, 3, 4),
+                    bulk.column_converter(tbl.column('born'))('2012-03-04'))
+
+
+def test_load_csv_batches():
+    engine = sa.create_engine('sqlite:///:memory:')
+    engine.execute('create table thing (id integer primary key, '
+                   'name varchar(20), price numeric(10, 2), born date)')
+    data = u'id,name,born\n' + u''.join(
+        u'%d,name%d,2012-01-01\n' % (i, i) for i in range(25))
+    with engine.begin() as conn:
+        with mock.patch.object(conn, 'execute', wraps=conn.execute) as ex:
+            rows = bulk.load_csv(conn, make_table(), StringIO(data),
+                                 batch_size=10)
+            nt.assert_equal(3, ex.call_count)
+    nt.assert_equal(25, rows)
+    nt.assert_equal(25, engine.execute(
+        'select count(*) from thing').scalar())
+
+
+def test_load_csv_unknown_column():
+    engine = sa.create_engine('sqlite:///:memory:')
+    with engine.begin() as conn:
+        nt.assert_raises(ValueError, bulk.load_csv, conn, make_table(),
+                         StringIO(u'id,nope\n1,2\n'))
+
+
+def test_load_csv_row_length():
+    engine = sa.create_engine('sqlite:///:memory:')
+    engine.execute('create table thing (id integer primary key, '
+                   'name varchar(20))')
+    with engine.begin() as conn:
+        with nt.assert_raises(ValueError) as cm:
+            bulk.load_csv(conn, make_table(),
+                          StringIO(u'id,name\n1,a\n\n2,b,c\n'))
+    nt.assert_equal('Line 4: expected 2 values, found 3',
+                    str(cm.exception))
+    with engine.begin() as conn:
+        nt.assert_equal(2, bulk.load_csv(conn, make_table(),
+                                         StringIO(u'id,name\n1,a\n\n2,b\n')))
+
+
+def test_load_frame():
+    engine = sa.create_engine('sqlite:///:memory:')
+    engine.execute('create table thing (id integer primary key, '
+                   'name varchar(20), price numeric(10, 2), born date)')
+    frame = np.zeros(7, dtype=[('id', 'i8'), ('price', 'f8'),
+                               ('born', 'M8[ns]')])
+    frame['id'] = np.arange(7)
+    frame['price'] = [1.5, np.nan, 3, 4, 5, 6, 7]
+    frame['born'] = np.datetime64('2012-01-02')
+    frame['born'][3] = np.datetime64('NaT')
+    with engine.begin() as conn:
+        nt.assert_equal(7, bulk.load_frame(conn, make_table(), frame,
+                                           batch_size=3))
+    rows = engine.execute('select id, price, born from thing').fetchall()
+    nt.assert_equal(7, len(rows))
+    nt.assert_equal((0, 1.5), tuple(rows[0])[:2])
+    nt.assert_equal(None, rows[1][1])
+    nt.assert_equal(None, rows[3][2])
+    nt.assert_true(str(rows[0][2]).startswith('2012-01-02'))
+    with nt.assert_raises(ValueError):
+        bulk.load_frame(engine, make_table(),
+                        np.zeros(1, dtype=[('nosuchcolumn', 'i8')]))
@@ -0,0 +1,60 @@
+import nose.tools as nt
+import sqlalchemy as sa
+from sqlalchemy.dialects import oracle
+
+from ipydb import colprofile
+from ipydb.metadata import model as m
+
+
+def make_table():
+    table = m.Table(name='person')
+    table.columns = [
+        m.Column(name='id', type='INTEGER', primary_key=True),
+        m.Column(name='name', type='VARCHAR(20)'),
+        m.Column(name='born', type='DATE'),
+        m.Column(name='photo', type='BLOB'),
+    ]
+    return table
+
+
+class TestProfileTable(object):
+
+    def setup(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.execute('create table person (id integer primary key, '
+                            'name varchar(20), born date, photo blob)')
+        self.engine.execute(
+            "insert into person values (1, 'ann', '1970-01-02', null), "
+            "(2, null, '1980-03-04', null), (3, 'bobby', null, x'00')")
+
+    def test_profile(self):
+        total, rows = colprofile.profile_table(self.engine, make_table())
+        nt.assert_equal(3, total)
+        nt.assert_equal([
+            ('id', 'INTEGER', 0, 3, 1, 3, ''),
+            ('name', 'VARCHAR(20)', 1, 2, 'ann', 'bobby', 4.0),
+            ('born', 'DATE', 1, 2, '1970-01-02', '1980-03-04', ''),
+            ('photo', 'BLOB', 2, '', '', '', ''),
+        ], rows)
+
+    def test_sample(self):
+        total, rows = colprofile.profile_table(self.engine, make_table(),
+                                               sample=1)
+        nt.assert_equal(1, total)
+        nt.assert_equal(('id', 'INTEGER', 0, 1, 1, 1, ''), rows[0])
+
+    def test_single_query(self):
+        executed = []
+        sa.event.listen(self.engine, 'before_cursor_execute',
+                        lambda *args: executed.append(args[2]))
+        colprofile.profile_table(self.engine, make_table())
+        nt.assert_equal(1, len(executed))
+
+
+def test_approx_count_distinct():
+    query, labels = colprofile.profile_query(make_table())
+    sql = str(query.compile(dialect=oracle.dialect()))
+    nt.assert_in('approx_count_distinct(person.id)', sql)
+    nt.assert_in('count(distinct person.id)', str(query))
+    nt.assert_in(('name', 'avglen'), labels)
+    nt.assert_not_in(('photo', 'min'), labels)
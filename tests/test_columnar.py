@@ -0,0 +1,54 @@
+import datetime as dt
+
+import nose.tools as nt
+import numpy as np
+import sqlalchemy as sa
+
+from ipydb import columnar
+from ipydb.metadata import model as m
+
+
+def setup_engine():
+    engine = sa.create_engine('sqlite:///:memory:')
+    engine.execute('create table thing (id integer, price real, '
+                   'name varchar(20), born timestamp, qty integer)')
+    rows = [(i, i / 2.0, 'name%d' % i, dt.datetime(2012, 1, 1 + i % 28),
+             None if i == 15 else i) for i in range(25)]
+    engine.execute('insert into thing values (?, ?, ?, ?, ?)', rows)
+    return engine
+
+
+def test_model_dtypes():
+    tbl = m.Table(id=1, name='thing')
+    tbl.columns = [
+        m.Column(id=1, table_id=1, name='id', type='INTEGER', table=tbl),
+        m.Column(id=2, table_id=1, name='price', type='FLOAT', table=tbl),
+        m.Column(id=3, table_id=1, name='name', type='VARCHAR(20)',
+                 table=tbl),
+        m.Column(id=4, table_id=1, name='born', type='TIMESTAMP',
+                 table=tbl),
+    ]
+    db = m.Database(tables=[tbl])
+    nt.assert_equal({'id': 'int64', 'price': 'float64', 'name': 'object',
+                     'born': 'datetime64[us]'},
+                    columnar.model_dtypes(db, 'select * from thing'))
+    nt.assert_equal({}, columnar.model_dtypes(db, 'select * from other'))
+
+
+def test_fetch_columns():
+    engine = setup_engine()
+    result = engine.execute('select id, price, name, born, qty, id '
+                            'from thing order by id')
+    columns = columnar.fetch_columns(
+        result, dtypes={'born': columnar.DATETIME}, chunksize=10)
+    nt.assert_equal(['id', 'price', 'name', 'born', 'qty', 'id_1'],
+                    list(columns))
+    nt.assert_equal(np.int64, columns['id'].dtype)
+    nt.assert_equal(25, len(columns['id']))
+    nt.assert_equal(np.float64, columns['price'].dtype)
+    nt.assert_equal(object, columns['name'].dtype)
+    nt.assert_equal(np.dtype('datetime64[us]'), columns['born'].dtype)
+    # a NULL promotes the integer column to float
+    nt.assert_equal(np.float64, columns['qty'].dtype)
+    nt.assert_true(np.isnan(columns['qty'][15]))
+    nt.assert_equal(24.0, columns['qty'][24])
@@ -0,0 +1,93 @@
+import time
+
+import mock
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb import engine
+
+
+def test_pool_options():
+    config = {
+        'type': 'mysql',
+        'pool_size': '10',
+        'pool_recycle': '3600',
+        'pool_pre_ping': 'yes',
+        'max_overflow': '',
+    }
+    nt.assert_equal(
+        {'pool_size': 10, 'pool_recycle': 3600, 'pool_pre_ping': True},
+        engine.pool_options(config))
+
+
+def test_pool_stats():
+    eng = engine.from_url('sqlite://', pool_size=5, pool_recycle=60)
+    with eng.connect() as conn:
+        conn.execute('select 1')
+    stats = engine.get_pool_stats(eng)
+    nt.assert_equal(1, stats.connects)
+    nt.assert_equal(1, stats.checkouts)
+    nt.assert_equal(1, len(stats.wait_times))
+    nt.assert_equal(1, len(stats.connect_times))
+    status = dict(stats.status(eng.pool))
+    nt.assert_equal(1, status['Connections made'])
+    nt.assert_true(status['Connect p99'].endswith('ms'))
+
+
+def test_pool_stats_after_dispose():
+    eng = engine.from_url('sqlite:///:memory:')
+
+    def slow_connect(*args):
+        time.sleep(0.05)
+    sa.event.listen(eng, 'do_connect', slow_connect)
+    stats = engine.get_pool_stats(eng)
+    for i in range(2):
+        with eng.connect() as conn:
+            conn.execute('select 1')
+        eng.dispose()
+    nt.assert_equal(2, len(stats.wait_times))
+    nt.assert_equal(2, len(stats.connect_times))
+    # connecting isn't waiting for the pool
+    nt.assert_true(min(stats.connect_times) >= 0.05)
+    nt.assert_true(max(stats.wait_times) < 0.05)
+
+
+def test_connection_registry():
+    registry = engine.ConnectionRegistry(maxsize=2)
+    e1, e2, e3 = mock.MagicMock(), mock.MagicMock(), mock.MagicMock()
+    registry.add('one', e1)
+    registry.add('two', e2)
+    nt.assert_is(e1, registry.get('one'))  # 'two' is now least recent
+    registry.add('three', e3)
+    nt.assert_equal(['one', 'three'], registry.names())
+    e2.dispose.assert_called_once_with()
+    nt.assert_false(e1.dispose.called)
+    nt.assert_raises(KeyError, registry.get, 'two')
+
+
+@mock.patch('ipydb.engine.getconfigparser')
+def test_getconfigs_is_cached(getconfigparser):
+    cp = getconfigparser.return_value
+    cp.sections.return_value = ['db']
+    cp.defaults.return_value = {}
+    cp.items.return_value = [('type', 'sqlite'), ('default', 'yes')]
+    engine._configs_cache.clear()
+    default, configs = engine.getconfigs()
+    nt.assert_equal('db', default)
+    configs['db']['type'] = 'changed'
+    nt.assert_equal('sqlite', engine.getconfigs()[1]['db']['type'])
+    nt.assert_equal(1, getconfigparser.call_count)
+    engine._configs_cache.clear()
+
+
+def test_background_connection():
+    pending = engine.BackgroundConnection('sqlite://').start()
+    eng = pending.result()
+    nt.assert_true(pending.done())
+    nt.assert_equal('sqlite', eng.dialect.name)
+
+
+def test_background_connection_failure():
+    pending = engine.BackgroundConnection('nope://').start()
+    nt.assert_raises(Exception, pending.result)
+    nt.assert_true(pending.done())
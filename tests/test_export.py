@@ -0,0 +1,149 @@
+import csv
+import datetime as dt
+import decimal
+import gzip
+import io
+import os
+import shutil
+import tempfile
+
+import mock
+from nose import SkipTest
+import nose.tools as nt
+import numpy as np
+import sqlalchemy as sa
+
+from ipydb import export
+
+
+def setup_engine():
+    engine = sa.create_engine('sqlite:///:memory:')
+    engine.execute('create table thing (id integer, price real, '
+                   'name varchar(20))')
+    rows = [(i, i / 2.0, None if i == 3 else u'n\xe4me%d' % i)
+            for i in range(25)]
+    engine.execute('insert into thing values (?, ?, ?)', rows)
+    return engine
+
+
+class TestExport(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.engine = setup_engine()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_guess_format(self):
+        nt.assert_equal('parquet', export.guess_format('a/b.PARQUET'))
+        nt.assert_equal('npz', export.guess_format('out.npz'))
+        nt.assert_equal('csv', export.guess_format('out.txt'))
+        nt.assert_equal('rows', export.guess_format('out', default='rows'))
+
+    def test_unknown_format(self):
+        result = self.engine.execute('select * from thing')
+        with nt.assert_raises(ValueError):
+            export.export(result, self.path('out'), fmt='xls')
+
+    def test_rows_round_trip(self):
+        result = self.engine.execute('select * from thing order by id')
+        rows, path, fmt = export.export(result, self.path('out.rows'),
+                                        batch_size=7)
+        nt.assert_equal((25, self.path('out.rows'), 'rows'),
+                        (rows, path, fmt))
+        keys, rows = export.read_rows(path)
+        nt.assert_equal(['id', 'price', 'name'], keys)
+        expected = self.engine.execute(
+            'select * from thing order by id').fetchall()
+        nt.assert_equal([tuple(r) for r in expected], list(rows))
+
+    def test_rows_types(self):
+        values = [(None, True, 2 ** 40, 1.5, b'\x00\x01',
+                   decimal.Decimal('1.10'), dt.datetime(2012, 1, 2, 3, 4),
+                   dt.date(2012, 1, 2), dt.time(3, 4, 5))]
+
+        class Cursor(list):
+            def keys(self):
+                return ['c%d' % i for i in range(9)]
+        export.write_rows(Cursor(values), self.path('types.rows'))
+        keys, rows = export.read_rows(self.path('types.rows'))
+        nt.assert_equal(values, list(rows))
+
+    def test_npz(self):
+        result = self.engine.execute('select id, price from thing')
+        rows, path, fmt = export.export(result, self.path('out.npz'))
+        nt.assert_equal(25, rows)
+        archive = np.load(path)
+        nt.assert_equal(np.int64, archive['id'].dtype)
+        nt.assert_equal(12.0, archive['price'][24])
+
+    def test_guess_compression(self):
+        nt.assert_equal('gzip', export.guess_compression('out.csv.gz'))
+        nt.assert_equal('zstd', export.guess_compression('out.rows.zst'))
+        nt.assert_equal(None, export.guess_compression('out.csv'))
+        nt.assert_equal('csv', export.guess_format('out.csv.gz'))
+        nt.assert_equal('rows', export.guess_format('out.rows.zst'))
+
+    def test_csv(self):
+        result = self.engine.execute('select * from thing where id < 3')
+        rows, path, fmt = export.export(result, self.path('out.csv'),
+                                        batch_size=2)
+        nt.assert_equal(3, rows)
+        with io.open(path, encoding='utf-8', newline='') as fin:
+            nt.assert_equal(u'id,price,name\r\n0,0.0,n\xe4me0\r\n'
+                            u'1,0.5,n\xe4me1\r\n2,1.0,n\xe4me2\r\n',
+                            fin.read())
+
+    def test_csv_gzip(self):
+        result = self.engine.execute('select * from thing')
+        rows, path, fmt = export.export(result, self.path('out.csv.gz'))
+        nt.assert_equal(('csv', 25), (fmt, rows))
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as fin:
+            lines = list(csv.reader(fin))
+        nt.assert_equal(26, len(lines))
+        nt.assert_equal(['3', '1.5', ''], lines[4])
+
+    def test_rows_gzip(self):
+        result = self.engine.execute('select * from thing')
+        export.export(result, self.path('out.rows'), compression='gzip')
+        keys, rows = export.read_rows(self.path('out.rows'),
+                                      compression='gzip')
+        nt.assert_equal(25, len(list(rows)))
+
+    def arrow_export(self, query, name, **kw):
+        if export.pa is None:
+            raise SkipTest('pyarrow is not installed')
+        result = self.engine.execute(query)
+        rows, path, fmt = export.export(result, self.path(name), **kw)
+        if fmt == 'parquet':
+            return export.pq.read_table(path)
+        return export.pa.ipc.open_file(path).read_all()
+
+    def test_arrow_null_first_batch(self):
+        # name is NULL throughout the first batch, 3 <= id < 5
+        query = 'select id, name from thing where id >= 3 order by id'
+        for name in ('out.parquet', 'out.arrow'):
+            table = self.arrow_export(query, name, batch_size=1)
+            nt.assert_equal(22, table.num_rows)
+            nt.assert_equal(export.pa.string(), table.schema.field(
+                'name').type)
+            nt.assert_equal([None, u'n\xe4me4'],
+                            table.column('name').to_pylist()[:2])
+
+    def test_arrow_all_null(self):
+        table = self.arrow_export('select id, null as empty from thing',
+                                  'out.arrow', batch_size=10)
+        nt.assert_equal(25, table.num_rows)
+        nt.assert_equal(export.pa.null(), table.schema.field('empty').type)
+
+    def test_arrow_null_too_long(self):
+        with mock.patch.object(export, 'MAX_PENDING_ROWS', 10):
+            table = self.arrow_export(
+                'select id, case when id = 24 then id end as late '
+                'from thing order by id', 'out.arrow', batch_size=5)
+        nt.assert_equal(export.pa.string(), table.schema.field('late').type)
+        nt.assert_equal([None, u'24'], table.column('late').to_pylist()[-2:])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import mock
+import nose.tools as nt
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql, sqlite
+
+from ipydb import guard
+
+
+def test_is_unbounded_select():
+    nt.assert_true(guard.is_unbounded_select('select * from events'))
+    nt.assert_true(guard.is_unbounded_select(
+        "  (SELECT 'limit 1' -- limit\n from events)"))
+    nt.assert_true(guard.is_unbounded_select('with x as (select 1) '
+                                             'select * from x'))
+    nt.assert_false(guard.is_unbounded_select('select * from t limit 5'))
+    nt.assert_false(guard.is_unbounded_select('select top 5 * from t'))
+    nt.assert_false(guard.is_unbounded_select(
+        'select * from t fetch first 5 rows only'))
+    nt.assert_false(guard.is_unbounded_select(
+        'select * from t where rownum < 5'))
+    nt.assert_false(guard.is_unbounded_select('select * into t2 from t'))
+    nt.assert_false(guard.is_unbounded_select('delete from t'))
+
+
+def test_limit_query():
+    sql = "select * from t where a = 'x:y'"
+    nt.assert_equal(
+        "SELECT * \nFROM (\nselect * from t where a = 'x:y'\n) "
+        "AS ipydb_guard\n LIMIT 10 OFFSET 0",
+        guard.limit_query(sql, sqlite.dialect(), 10))
+    nt.assert_in('TOP 10', guard.limit_query(sql, mssql.dialect(), 10))
+
+
+def test_limit_query_semicolon_and_binds():
+    engine = sa.create_engine('sqlite://')
+    engine.execute('create table t (a integer)')
+    engine.execute('insert into t values (?)', *[(i,) for i in range(20)])
+    sql = guard.limit_query('select * from t where a > :a -- big\n; ',
+                            engine.dialect, 3)
+    nt.assert_equal([(11,), (12,), (13,)],
+                    engine.execute(sa.text(sql), a=10).fetchall())
+
+
+def test_cached_estimate():
+    from ipydb.metadata import model as m
+    database = m.Database([m.Table(name='Events', estimated_rows=500)])
+    nt.assert_equal(500, guard.cached_estimate(
+        database, 'select * from events;'))
+    nt.assert_is_none(guard.cached_estimate(
+        database, 'select * from events where id = 1'))
+    nt.assert_is_none(guard.cached_estimate(database, 'select * from t'))
+
+
+class TestEstimateRows(object):
+
+    def setup(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.execute('create table events (id integer primary key, '
+                            'kind text)')
+        self.engine.execute('create index events_kind on events(kind)')
+        self.engine.execute('insert into events (kind) values (?)',
+                            *[('k%i' % (i % 10),) for i in range(200)])
+
+    def test_unknown_without_statistics(self):
+        nt.assert_is_none(guard.estimate_rows(
+            self.engine, 'select * from events'))
+
+    def test_sqlite_statistics(self):
+        self.engine.execute('analyze')
+        nt.assert_equal(200, guard.estimate_rows(
+            self.engine, 'select * from events'))
+        # an indexed lookup isn't a scan
+        nt.assert_is_none(guard.estimate_rows(
+            self.engine, "select * from events where kind = 'k1'"))
+
+    def test_failure_is_unknown(self):
+        nt.assert_is_none(guard.estimate_rows(
+            self.engine, 'select * from nope'))
+
+
+class TestCostGuard(object):
+
+    def setup(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.pestimate = mock.patch('ipydb.guard.estimate_rows',
+                                    return_value=5000)
+        self.estimate = self.pestimate.start()
+
+    def teardown(self):
+        self.pestimate.stop()
+
+    def test_off(self):
+        cg = guard.CostGuard()
+        nt.assert_equal('select * from t', cg.check(self.engine,
+                                                    'select * from t'))
+        nt.assert_false(self.estimate.called)
+        nt.assert_equal(0, cg.checked)
+
+    def test_below_threshold(self):
+        cg = guard.CostGuard('refuse', threshold=5000)
+        nt.assert_equal('select * from t', cg.check(self.engine,
+                                                    'select * from t'))
+        nt.assert_equal(1, cg.explained)
+
+    def test_bounded_query_is_not_explained(self):
+        cg = guard.CostGuard('refuse', threshold=10)
+        nt.assert_equal('select * from t limit 1',
+                        cg.check(self.engine, 'select * from t limit 1'))
+        nt.assert_false(self.estimate.called)
+        nt.assert_equal(1, cg.checked)
+        nt.assert_equal(0, cg.explained)
+
+    def test_refuse(self):
+        cg = guard.CostGuard('refuse', threshold=10)
+        nt.assert_is_none(cg.check(self.engine, 'select * from t'))
+
+    def test_limit(self):
+        cg = guard.CostGuard('limit', threshold=10, limit=3)
+        nt.assert_in('LIMIT 3', cg.check(self.engine, 'select * from t'))
+
+    @mock.patch('ipydb.guard.multi_choice_prompt')
+    def test_prompt(self, prompt):
+        cg = guard.CostGuard('prompt', threshold=10)
+        prompt.return_value = 'run'
+        nt.assert_equal('select * from t', cg.check(self.engine,
+                                                    'select * from t'))
+        prompt.return_value = 'refuse'
+        nt.assert_is_none(cg.check(self.engine, 'select * from t'))
+
+    def test_cache_only_for_plain_scans(self):
+        from ipydb.metadata import model as m
+        database = m.Database([m.Table(name='t', estimated_rows=10 ** 9)])
+        engine = mock.Mock()
+        engine.dialect.name = 'mssql'  # no EXPLAIN support
+        cg = guard.CostGuard('refuse', threshold=10)
+        nt.assert_is_none(cg.check(engine, 'select * from t',
+                                   database=database))
+        sql = 'select * from t where id = 1'
+        nt.assert_equal(sql, cg.check(engine, sql, database=database))
+        nt.assert_equal(1, cg.cached)
+
+    def test_overhead_is_measured(self):
+        cg = guard.CostGuard('refuse', threshold=10000)
+        for i in range(3):
+            cg.check(self.engine, 'select * from t')
+        status = dict(cg.status())
+        nt.assert_equal(3, status['queries checked'])
+        nt.assert_true(cg.seconds >= cg.max_seconds > 0)
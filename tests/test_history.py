@@ -0,0 +1,44 @@
+import datetime as dt
+
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb import history
+
+
+def test_fingerprint():
+    nt.assert_equal(
+        "select * from t where id = ? and name = ? and x in (?)",
+        history.fingerprint("SELECT *\n  FROM t WHERE id = 12 and "
+                            "name = 'it''s' and x in (1, 2.5, -3);"))
+    nt.assert_equal('select col1 from t2', history.fingerprint(
+        'select col1 from t2'))
+
+
+def test_parse_since():
+    since = history.parse_since('2h')
+    now = dt.datetime.now()
+    nt.assert_true(dt.timedelta(hours=2) <= now - since <
+                   dt.timedelta(hours=2, minutes=1))
+    nt.assert_equal(dt.datetime(2014, 3, 1),
+                    history.parse_since('2014-03-01'))
+
+
+def test_reports():
+    store = history.QueryHistory(sa.create_engine('sqlite:///:memory:'))
+    history.metadata.create_all(store.engine)
+    old = dt.datetime(2014, 1, 1)
+    new = dt.datetime(2014, 6, 1)
+    store.record('select 1 from t where id = 1', 'db', old, 5.0)
+    store.record('select 1 from t where id = 2', 'db', new, 1.0, 1)
+    store.record('select 2', 'other', new, 2.0, error='oops')
+    nt.assert_equal(['select 2', 'select 1 from t where id = 2',
+                     'select 1 from t where id = 1'],
+                    [row.sql for row in store.recent()])
+    nt.assert_equal([5.0, 2.0], [row.duration
+                                 for row in store.slowest(limit=2)])
+    nt.assert_equal([('select ? from t where id = ?', 2, 6.0, 3.0, 5.0, 0),
+                     ('select ?', 1, 2.0, 2.0, 2.0, 1)],
+                    [tuple(row) for row in store.by_fingerprint()])
+    nt.assert_equal(1, len(store.by_fingerprint(since=new,
+                                                connection='db')))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Loading the extension shouldn't import what it only needs later."""
+import subprocess
+import sys
+
+import nose.tools as nt
+from nose import SkipTest
+
+LAZY = ['numpy', 'pandas', 'pyarrow', 'zstandard', 'sqlparse', 'dateutil',
+        'sqlalchemy.orm', 'ipydb.metadata']
+BUDGET_MS = 1000  # generous: this catches regressions, not milliseconds
+
+
+def import_plugin():
+    """Import ipydb.plugin in a fresh interpreter.
+
+    Returns:
+        tuple (imported module names, cumulative import time in ms).
+    """
+    code = ('import IPython.core.magic_arguments, sys\n'
+            'sys.stderr.write("-- ipydb --\\n")\n'
+            'import ipydb.plugin\n'
+            'print(",".join(sorted(sys.modules)))')
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    out, err = proc.communicate()
+    nt.assert_equal(0, proc.returncode, err)
+    lines = err.splitlines()
+    millis = None
+    for line in lines[lines.index('-- ipydb --') + 1:]:
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'ipydb.plugin':
+            millis = int(fields[1]) / 1000.0
+    return out.strip().split(','), millis
+
+
+def test_import_is_lazy():
+    if sys.version_info < (3, 7):
+        raise SkipTest('python -X importtime needs python 3.7')
+    modules, millis = import_plugin()
+    nt.assert_equal([], [name for name in LAZY if name in modules])
+    nt.assert_less(millis, BUDGET_MS)
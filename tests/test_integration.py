@@ -1,7 +1,9 @@
 """Some integration tests using the chinook example db."""
 from __future__ import print_function
 
+import os
 import shutil
+import tempfile
 
 from IPython.terminal.interactiveshell import TerminalInteractiveShell
 import nose.tools as nt
@@ -28,6 +30,10 @@ class TestIntegraion(object):
         mget_engine = self.pget_metadata_engine.start()
         self.md_engine = engine.from_url('sqlite:///:memory:')
         mget_engine.return_value = ('memory', self.md_engine)
+        self.phistory_engine = mock.patch(
+            'ipydb.history.get_history_engine')
+        self.phistory_engine.start().return_value = \
+            engine.from_url('sqlite:///:memory:')
         self.ipython.config = None
         self.ipython.register_magics = mock.MagicMock()
         self.ipython.Completer = mock.MagicMock()
@@ -59,7 +65,111 @@ class TestIntegraion(object):
         self.m.rereflect('')
         print(self.out.getvalue())
 
+    def test_sqlbench(self):
+        self.m.connecturl(EXAMPLEDB)
+        self.m.sqlbench('-n 3 -w 1 select * from Album; '
+                        'select AlbumId from Album')
+        output = self.out.getvalue()
+        for stage in plugin.BENCHMARK_STAGES:
+            nt.assert_in(stage, output)
+        nt.assert_equal(2, output.count(' total '))
+
+    def test_sql_profile(self):
+        self.m.connecturl(EXAMPLEDB)
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            self.m.sql('--profile --profile-top=5 select * from Album')
+        output = self.out.getvalue()
+        nt.assert_in('For Those About To Rock', output)
+        for stage, description in plugin.PROFILE_STAGES:
+            nt.assert_in('| %s ' % stage, output)
+        nt.assert_in('347 rows', stdout.getvalue())
+        nt.assert_in('cumulative', stdout.getvalue())
+
+    def test_sql_profile_split(self):
+        self.m.connecturl(EXAMPLEDB)
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            self.m.sql('--profile --profile-split select * from Album')
+        output = self.out.getvalue()
+        for stage, description in plugin.PROFILE_FETCH_STAGES:
+            nt.assert_in('|   %s ' % stage, output)
+
+    def test_runsql_failure_in_transaction(self):
+        self.m.connecturl(EXAMPLEDB)
+        fd, path = tempfile.mkstemp(suffix='.sql')
+        with os.fdopen(fd, 'w') as fout:
+            fout.write('create table t (id integer)\n/\n'
+                       'insert into t values (1)\n/\n'
+                       'insert into nope values (1)\n/\n')
+        try:
+            with mock.patch('sys.stdout', new_callable=StringIO) as out:
+                nt.assert_false(self.ipydb.run_sql_script(path))
+        finally:
+            os.remove(path)
+        output = out.getvalue()
+        nt.assert_in('[1] line 1: ok', output)
+        nt.assert_in('[2] line 3: 1 row affected', output)
+        nt.assert_in('transaction opened by statement 2 is still open',
+                     output)
+        nt.assert_in('--resume-from 3', output)
+        nt.assert_in('--resume-from 2', output)
+        self.ipydb.rollback()
+        # script statements are recorded like any other
+        recorded = [row[4] for row in self.ipydb.history.recent()]
+        nt.assert_in('insert into nope values (1)', recorded)
+
+    def test_load_csv(self):
+        self.m.connecturl(EXAMPLEDB)
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as fout:
+            fout.write('GenreId,Name\n')
+            for i in range(1000, 1010):
+                fout.write('%d,genre %d\n' % (i, i))
+        try:
+            self.m.load_csv('-b 3 %s Genre' % path)
+        finally:
+            os.remove(path)
+        count = self.ipydb.engine.execute(
+            'select count(*) from Genre where GenreId >= 1000').scalar()
+        nt.assert_equal(10, count)
+
+    def test_export_npz(self):
+        import numpy as np
+        self.m.connecturl(EXAMPLEDB)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'out.dat')
+            with mock.patch('sys.stdout', new_callable=StringIO) as out:
+                self.m.sql('-o %s -O npz select * from Album' % path)
+            nt.assert_in('347 rows written to %s' % path, out.getvalue())
+            nt.assert_equal(347, len(np.load(path)['AlbumId']))
+            # the pivoted result: one row per field
+            path = os.path.join(tmpdir, 'pivot.npz')
+            self.m.sql('-p -o %s select * from Album where AlbumId = 1' %
+                       path)
+            nt.assert_equal(['AlbumId', 'Title', 'ArtistId'],
+                            list(np.load(path, allow_pickle=True)['Field']))
+            # writers' errors are reported, not raised
+            path = os.path.join(tmpdir, 'nodir', 'out.csv')
+            with mock.patch('sys.stdout', new_callable=StringIO) as out:
+                self.m.sql('-o %s select * from Album' % path)
+            nt.assert_in('Failed to write %s' % path, out.getvalue())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_sqlhistory(self):
+        self.m.connecturl(EXAMPLEDB)
+        for album_id in (1, 2, 3):
+            self.m.sql('select * from Album where AlbumId = %d' % album_id)
+        self.m.sql('select * from NoSuchTable')
+        self.m.sqlhistory('--by-fingerprint --since 1h')
+        output = self.out.getvalue()
+        nt.assert_in('select * from album where albumid = ?', output)
+        nt.assert_regexp_matches(output, r'albumid = \? +\| +3 ')
+        self.m.sqlhistory('--slowest -n 10')
+        nt.assert_in('no such table', self.out.getvalue())
+
     def teardown(self):
         self.pgetconfigs.stop()
         self.pget_metadata_engine.stop()
+        self.phistory_engine.stop()
         self.ppager.stop()
@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+
+import nose.tools as nt
+
+from ipydb.metadata.lock import FileLock
+
+
+class TestFileLock(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.sqlite.lock')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_exclusive(self):
+        first, second = FileLock(self.path), FileLock(self.path)
+        nt.assert_true(first.acquire(blocking=False))
+        nt.assert_false(second.acquire(blocking=False))
+        nt.assert_false(second.acquire(timeout=0.2))
+        first.release()
+        nt.assert_true(second.acquire(blocking=False))
+        second.release()
+        second.release()  # releasing twice is harmless
@@ -71,6 +71,42 @@ class ModelTest(unittest.TestCase):
         self.ipydb.connect.assert_called()
         self.magics.connecturl('a')
         self.ipydb.connect_url.assert_called()
+        self.magics.use('a')
+        self.ipydb.use.assert_called_with('a')
+
+    def test_profile_table(self):
+        self.magics.profile_table('--sample 100 events')
+        self.ipydb.profile_table.assert_called_with('events', sample=100)
+
+    def test_sql_profile(self):
+        self.magics.sql('--profile --profile-top 10 select * from t')
+        self.ipydb.profile_query.assert_called_with(
+            'select * from t', params=None, on=None, top=10, split=False)
+        nt.assert_false(self.ipydb.execute.called)
+        self.magics.sql('--profile-split select * from t')
+        self.ipydb.profile_query.assert_called_with(
+            'select * from t', params=None, on=None, top=None, split=True)
+
+    def test_ipydb_stats(self):
+        self.magics.ipydb_stats('-j /tmp/stats.json --reset')
+        self.ipydb.show_stats.assert_called_with(
+            filepath='/tmp/stats.json', reset=True)
+
+    def test_browse(self):
+        self.magics.browse("events --where kind = 'x'")
+        self.ipydb.browse.assert_called_with('events', where="kind = 'x'")
+        self.magics.browse('events')
+        self.ipydb.browse.assert_called_with('events', where=None)
+
+    def test_insert_frame(self):
+        frame = object()
+        self.ipython.user_ns = {'df': frame}
+        self.magics.insert_frame('-b 10 df mytable')
+        self.ipydb.insert_frame.assert_called_with(frame, 'mytable',
+                                                   batch_size=10)
+        self.ipydb.insert_frame.reset_mock()
+        self.magics.insert_frame('nothere mytable')
+        nt.assert_false(self.ipydb.insert_frame.called)
 
     def test_sql(self):
         thing = self.magics.sql('-r -f select * from blah where something = 1')
@@ -86,14 +122,21 @@ class ModelTest(unittest.TestCase):
         ret = self.ipydb.execute.return_value
         ret.returns_rows = True
         self.ipython.user_ns = dct
-        self.magics.sql('-a zzz -m yyy select * from foo')
+        self.magics.sql('-a zzz select * from foo')
         self.ipydb.execute.assert_called_with(
             'select * from foo',
-            params=d, multiparams=lst)
+            params=d, multiparams=None, on=None)
+        self.magics.sql('-m yyy -b 100 insert into foo values (:x)')
+        self.ipydb.execute_many.assert_called_with(
+            'insert into foo values (:x)', lst, batch_size=100, on=None)
 
         ret.returns_rows = False
         ret.rowount = 2
-        self.magics.sql('-a zzz -m yyy select * from foo')
+        self.magics.sql('-a zzz select * from foo')
 
         r = self.magics.sql('-r select * from foo')
         nt.assert_equal(ret, r)
+
+        self.magics.sql('--on=other select * from foo')
+        self.ipydb.execute.assert_called_with(
+            'select * from foo', params=None, multiparams=None, on='other')
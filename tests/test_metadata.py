@@ -1,8 +1,16 @@
 import logging
-
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mock
+import nose.tools as nt
 import sqlalchemy as sa
 
 from ipydb import metadata
+from ipydb.metrics import registry
 from ipydb.metadata import model as m
 
 
@@ -59,3 +67,142 @@ def teardown(*args, **kw):
 def test_get_metadata():
     # nothing to see here just yet...
     pass
+
+
+class TestMetaDataAccessor(object):
+
+    def setup(self):
+        self.profile = tempfile.mkdtemp()
+        self.plocate = mock.patch('ipydb.metadata.locate_profile',
+                                  return_value=self.profile)
+        self.plocate.start()
+        # reflection connects again, so this can't be an in-memory db
+        self.engine = sa.create_engine(
+            'sqlite:///%s' % os.path.join(self.profile, 'target.sqlite'))
+        self.engine.execute('create table t (id integer primary key)')
+        self.accessor = metadata.MetaDataAccessor()
+        self.accessor.debug = True  # reflect synchronously
+
+    def teardown(self):
+        self.engine.dispose()
+        self.plocate.stop()
+        shutil.rmtree(self.profile)
+
+    def test_repeated_calls_create_no_engines(self):
+        db = self.accessor.get_metadata(self.engine)
+        nt.assert_in('t', db.tables)
+        with mock.patch('sqlalchemy.create_engine') as create_engine, \
+                mock.patch('ipydb.metadata.create_schema') as create_schema:
+            for i in range(3):
+                nt.assert_is(db, self.accessor.get_metadata(self.engine))
+        nt.assert_false(create_engine.called)
+        nt.assert_false(create_schema.called)
+
+    def test_engines_share_a_store(self):
+        other = sa.create_engine(self.engine.url)
+        nt.assert_is(metadata.get_metadata_engine(self.engine)[1],
+                     metadata.get_metadata_engine(other)[1])
+
+    def test_cache_is_in_wal_mode(self):
+        db_key, ipydb_engine = metadata.get_metadata_engine(self.engine)
+        nt.assert_equal('wal', ipydb_engine.execute(
+            'PRAGMA journal_mode').scalar())
+
+    def hold_reflection_lock(self):
+        db_key, ipydb_engine = metadata.get_metadata_engine(self.engine)
+        metadata.ensure_schema(ipydb_engine)
+        lock = metadata.reflection_lock(ipydb_engine)
+        nt.assert_true(lock.acquire(blocking=False))
+        return db_key, lock
+
+    def write_cache(self):
+        """Reflect into the cache, as another session would."""
+        db_key, ipydb_engine = metadata.get_metadata_engine(self.engine)
+        metadata.ensure_schema(ipydb_engine)
+        sa_metadata = sa.MetaData()
+        sa_metadata.reflect(self.engine)
+        with ipydb_engine.begin() as conn:
+            metadata.clear_schema(conn)
+            metadata.persist.write_sa_metadata(conn, sa_metadata)
+
+    @mock.patch('ipydb.metadata.REFLECT_POLL_INTERVAL', 0.1)
+    def test_waits_for_and_picks_up_another_reflection(self):
+        db_key, lock = self.hold_reflection_lock()
+        registry.reset()
+        db = metadata.m.Database()
+        waiting = threading.Thread(target=self.accessor.reflect_db,
+                                   args=(db_key, db, self.engine.url))
+        waiting.start()
+        try:
+            time.sleep(0.3)
+            nt.assert_true(db.reflecting)
+            self.write_cache()
+            # picked up while the other session still holds the lock
+            waiting.join(10)
+            nt.assert_false(waiting.is_alive())
+        finally:
+            lock.release()
+            waiting.join(10)
+        nt.assert_in('t', db.tables)
+        nt.assert_false(db.reflecting)
+        counters = registry.snapshot()['counters']
+        nt.assert_equal(1, counters['reflect.picked_up'])
+        nt.assert_not_in('reflect.sa_reflect',
+                         registry.snapshot()['histograms'])
+
+    @mock.patch('ipydb.metadata.REFLECT_POLL_INTERVAL', 0.1)
+    def test_reflects_if_other_session_fails(self):
+        self.write_cache()  # an old result isn't picked up
+        db_key, lock = self.hold_reflection_lock()
+        registry.reset()
+        db = metadata.m.Database()
+        waiting = threading.Thread(target=self.accessor.reflect_db,
+                                   args=(db_key, db, self.engine.url))
+        waiting.start()
+        time.sleep(0.3)
+        lock.release()
+        waiting.join(10)
+        nt.assert_in('t', db.tables)
+        nt.assert_not_in('reflect.picked_up',
+                         registry.snapshot()['counters'])
+        nt.assert_in('reflect.sa_reflect',
+                     registry.snapshot()['histograms'])
+
+    def test_empty_database_is_not_reflected_again(self):
+        self.engine.execute('drop table t')
+        registry.reset()
+        db = self.accessor.get_metadata(self.engine)
+        nt.assert_equal({}, db.tables)
+        nt.assert_true(db.age <= metadata.MAX_CACHE_AGE)
+        # another session reads the fresh, empty cache
+        db = metadata.MetaDataAccessor().get_metadata(self.engine)
+        nt.assert_true(db.age <= metadata.MAX_CACHE_AGE)
+        nt.assert_equal(1, registry.snapshot()['counters']['reflect.runs'])
+
+    def test_flush_keeps_tables(self):
+        self.accessor.get_metadata(self.engine)
+        db_key, ipydb_engine = metadata.get_metadata_engine(self.engine)
+        self.accessor.flush(self.engine)
+        nt.assert_equal(0, ipydb_engine.execute(
+            'select count(*) from dbtable').scalar())
+        nt.assert_is_none(metadata.persist.written_at(ipydb_engine))
+
+    @mock.patch('ipydb.metadata.REFLECT_LOCK_TIMEOUT', 0.2)
+    def test_gives_up_waiting(self):
+        db_key, lock = self.hold_reflection_lock()
+        db = metadata.m.Database()
+        try:
+            self.accessor.reflect_db(db_key, db, self.engine.url)
+        finally:
+            lock.release()
+        nt.assert_equal({}, db.tables)
+        nt.assert_false(db.reflecting)
+
+    def test_reflection_replaces_cache(self):
+        self.accessor.get_metadata(self.engine)
+        self.engine.execute('create table u (id integer primary key)')
+        db = self.accessor.get_metadata(self.engine, force=True)
+        nt.assert_equal(['t', 'u'], sorted(db.tables))
+        db_key, ipydb_engine = metadata.get_metadata_engine(self.engine)
+        nt.assert_equal(2, ipydb_engine.execute(
+            'select count(*) from dbtable').scalar())
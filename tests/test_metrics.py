@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+
+import nose.tools as nt
+
+from ipydb.metrics import Histogram, Registry
+from ipydb.utils import timer
+
+
+def test_histogram():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000.0)
+    summary = histogram.summary()
+    nt.assert_equal(100, summary['count'])
+    nt.assert_almost_equal(50.5, summary['mean_ms'])
+    nt.assert_almost_equal(95, summary['p95_ms'])
+    nt.assert_almost_equal(100, summary['max_ms'])
+
+
+class TestRegistry(object):
+
+    def setup(self):
+        self.registry = Registry()
+
+    def test_record(self):
+        self.registry.increment('metadata.hit')
+        self.registry.increment('metadata.hit', 2)
+        self.registry.gauge('connections', 3)
+        with self.registry.timed('execute'):
+            pass
+        nt.assert_raises(ValueError, self._fail_timed)
+        snapshot = self.registry.snapshot()
+        nt.assert_equal({'metadata.hit': 3}, snapshot['counters'])
+        nt.assert_equal({'connections': 3}, snapshot['gauges'])
+        nt.assert_equal(2, snapshot['histograms']['execute']['count'])
+        rows = self.registry.rows()
+        nt.assert_equal(['metadata.hit', 'connections', 'execute'],
+                        [row[0] for row in rows])
+        self.registry.reset()
+        nt.assert_equal([], self.registry.rows())
+
+    def _fail_timed(self):
+        with self.registry.timed('execute'):
+            raise ValueError()
+
+    def test_dump(self):
+        self.registry.increment('completion')
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            self.registry.dump(path)
+            with open(path) as fin:
+                dumped = json.load(fin)
+        finally:
+            os.remove(path)
+        nt.assert_equal({'completion': 1}, dumped['counters'])
+        nt.assert_in('time', dumped)
+
+
+def test_timer_records_metric():
+    from ipydb.metrics import registry
+    registry.reset()
+    with timer('testing', log=object(), metric='test.timer'):
+        pass
+    nt.assert_equal(1, registry.snapshot()['histograms']['test.timer'][
+        'count'])
+    registry.reset()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+
+import mock
+import nose.tools as nt
+
+from ipydb.pager import CLEAR_SCREEN, LazyPager
+
+
+class CountingCursor(object):
+    """A result set which counts how many rows have been fetched."""
+
+    def __init__(self, nrows):
+        self.nrows = nrows
+        self.fetched = 0
+        self.closed = False
+
+    def keys(self):
+        return ['id']
+
+    def __iter__(self):
+        for i in range(self.nrows):
+            self.fetched += 1
+            yield (i,)
+
+    def close(self):
+        self.closed = True
+
+
+class TestLazyPager(object):
+
+    def setup(self):
+        # 10 terminal lines: 5 rows per page
+        self.ptermsize = mock.patch('ipydb.pager.termsize',
+                                    return_value=(80, 10))
+        self.ptermsize.start()
+        self.pstdout = mock.patch('ipydb.pager.sys.stdout')
+        self.pstdout.start()
+        self.out = StringIO()
+
+    def teardown(self):
+        self.ptermsize.stop()
+        self.pstdout.stop()
+
+    def run(self, cursor, keys, **kw):
+        keys = list(keys)
+        pager = LazyPager(cursor, out=self.out,
+                          getkey=lambda prompt: keys.pop(0), **kw)
+        pager.run()
+        return pager
+
+    def test_quit_fetches_one_page(self):
+        cursor = CountingCursor(1000000)
+        pager = self.run(cursor, 'q')
+        nt.assert_equal(1, pager.pages_fetched)
+        nt.assert_equal(5, cursor.fetched)
+        nt.assert_true(cursor.closed)
+        nt.assert_in(u'| 4  |', self.out.getvalue())
+        nt.assert_not_in(u'| 5  |', self.out.getvalue())
+
+    def test_fetches_as_user_pages_forward(self):
+        cursor = CountingCursor(1000000)
+        pager = self.run(cursor, '  q')
+        nt.assert_equal(3, pager.pages_fetched)
+        nt.assert_equal(15, cursor.fetched)
+
+    def test_stops_at_last_page(self):
+        cursor = CountingCursor(7)
+        pager = self.run(cursor, ' ')  # no key needed after the last page
+        nt.assert_equal(2, pager.pages_fetched)
+        nt.assert_true(cursor.closed)
+        nt.assert_in(u'| 6  |', self.out.getvalue())
+
+    def test_back_redraws_without_fetching(self):
+        cursor = CountingCursor(100)
+        pager = self.run(cursor, ' b q')
+        nt.assert_equal(2, pager.pages_fetched)
+        nt.assert_equal(10, cursor.fetched)
+        nt.assert_equal(2, self.out.getvalue().count(u'| 5  |'))
+
+    def test_window_is_bounded(self):
+        cursor = CountingCursor(100)
+        pager = self.run(cursor, '    bbbbbq', window=2)
+        nt.assert_equal(2, len(pager.window))
+        nt.assert_equal(5, pager.pages_fetched)
+        # page 3 is dropped: paging back stops at page 4
+        nt.assert_equal(1, self.out.getvalue().count(u'| 14 |'))
+        nt.assert_equal(6, self.out.getvalue().count(u'| 15 |'))
+
+    def test_empty_result(self):
+        cursor = CountingCursor(0)
+        pager = self.run(cursor, '')
+        nt.assert_equal(0, pager.pages_fetched)
+        nt.assert_equal(u'', self.out.getvalue())
+        nt.assert_true(cursor.closed)
+
+    def test_arrow_keys(self):
+        cursor = CountingCursor(100)
+        # down, page down, up, then an unknown sequence which is ignored
+        pager = self.run(cursor, [u'\x1b[B', u'\x1b[6~', u'\x1b[A',
+                                  u'\x1b[1;5C', u'q'])
+        nt.assert_equal(3, pager.pages_fetched)
+        nt.assert_equal(2, self.out.getvalue().count(u'| 5  |'))
+
+    def test_clears_screen_before_redraw(self):
+        cursor = CountingCursor(100)
+        self.run(cursor, ' b q')
+        pages = self.out.getvalue().split(CLEAR_SCREEN)
+        # page 1, page 2, then the redraws of pages 1 and 2
+        nt.assert_equal(3, len(pages))
+        nt.assert_in(u'| 5  |', pages[0])
+        nt.assert_in(u'| 0  |', pages[1])
+        nt.assert_in(u'| 5  |', pages[2])
@@ -0,0 +1,192 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb import export
+from ipydb import partition
+from ipydb.metadata import model as m
+
+
+def make_table(name, *columns):
+    tbl = m.Table(id=1, name=name)
+    tbl.columns = [m.Column(id=i, table_id=1, name=cname, type=ctype,
+                            primary_key=pk, table=tbl)
+                   for i, (cname, ctype, pk) in enumerate(columns)]
+    return tbl
+
+
+def test_numeric_primary_key():
+    tbl = make_table('t', ('id', 'INTEGER', True), ('name', 'TEXT', False))
+    nt.assert_equal('id', partition.numeric_primary_key(tbl).name)
+    tbl = make_table('t', ('code', 'VARCHAR(3)', True))
+    nt.assert_equal(None, partition.numeric_primary_key(tbl))
+    tbl = make_table('t', ('a', 'INTEGER', True), ('b', 'INTEGER', True))
+    nt.assert_equal(None, partition.numeric_primary_key(tbl))
+
+
+def test_split_range():
+    nt.assert_equal([(None, 4), (4, 7), (7, None)],
+                    partition.split_range(1, 10, 3))
+    nt.assert_equal([(None, 2), (2, None)], partition.split_range(1, 2, 5))
+    nt.assert_equal([(None, None)], partition.split_range(1, 1, 4))
+    nt.assert_equal([(None, None)], partition.split_range(None, None, 4))
+    nt.assert_equal([(None, 1.5), (1.5, None)],
+                    partition.split_range(1.0, 2.0, 2))
+
+
+class TestExportTable(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.outdir = os.path.join(self.tmpdir, 'out')
+        self.engine = sa.create_engine(
+            'sqlite:///' + os.path.join(self.tmpdir, 'db.sqlite'))
+        self.engine.execute('create table thing (id integer primary key, '
+                            'name text)')
+        self.engine.execute('insert into thing values (?, ?)',
+                            [(i, 'name%d' % i) for i in range(1, 101)])
+        self.table = make_table('thing', ('id', 'INTEGER', True),
+                                ('name', 'TEXT', False))
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_ids(self, manifest):
+        ids = []
+        for part in manifest['partitions']:
+            keys, rows = export.read_rows(
+                os.path.join(self.outdir, part['file']))
+            ids.extend(row[0] for row in rows)
+        return ids
+
+    def test_parallel(self):
+        manifest = partition.export_table(self.engine, self.table,
+                                          self.outdir, parallel=4,
+                                          fmt='rows')
+        nt.assert_equal(100, manifest['rows'])
+        nt.assert_equal('id', manifest['key'])
+        nt.assert_equal([25] * 4, [p['rows'] for p in manifest['partitions']])
+        nt.assert_equal(list(range(1, 101)), sorted(self.read_ids(manifest)))
+        with open(os.path.join(self.outdir, partition.MANIFEST)) as fin:
+            saved = json.load(fin)
+        part = saved['partitions'][0]
+        nt.assert_equal('thing.0000.rows', part['file'])
+        nt.assert_equal(partition.file_checksum(
+            os.path.join(self.outdir, part['file'])), part['sha256'])
+
+    def test_no_numeric_key(self):
+        table = make_table('thing', ('id', 'INTEGER', False),
+                           ('name', 'TEXT', True))
+        manifest = partition.export_table(self.engine, table, self.outdir,
+                                          parallel=4, fmt='rows')
+        nt.assert_equal(None, manifest['key'])
+        nt.assert_equal(1, len(manifest['partitions']))
+        nt.assert_equal(100, len(self.read_ids(manifest)))
+
+    def test_keyset_checkpoints(self):
+        manifest = partition.export_table(self.engine, self.table,
+                                          self.outdir, parallel=2,
+                                          chunk_size=10)
+        nt.assert_equal([50, 50], [p['rows'] for p in manifest['partitions']])
+        nt.assert_equal(['manifest.json', 'thing.0000.csv', 'thing.0001.csv'],
+                        sorted(os.listdir(self.outdir)))
+        with open(os.path.join(self.outdir, 'thing.0001.csv')) as fin:
+            lines = fin.read().splitlines()
+        nt.assert_equal(['id,name', '51,name51'], lines[:2])
+        nt.assert_equal(51, len(lines))
+
+    def test_resume(self):
+        real_fetch = partition.fetch_chunk
+        calls = []
+
+        def fetch_then_die(conn, query):
+            calls.append(query)
+            if len(calls) == 4:
+                raise IOError('network blip')
+            return real_fetch(conn, query)
+        with mock.patch.object(partition, 'fetch_chunk', fetch_then_die):
+            with nt.assert_raises(IOError):
+                partition.export_table(self.engine, self.table, self.outdir,
+                                       fmt='csv', compression='gzip',
+                                       chunk_size=10)
+        path = os.path.join(self.outdir, 'thing.0000.csv.gz')
+        state = partition.read_checkpoint(path)
+        nt.assert_equal((30, 30, False),
+                        (state['last_key'], state['rows'], state['done']))
+        with open(path, 'ab') as fout:  # a partly written chunk
+            fout.write(b'garbage')
+        manifest = partition.export_table(self.engine, self.table,
+                                          self.outdir, fmt='csv',
+                                          compression='gzip', chunk_size=10,
+                                          resume=True)
+        nt.assert_equal(100, manifest['rows'])
+        with gzip.open(path, 'rt') as fin:
+            lines = fin.read().splitlines()
+        nt.assert_equal(['id'] + [str(i) for i in range(1, 101)],
+                        [line.split(',')[0] for line in lines])
+        nt.assert_false(os.path.exists(path + partition.CHECKPOINT))
+
+    def interrupt_export(self, **kw):
+        """Run an export which fails on its fourth chunk."""
+        real_fetch = partition.fetch_chunk
+        calls = []
+
+        def fetch_then_die(conn, query):
+            calls.append(query)
+            if len(calls) == 4:
+                raise IOError('network blip')
+            return real_fetch(conn, query)
+        with mock.patch.object(partition, 'fetch_chunk', fetch_then_die):
+            with nt.assert_raises(IOError):
+                partition.export_table(self.engine, self.table, self.outdir,
+                                       **kw)
+
+    def test_resume_keeps_partitions(self):
+        self.interrupt_export(parallel=2, chunk_size=10)
+        # the key range is now 1..300: splitting it again would move the
+        # boundary between the partitions from 51 to 151
+        self.engine.execute('insert into thing values (?, ?)',
+                            [(i, 'name%d' % i) for i in range(101, 301)])
+        manifest = partition.export_table(self.engine, self.table,
+                                          self.outdir, parallel=2,
+                                          chunk_size=10, resume=True)
+        ids = []
+        for part in manifest['partitions']:
+            with open(os.path.join(self.outdir, part['file'])) as fin:
+                ids.extend(int(line.split(',')[0])
+                           for line in fin.read().splitlines()[1:])
+        # every row is exported once; rows added to a partition which had
+        # already finished before the interruption are not
+        nt.assert_equal(len(ids), len(set(ids)))
+        nt.assert_true(set(range(1, 101)) <= set(ids))
+        nt.assert_equal([(None, 51), (51, None)],
+                        [(p['lower'], p['upper'])
+                         for p in manifest['partitions']])
+        nt.assert_false(os.path.exists(
+            os.path.join(self.outdir, partition.PLAN)))
+
+    def test_resume_with_other_parallel(self):
+        self.interrupt_export(parallel=2, chunk_size=10)
+        with nt.assert_raises(ValueError):
+            partition.export_table(self.engine, self.table, self.outdir,
+                                   parallel=3, chunk_size=10, resume=True)
+
+    def test_parallel_exceeds_pool(self):
+        engine = sa.create_engine(
+            'sqlite:///' + os.path.join(self.tmpdir, 'db.sqlite'),
+            connect_args={'check_same_thread': False},
+            poolclass=sa.pool.QueuePool, pool_size=2, max_overflow=1)
+        nt.assert_equal(3, partition.pool_capacity(engine))
+        with nt.assert_raises(ValueError):
+            partition.export_table(engine, self.table, self.outdir,
+                                   parallel=4)
+        nt.assert_false(os.path.exists(self.outdir))
+        manifest = partition.export_table(engine, self.table, self.outdir,
+                                          parallel=3, fmt='rows')
+        nt.assert_equal(100, manifest['rows'])
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+import nose.tools as nt
+import sqlalchemy as sa
+
+from ipydb import metadata
+from ipydb.metadata import model as m
+from ipydb.metadata import persist, stats
+
+
+def make_db():
+    engine = sa.create_engine('sqlite://')
+    engine.execute('create table big (id integer primary key, name text)')
+    engine.execute('create index big_name on big(name)')
+    engine.execute('create table small (id integer primary key)')
+    engine.execute('insert into big (name) values (?)',
+                   *[('n%i' % i,) for i in range(300)])
+    return engine
+
+
+def test_collect_sqlite():
+    engine = make_db()
+    # no row estimates until the table has been analyzed
+    nt.assert_true(all(rows is None for rows, size, analyzed
+                       in stats.collect(engine).values()))
+    engine.execute('analyze')
+    collected = stats.collect(engine)
+    nt.assert_equal(300, collected['big'][0])
+    nt.assert_is_none(collected['big'][2])
+
+
+def test_collect_unsupported_dialect():
+    engine = make_db()
+    engine.dialect.name = 'nosuchdb'
+    nt.assert_equal({}, stats.collect(engine))
+
+
+def test_write_and_read_stats():
+    engine = make_db()
+    sa_metadata = sa.MetaData(bind=engine)
+    sa_metadata.reflect()
+    ipengine = sa.create_engine('sqlite://')
+    m.Base.metadata.create_all(ipengine)
+    persist.write_sa_metadata(ipengine, sa_metadata,
+                              {'big': (300, 8192, None)})
+    with metadata.session_scope(ipengine) as session:
+        db = persist.read(session)
+        nt.assert_equal(300, db.tables['big'].estimated_rows)
+        nt.assert_equal(8192, db.tables['big'].estimated_bytes)
+        nt.assert_is_none(db.tables['small'].estimated_rows)
+
+
+class TestSchemaVersion(object):
+
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.engine = sa.create_engine(
+            'sqlite:///' + os.path.join(self.tempdir, 'cache.sqlite'))
+
+    def teardown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tempdir)
+
+    def test_old_cache_is_rebuilt(self):
+        # a cache written before dbtable had statistics columns
+        self.engine.execute('create table dbtable (id integer primary key, '
+                            'name varchar, created datetime, '
+                            'modified datetime)')
+        self.engine.execute("insert into dbtable (name) values ('old')")
+        metadata.create_schema(self.engine)
+        columns = [r[1] for r in self.engine.execute(
+            'pragma table_info(dbtable)')]
+        nt.assert_in('estimated_rows', columns)
+        nt.assert_equal(0, self.engine.execute(
+            'select count(*) from dbtable').scalar())
+        nt.assert_equal(metadata.SCHEMA_VERSION, self.engine.execute(
+            'pragma user_version').scalar())
+
+    def test_current_cache_is_kept(self):
+        metadata.create_schema(self.engine)
+        self.engine.execute("insert into dbtable (name) values ('new')")
+        metadata.create_schema(self.engine)
+        nt.assert_equal(1, self.engine.execute(
+            'select count(*) from dbtable').scalar())
@@ -0,0 +1,72 @@
+import io
+from io import StringIO
+import os
+import pty
+import threading
+
+import mock
+import nose.tools as nt
+
+from ipydb import utils
+
+
+def test_ibatch():
+    batches = list(utils.ibatch(iter(range(7)), 3))
+    nt.assert_equal([[0, 1, 2], [3, 4, 5], [6]], batches)
+    nt.assert_equal([], list(utils.ibatch([], 3)))
+
+
+def test_iter_sql_statements_delimiter():
+    script = StringIO(u'update foo\nset a = 1\n/\n\n/\n\nselect 1\n')
+    nt.assert_equal([(1, u'update foo\nset a = 1\n'), (7, u'\nselect 1\n')],
+                    list(utils.iter_sql_statements(script, '/')))
+
+
+def test_iter_sql_statements_semicolon():
+    script = StringIO(u"select 1; select 'a;b' -- c;d\n"
+                      u"from t;\n/* ; */ insert into x values (1);\n")
+    statements = list(utils.iter_sql_statements(script, ';'))
+    nt.assert_equal([
+        (1, u'select 1'),
+        (1, u" select 'a;b' -- c;d\nfrom t"),
+        (3, u'/* ; */ insert into x values (1)'),
+    ], statements)
+
+
+def test_iter_sql_statements_dollar_quotes():
+    body = (u"create function f() returns int as $body$\n"
+            u"begin\n  perform 1;\n  return $$;$$;\nend;\n$body$ "
+            u"language plpgsql")
+    script = StringIO(body + u";\nselect a$b$c from t;\nselect 2;\n")
+    statements = list(utils.iter_sql_statements(script, ';'))
+    nt.assert_equal([
+        (1, body),
+        (7, u'select a$b$c from t'),
+        (8, u'select 2'),
+    ], statements)
+
+
+def test_human_size():
+    nt.assert_equal('', utils.human_size(None))
+    nt.assert_equal('512 bytes', utils.human_size(512))
+    nt.assert_equal('1.5 kB', utils.human_size(1536))
+    nt.assert_equal('2.0 GB', utils.human_size(2 * 1024 ** 3))
+
+
+def test_getch_reads_whole_escape_sequence():
+    master, slave = pty.openpty()
+
+    def press(keys):
+        # getch() flushes input when it switches to raw mode: type later
+        threading.Timer(0.2, os.write, (master, keys)).start()
+    try:
+        with io.open(slave, 'r', closefd=False) as stdin, \
+                mock.patch('sys.stdin', stdin), \
+                mock.patch('sys.stdout', StringIO()):
+            press(b'\x1b[A')
+            nt.assert_equal(u'\x1b[A', utils.getch())
+            press(b'xy')
+            nt.assert_equal(u'x', utils.getch())
+    finally:
+        os.close(master)
+        os.close(slave)